@@ -4,12 +4,13 @@
 
 只包含必要文件：
 - web_launch.py, sum_aggregator.py, sum_tool_launcher.py（CLI 可选）
+- tools/calcSumXlsx 下 sum_aggregator 与 sumtool 导入的模块（新增模块需同步加入下方列表）
 - README.md, requirements.txt
 - client/index.html
 - server/manage.py, server/webtools/*（排除 __pycache__ 与 db）
 - sumtool/*（排除 __pycache__）
 
-排除：.venv、__pycache__、uploads、exports、result.xlsx、db.sqlite3、dist
+排除：.venv、__pycache__、uploads、exports、cache、result.xlsx、db.sqlite3、dist
 """
 
 import os
@@ -29,7 +30,7 @@ def should_skip(path: Path) -> bool:
     parts = rel.parts
 
     # 目录排除
-    if parts[0] in {".venv", "dist", "uploads", "exports", "__pycache__"}:
+    if parts[0] in {".venv", "dist", "uploads", "exports", "cache", "__pycache__"}:
         return True
     if "__pycache__" in parts:
         return True
@@ -75,6 +76,13 @@ def build_release():
             "tools/__init__.py",
             "tools/calcSumXlsx/__init__.py",
             "tools/calcSumXlsx/sum_aggregator.py",
+            "tools/calcSumXlsx/parse_cache.py",
+            "tools/calcSumXlsx/share_walker.py",
+            "tools/calcSumXlsx/lot_matcher.py",
+            "tools/calcSumXlsx/file_copy.py",
+            "tools/calcSumXlsx/lot_manifest.py",
+            "tools/calcSumXlsx/mirror_cache.py",
+            "tools/calcSumXlsx/sum_catalog.py",
         ]:
             add_file(z, ROOT / fname)
 
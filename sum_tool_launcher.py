@@ -5,11 +5,15 @@ sum_aggregator 的简易启动器。
 用途：
 - 提供可点击/一键运行的入口，默认读取同目录下的 lots 目录，输出到同目录的 result.xlsx。
 - 支持命令行参数：
-  * 用法：sum_tool_launcher <lots_dir> [output_excel_path]
+  * 用法：sum_tool_launcher <lots_dir> [output_path] [--jobs N] [--format xlsx|csv|jsonl|parquet] [--layout wide|long]
+  * --jobs N：使用 N 个进程并行解析（0 为全部 CPU 核心），默认 1。
+  * --format：输出格式，默认 xlsx（或按输出路径扩展名推断）；未指定输出路径时默认文件名随格式变化（如 result.csv）。
 
 该文件用于打包为可执行文件（macOS/Linux 二进制或 Windows .exe）。
 """
 
+import argparse
+import multiprocessing
 import os
 import sys
 
@@ -71,10 +75,10 @@ def _base_dir() -> str:
     return os.path.dirname(os.path.abspath(__file__))
 
 
-def _default_paths() -> tuple[str, str]:
+def _default_paths(fmt: str = "xlsx") -> tuple[str, str]:
     base = _base_dir()
     lots_dir = os.path.join(base, "lots")
-    out_path = os.path.join(base, "result.xlsx")
+    out_path = os.path.join(base, f"result.{fmt}")
     return lots_dir, out_path
 
 
@@ -108,20 +112,36 @@ def _choose_paths_gui(base: str) -> tuple[str | None, str | None]:
         return None, None
 
 
+def _parse_args(argv: list[str]) -> tuple[argparse.Namespace, list[str]]:
+    """解析启动器参数；未识别的选项（如 --no-cache）原样透传给 sum_aggregator。"""
+    parser = argparse.ArgumentParser(prog="sum_tool_launcher", description="SUM 汇总启动器")
+    parser.add_argument("lots_dir", nargs="?", default=None, help="lots 目录")
+    parser.add_argument("out_path", nargs="?", default=None, help="输出路径（默认 Excel）")
+    parser.add_argument("--jobs", type=int, default=1, help="并行进程数，默认 1（串行），0 表示使用全部 CPU 核心")
+    parser.add_argument("--format", dest="output_format", default=None, help="输出格式：xlsx / csv / jsonl / parquet")
+    return parser.parse_known_args(argv)
+
+
 def main() -> int:
-    if len(sys.argv) >= 2:
-        lots_dir = sys.argv[1]
-        out_path = sys.argv[2] if len(sys.argv) >= 3 else os.path.join(os.getcwd(), "result.xlsx")
+    args, passthrough = _parse_args(sys.argv[1:])
+    fmt = (args.output_format or "xlsx").strip().lower()
+    if args.output_format:
+        passthrough = ["--format", fmt, *passthrough]
+    if args.lots_dir:
+        lots_dir = args.lots_dir
+        out_path = args.out_path or os.path.join(os.getcwd(), f"result.{fmt}")
     else:
-        lots_dir, out_path = _default_paths()
+        lots_dir, out_path = _default_paths(fmt)
         if not os.path.isdir(lots_dir):
             chosen_lots, chosen_out = _choose_paths_gui(_base_dir())
             if chosen_lots:
                 lots_dir, out_path = chosen_lots, chosen_out
 
     print(f"启动 SUM 汇总：lots_dir={lots_dir} -> out={out_path}")
-    return aggregator_main(["sum_aggregator.py", lots_dir, out_path])
+    return aggregator_main(["sum_aggregator.py", lots_dir, out_path, "--jobs", str(args.jobs), *passthrough])
 
 
 if __name__ == "__main__":
+    # 打包为可执行文件后，进程池的子进程需要 freeze_support 才能正常启动（Windows）
+    multiprocessing.freeze_support()
     sys.exit(main())
\ No newline at end of file
@@ -1,4 +1,5 @@
 import os
+import functools
 import json
 import sys
 import re
@@ -7,7 +8,6 @@ import shutil
 import threading
 import time
 import uuid
-from concurrent.futures import ThreadPoolExecutor
 
 from django.http import HttpResponse, JsonResponse, FileResponse
 from django.views.decorators.csrf import csrf_exempt
@@ -30,6 +30,11 @@ try:
     from tools.calcSumXlsx import sum_aggregator as sa
 except Exception:
     sa = None
+from tools.calcSumXlsx.file_copy import CopyStage
+from tools.calcSumXlsx.lot_manifest import PREPARE_MODES, ManifestStage
+from tools.calcSumXlsx.lot_matcher import LotMatcher
+from tools.calcSumXlsx.mirror_cache import MirrorReader, mirror_max_bytes
+from tools.calcSumXlsx.share_walker import folder_date_end, walk
 
 
 # 已统一为静态页面：请使用 index_static 提供的 client/index.html
@@ -137,23 +142,6 @@ def _resolve_slt_summary_root(user_root: str | None = None) -> Path:
     return Path(raw)
 
 
-def _copy_with_collision(src: Path, dest_dir: Path) -> str:
-    """将文件复制到目标目录，若重名则自动添加 (1), (2) ... 后缀，返回最终文件名。"""
-    import shutil
-    dest_dir.mkdir(parents=True, exist_ok=True)
-    base = src.name
-    name, ext = os.path.splitext(base)
-    candidate = base
-    idx = 1
-    dest = dest_dir / candidate
-    while dest.exists():
-        candidate = f"{name}({idx}){ext}"
-        dest = dest_dir / candidate
-        idx += 1
-    shutil.copy2(str(src), str(dest))
-    return candidate
-
-
 def api_fs_list(request):
     """列出目录内容。默认浏览 lots 目录。"""
     path = request.GET.get('path') or str(BASE_ROOT / 'lots')
@@ -168,6 +156,114 @@ def api_fs_list(request):
         return JsonResponse({'ok': False, 'error': str(exc)})
 
 
+def _parse_prepare_body(body: dict):
+    """解析准备请求的公共字段，返回 (norm_lots, src_root, threshold_ts, error)；error 非空时其余值无意义。"""
+    lot_names = body.get('lot_names') or []
+    source_root = body.get('source_root')
+    # 新增：近 N 天过滤（整数，单位：天）。不填则全量扫描
+    try:
+        recent_days = int(body.get('recent_days')) if body.get('recent_days') is not None else None
+        if isinstance(recent_days, int) and recent_days <= 0:
+            recent_days = None
+    except Exception:
+        recent_days = None
+    threshold_ts = (time.time() - recent_days * 86400) if isinstance(recent_days, int) else None
+    if not isinstance(lot_names, list) or not lot_names:
+        return None, None, None, '请提供至少一个 lot 名（数组）'
+
+    # 规范化 lot 名列表：去重、去空格、转小写
+    norm_lots = []
+    seen = set()
+    for ln in lot_names:
+        s = str(ln or '').strip()
+        if not s:
+            continue
+        sl = s.lower()
+        if sl not in seen:
+            seen.add(sl)
+            norm_lots.append(sl)
+    if not norm_lots:
+        return None, None, None, 'lot 名列表为空'
+
+    src_root = _resolve_slt_summary_root(source_root)
+    if not src_root.exists() or not src_root.is_dir():
+        return None, None, None, f'源目录不可访问：{src_root}. 请在 config/config.json 设置 SLT_SUMMARY_ROOT 或配置环境变量 SLT_SUMMARY_ROOT。'
+    return norm_lots, src_root, threshold_ts, ''
+
+
+def _run_options(body: dict) -> dict:
+    """汇总参数（api_sum_run 与边准备边汇总共用）。"""
+    use_tp_filter = bool(body.get('use_tp_filter'))
+    tp_name = (body.get('tp_name') or '').strip()
+    # 按 Program ID 拆分：split_by_tp=true 取所有出现过的 Program ID，或用 tp_names 指定列表；
+    # 每个 lot 只解析一次，输出 all 表及每个 Program ID 一张表
+    tp_names = body.get('tp_names')
+    if not isinstance(tp_names, list):
+        tp_names = None
+    else:
+        tp_names = [str(t).strip() for t in tp_names if str(t or '').strip()] or None
+    return {
+        'tp_filter': tp_name if use_tp_filter and tp_name else None,
+        # 解析缓存：默认启用；use_cache=false 跳过，clear_cache=true 先清空
+        'use_cache': body.get('use_cache') is not False,
+        'clear_cache': bool(body.get('clear_cache')),
+        # TpName 过滤时先只读文件头部判断 Program ID（默认启用；tp_prefilter=false 关闭）。
+        # 头部已排除的文件不做完整解析，其中损坏的文件不再导致汇总失败；需要严格校验时关闭
+        'tp_prefilter': body.get('tp_prefilter') is not False,
+        # 解析过程中后台预取各 Program ID 的 Mapping（默认启用；prefetch_remarks=false 关闭）
+        'prefetch_remarks': body.get('prefetch_remarks') is not False,
+        'split_by_tp': bool(body.get('split_by_tp')),
+        'tp_names': tp_names,
+        # 清单中的共享盘源文件经由本地镜像读取（默认启用；use_mirror=false 直接读共享盘）
+        'use_mirror': body.get('use_mirror') is not False,
+        # Excel 写出引擎：默认 xlsxwriter 流式写出；openpyxl 需显式指定
+        'excel_engine': (body.get('excel_engine') or 'xlsxwriter').strip(),
+        # 输出格式与布局：format 为 xlsx / csv / jsonl / parquet，layout 为 wide / long
+        'format': (body.get('format') or 'xlsx').strip().lower(),
+        'layout': (body.get('layout') or 'wide').strip().lower(),
+    }
+
+
+def _write_tables(tables, run: dict) -> dict:
+    """按汇总参数写出结果到 exports，返回 filename、download_url、output。"""
+    report = sa.write_result(
+        tables,
+        str(EXPORTS_DIR / sa.default_output_name(run['format'])),
+        fmt=run['format'],
+        layout=run['layout'],
+        engine=run['excel_engine'],
+    )
+    rel_name = os.path.basename(report.path)
+    return {
+        'filename': rel_name,
+        'download_url': f"/api/sum/download/{rel_name}",
+        'output': report.to_dict(),
+    }
+
+
+def _prepare_options(body: dict) -> dict:
+    """准备任务的可选参数（PrepareJob 关键字参数）：use_catalog、walk_workers、prune_dirs、prune_by_name、copy_workers、dedup、dedup_hash、mode、use_mirror、aggregate。"""
+    def _positive_int(key):
+        try:
+            n = int(body[key]) if body.get(key) is not None else None
+        except Exception:
+            return None
+        return n if n is not None and n > 0 else None
+
+    return {
+        'use_catalog': body.get('use_catalog') is not False,
+        'walk_workers': _positive_int('walk_workers'),
+        'copy_workers': _positive_int('copy_workers'),
+        'prune_dirs': body.get('prune_dirs') is True,
+        'prune_by_name': body.get('prune_by_name') is True,
+        'dedup': body.get('dedup') is not False,
+        'dedup_hash': body.get('dedup_hash') is True,
+        'mode': body.get('mode') if body.get('mode') in PREPARE_MODES else 'copy',
+        'use_mirror': body.get('use_mirror') is not False,
+        'aggregate': _run_options(body) if body.get('aggregate') is True else None,
+    }
+
+
 @csrf_exempt
 def api_sum_prepare(request):
     """第一步：根据用户输入的多个 lot 名，从 SLT_Summary 递归筛选 SUM 文件并复制到 lots/ 下。
@@ -175,116 +271,41 @@ def api_sum_prepare(request):
     请求（POST JSON）：
     {
       "lot_names": ["smx", "lot2"],  // 不区分大小写，作为文件名包含判断
-      "source_root": "//server/SLT_Summary" // 可选；留空则读取 config 或环境变量
+      "source_root": "//server/SLT_Summary", // 可选；留空则读取 config 或环境变量
+      "use_catalog": true, // 可选；默认从本地文件目录查找，false 时直接遍历共享盘
+      "walk_workers": 8, // 可选；遍历共享盘的列目录线程数，默认读取配置 SUM_WALK_WORKERS
+      "recent_days": 7, // 可选；只取近 N 天修改的文件
+      "prune_dirs": false, // 可选；配合 recent_days，跳过 mtime 早于阈值的目录（整棵子树）
+      "prune_by_name": false, // 可选；配合 recent_days，跳过名称为早于阈值的日期（如 2023、2023-05、20230515）的目录
+      "copy_workers": 4, // 可选；复制线程数，默认读取配置 SUM_COPY_WORKERS
+      "dedup": true, // 可选；目标目录已有同名、同大小、同修改时间的文件时跳过，false 时仍按 name(n) 另存
+      "dedup_hash": false, // 可选；去重时另外比对内容哈希
+      "mode": "copy", // 可选；copy 复制文件，manifest 只记录源文件路径（汇总直接读共享盘），link 优先建立硬/符号链接
+      "use_mirror": true, // 可选；manifest/link 模式边准备边汇总及汇总清单源文件时经由本地镜像缓存读取共享盘文件（copy 模式不经镜像）
+      "aggregate": false // 可选；true 时边准备边汇总，完成后直接给出结果下载链接（汇总参数同 api_sum_run）
     }
 
     过滤规则：
     - 仅复制扩展名为 .SUM 或 .txt 的文件；
     - 文件名需包含任意一个 lot 名（不区分大小写）；
     - 文件名包含 ENG 或 SPC（不区分大小写）则排除；
-    - 递归扫描 source_root 的所有子目录。
-    返回：每个 lot 的复制数量与目标目录。
+    - 递归扫描 source_root 的所有子目录（多线程并行列目录）。
+    - 剪枝只作用于遍历共享盘；从本地文件目录查找时近 N 天过滤直接在目录的 mtime 索引上完成。
+    与异步任务使用同一套流程（同步执行完再返回）。
+    返回：每个 lot 的复制数量、因重复跳过的数量与目标目录；aggregate=true 时另有 result（下载链接等）。
     """
     if request.method != 'POST':
         return JsonResponse({'ok': False, 'error': '仅支持 POST'})
     try:
         body = json.loads(request.body or '{}')
-        lot_names = body.get('lot_names') or []
-        source_root = body.get('source_root')
-        # 新增：近 N 天过滤（整数，单位：天）。不填则全量扫描
-        try:
-            recent_days = int(body.get('recent_days')) if body.get('recent_days') is not None else None
-            if isinstance(recent_days, int) and recent_days <= 0:
-                recent_days = None
-        except Exception:
-            recent_days = None
-        threshold_ts = (time.time() - recent_days * 86400) if isinstance(recent_days, int) else None
-        if not isinstance(lot_names, list) or not lot_names:
-            return JsonResponse({'ok': False, 'error': '请提供至少一个 lot 名（数组）'})
-
-        # 规范化 lot 名列表：去重、去空格、转小写
-        norm_lots = []
-        seen = set()
-        for ln in lot_names:
-            s = str(ln or '').strip()
-            if not s:
-                continue
-            sl = s.lower()
-            if sl not in seen:
-                seen.add(sl)
-                norm_lots.append(sl)
-        if not norm_lots:
-            return JsonResponse({'ok': False, 'error': 'lot 名列表为空'})
-
-        src_root = _resolve_slt_summary_root(source_root)
-        if not src_root.exists() or not src_root.is_dir():
-            return JsonResponse({'ok': False, 'error': f'源目录不可访问：{src_root}. 请在 config/config.json 设置 SLT_SUMMARY_ROOT 或配置环境变量 SLT_SUMMARY_ROOT。'})
-
-        # 结果统计
-        stats = {ln: {'copied': 0, 'dest': str(LOTS_DIR / ln)} for ln in norm_lots}
-
-        # 性能优化：
-        # - 使用 os.scandir 遍历提升目录性能
-        # - 预编译正则进行匹配（不区分大小写）
-        # - 使用线程池并行复制，大幅提高 I/O 吞吐
-        exclude_re = re.compile(r'(eng|spc)', re.IGNORECASE)
-        lots_re = re.compile(r'(?:' + '|'.join(map(re.escape, norm_lots)) + r')', re.IGNORECASE)
-        valid_ext = ('.sum', '.txt')
-
-        from concurrent.futures import ThreadPoolExecutor
-        lock = threading.Lock()
-        with ThreadPoolExecutor(max_workers=8) as pool:
-            stack = [src_root]
-            while stack:
-                base = stack.pop()
-                try:
-                    with os.scandir(base) as it:
-                        for entry in it:
-                            if entry.is_dir(follow_symlinks=False):
-                                stack.append(Path(entry.path))
-                                continue
-                            if not entry.is_file(follow_symlinks=False):
-                                continue
-                            # 若设置了近 N 天过滤，使用 mtime 过滤较早文件
-                            if threshold_ts is not None:
-                                try:
-                                    st = entry.stat(follow_symlinks=False)
-                                    if st.st_mtime < threshold_ts:
-                                        continue
-                                except Exception:
-                                    # 获取 stat 失败则不进行 mtime 过滤
-                                    pass
-                            name = entry.name
-                            lower = name.lower()
-                            # 扩展名过滤（使用 endswith 更快）
-                            if not lower.endswith(valid_ext):
-                                continue
-                            # 排除 ENG/SPC（正则一次性判断）
-                            if exclude_re.search(name):
-                                continue
-                            # lot 名匹配（预编译正则）
-                            m = lots_re.search(name)
-                            if not m:
-                                continue
-                            matched = m.group(0).lower()
-                            src_file = Path(entry.path)
-                            dest_dir = LOTS_DIR / matched
-
-                            def _copy_one(src=src_file, dest=dest_dir, ln=matched):
-                                try:
-                                    _ = _copy_with_collision(src, dest)
-                                    with lock:
-                                        stats[ln]['copied'] += 1
-                                except Exception:
-                                    # 忽略单个复制错误
-                                    pass
-
-                            pool.submit(_copy_one)
-                except Exception:
-                    # 忽略单个目录的扫描错误，继续
-                    continue
-
-        return JsonResponse({'ok': True, 'stats': stats, 'source_root': str(src_root)})
+        norm_lots, src_root, threshold_ts, error = _parse_prepare_body(body)
+        if error:
+            return JsonResponse({'ok': False, 'error': error})
+        job = PrepareJob(uuid.uuid4().hex, norm_lots, src_root, threshold_ts, **_prepare_options(body))
+        _prepare_worker(job)
+        if job.error:
+            return JsonResponse({'ok': False, 'error': job.error})
+        return JsonResponse({'ok': True, 'stats': job.stats, 'source_root': str(src_root), 'source': job.source, 'result': job.result})
     except Exception as exc:
         return JsonResponse({'ok': False, 'error': str(exc)})
 
@@ -296,14 +317,19 @@ def api_sum_prepare(request):
 PREPARE_JOBS = {}
 
 class PrepareJob:
-    def __init__(self, job_id: str, norm_lots: list[str], src_root: Path, threshold_ts: float | None = None):
+    def __init__(self, job_id: str, norm_lots: list[str], src_root: Path, threshold_ts: float | None = None, use_catalog: bool = True,
+                 walk_workers: int | None = None, prune_dirs: bool = False, prune_by_name: bool = False,
+                 copy_workers: int | None = None, dedup: bool = True, dedup_hash: bool = False, mode: str = 'copy',
+                 use_mirror: bool = True, aggregate: dict | None = None):
         self.job_id = job_id
         self.norm_lots = norm_lots
         self.src_root = src_root
-        self.stats = {ln: {'copied': 0, 'dest': str(LOTS_DIR / ln)} for ln in norm_lots}
+        self.stats = {ln: {'copied': 0, 'skipped': 0, 'dest': str(LOTS_DIR / ln)} for ln in norm_lots}
         self.scanned_files = 0
         self.matched_files = 0
         self.copied_files = 0
+        # 目标目录中已有相同文件（同名、同大小、修改时间一致）而跳过的数量
+        self.skipped_files = 0
         self.running = True
         self.error = ""
         self.start_ts = time.time()
@@ -312,11 +338,53 @@ class PrepareJob:
         self._cancel = False
         self._thread = None
         self.threshold_ts = threshold_ts
+        # 文件来源：catalog（本地文件目录）或 scan（遍历共享盘）；目录不可用时回退到 scan
+        self.use_catalog = use_catalog
+        self.source = 'scan'
+        self.catalog_refresh = None
+        # 遍历共享盘时的列目录线程数；None 时读取配置 SUM_WALK_WORKERS
+        self.walk_workers = walk_workers
+        # 近 N 天过滤时的子树剪枝（需显式开启）：目录 mtime 早于阈值、或目录名是早于阈值的日期时整棵子树不再进入
+        self.prune_dirs = prune_dirs
+        self.prune_by_name = prune_by_name
+        self.pruned_dirs = 0
+        self.pruned_dirs_by_name = 0
+        # 复制线程数；None 时读取配置 SUM_COPY_WORKERS。copy_stage 在复制开始后提供吞吐统计
+        self.copy_workers = copy_workers
+        self.copy_stage = None
+        self.scan_end_ts = None
+        # 去重：默认开启；dedup_hash 时另外比对内容哈希
+        self.dedup = dedup
+        self.dedup_hash = dedup_hash
+        # copy：复制到 lots/<lot>/；manifest：只在 lots/<lot>/sum_manifest.json 记录源路径；link：硬/符号链接，不行再记入清单
+        self.mode = mode
+        # 经由本地镜像缓存读取共享盘文件；mirror_reader 第一次读取时才打开镜像，其 stats 记录命中/未命中与淘汰
+        self.use_mirror = use_mirror
+        self.mirror_reader = None
+        # 边准备边汇总：aggregate 为汇总参数（见 _run_options），None 时只准备。
+        # 文件放置完成时即解析并归并，准备结束后补上 lot 目录中已有的文件并写出结果到 result
+        self.aggregate = aggregate
+        self.aggregator = None
+        self.result = None
         # 预编译匹配规则
         self.exclude_re = re.compile(r'(eng|spc)', re.IGNORECASE)
-        self.lots_re = re.compile(r'(?:' + '|'.join(map(re.escape, norm_lots)) + r')', re.IGNORECASE)
+        # lot 名多时用 Aho–Corasick 自动机，结果与 (?:lot1|lot2|...) 正则一致
+        self.lot_matcher = LotMatcher(norm_lots)
         self.valid_ext = ('.sum', '.txt')
 
+    def _throughput(self) -> dict:
+        """分阶段吞吐：scan（扫描/查找匹配）与 copy（复制）。调用方持有 _lock。"""
+        scan_elapsed = max(0.0, (self.scan_end_ts or time.time()) - self.start_ts)
+        return {
+            'scan': {
+                'files': self.scanned_files,
+                'matched': self.matched_files,
+                'elapsed_seconds': round(scan_elapsed, 3),
+                'files_per_second': round(self.scanned_files / scan_elapsed, 1) if scan_elapsed > 0 else 0.0,
+            },
+            'copy': self.copy_stage.to_dict() if self.copy_stage is not None else None,
+        }
+
     def to_dict(self):
         with self._lock:
             return {
@@ -328,76 +396,224 @@ class PrepareJob:
                 'scanned_files': self.scanned_files,
                 'matched_files': self.matched_files,
                 'copied_files': self.copied_files,
+                'skipped_files': self.skipped_files,
+                'pruned_dirs': self.pruned_dirs,
+                'pruned_dirs_by_name': self.pruned_dirs_by_name,
                 'elapsed_seconds': int((time.time() - self.start_ts) if self.start_ts else 0),
                 'source_root': str(self.src_root),
+                'source': self.source,
+                'mode': self.mode,
+                'catalog_refresh': self.catalog_refresh,
+                'throughput': self._throughput(),
+                'mirror': self.mirror_reader.stats.to_dict() if self.mirror_reader is not None and self.mirror_reader.used else None,
+                'aggregate': self.aggregator.stats() if self.aggregator is not None else None,
+                'result': self.result,
             }
 
     def cancel(self):
         with self._lock:
             self._cancel = True
 
+    def match(self, name: str) -> str | None:
+        """按准备规则判断文件名：扩展名、排除 ENG/SPC 后计入 scanned_files，返回匹配到的 lot 名（小写）或 None。"""
+        # 扩展名过滤
+        if not name.lower().endswith(self.valid_ext):
+            return None
+        # 排除 ENG/SPC（预编译正则一次性判断）
+        if self.exclude_re.search(name):
+            return None
+        matched = self.lot_matcher.search(name)
+        with self._lock:
+            self.scanned_files += 1
+            if matched:
+                self.matched_files += 1
+        return matched
 
-def _prepare_worker(job: PrepareJob):
-    exclude_pat = ('eng', 'spc')
-    valid_ext = job.valid_ext
-    try:
-        # 使用 os.scandir 提升目录遍历性能；复制阶段使用线程池并行 I/O
-        with ThreadPoolExecutor(max_workers=4) as pool:
-            stack = [job.src_root]
-            while stack:
-                base = stack.pop()
+
+def _prune_subtree(job: PrepareJob, entry) -> bool:
+    """近 N 天过滤且开启剪枝时，判断子目录是否整棵跳过（并计数）。
+
+    目录 mtime 只随其直接子项增删改名变化，更深层文件的更新不会反映到上层目录，
+    因此按 mtime 剪枝只适合按日期/lot 分目录、归档后不再写入的共享盘，需显式开启。
+    """
+    if job.threshold_ts is None:
+        return False
+    if job.prune_by_name:
+        end = folder_date_end(entry.name)
+        if end is not None and end < job.threshold_ts:
+            with job._lock:
+                job.pruned_dirs_by_name += 1
+            return True
+    if job.prune_dirs:
+        try:
+            if entry.stat(follow_symlinks=False).st_mtime < job.threshold_ts:
+                with job._lock:
+                    job.pruned_dirs += 1
+                return True
+        except OSError:
+            pass
+    return False
+
+
+def _scan_dir(job: PrepareJob, base: str):
+    """列出一个目录（在列目录线程中执行），返回 (子目录列表, [(源文件路径, 匹配到的 lot 名)])。"""
+    subdirs = []
+    found = []
+    with os.scandir(base) as it:
+        for entry in it:
+            if job._cancel:
+                raise RuntimeError('用户取消')
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if not _prune_subtree(job, entry):
+                        subdirs.append(entry.path)
+                    continue
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+            except OSError:
+                continue
+            # 若设置了近 N 天过滤，使用 mtime 过滤较早文件
+            if job.threshold_ts is not None:
                 try:
-                    with os.scandir(base) as it:
-                        for entry in it:
-                            if job._cancel:
-                                raise RuntimeError('用户取消')
-                            if entry.is_dir(follow_symlinks=False):
-                                stack.append(Path(entry.path))
-                                continue
-                            if not entry.is_file(follow_symlinks=False):
-                                continue
-                            # 若设置了近 N 天过滤，使用 mtime 过滤较早文件
-                            if job.threshold_ts is not None:
-                                try:
-                                    st = entry.stat(follow_symlinks=False)
-                                    if st.st_mtime < job.threshold_ts:
-                                        continue
-                                except Exception:
-                                    pass
-                            name = entry.name
-                            lower = name.lower()
-                            # 扩展名过滤
-                            if not lower.endswith(valid_ext):
-                                continue
-                            # 排除 ENG/SPC
-                            # 使用预编译正则更高效
-                            if job.exclude_re.search(name):
-                                continue
-                            m = job.lots_re.search(name)
-                            matched = m.group(0).lower() if m else None
-                            with job._lock:
-                                job.scanned_files += 1
-                            if not matched:
-                                continue
-                            with job._lock:
-                                job.matched_files += 1
-
-                            src_file = Path(entry.path)
-                            dest_dir = LOTS_DIR / matched
-
-                            def _copy_one(src=src_file, dest=dest_dir, ln=matched):
-                                try:
-                                    final_name = _copy_with_collision(src, dest)
-                                    with job._lock:
-                                        job.stats[ln]['copied'] += 1
-                                        job.copied_files += 1
-                                except Exception:
-                                    pass
-
-                            pool.submit(_copy_one)
+                    st = entry.stat(follow_symlinks=False)
+                    if st.st_mtime < job.threshold_ts:
+                        continue
                 except Exception:
-                    # 忽略单个目录的扫描错误，继续
-                    continue
+                    pass
+            matched = job.match(entry.name)
+            if matched:
+                found.append((Path(entry.path), matched))
+    return subdirs, found
+
+
+def _iter_scan_matches(job: PrepareJob):
+    """并行遍历共享盘（job.walk_workers 个列目录线程），产出 (源文件路径, 匹配到的 lot 名)。
+
+    单个目录扫描出错时忽略并继续；取消时抛出 RuntimeError。
+    """
+    yield from walk(
+        str(job.src_root),
+        lambda base: _scan_dir(job, base),
+        workers=job.walk_workers,
+        cancel=lambda: job._cancel,
+    )
+
+
+def _iter_catalog_matches(job: PrepareJob, catalog):
+    """从本地文件目录查找，产出 (源文件路径, 匹配到的 lot 名)；目录过旧时先增量刷新。
+
+    lot 名经文件名三元组索引查找，ENG/SPC 排除与近 N 天过滤在查询中完成。
+    """
+    from tools.calcSumXlsx.sum_catalog import PREPARE_EXCLUDES
+    refresh = catalog.ensure_fresh(cancel=lambda: job._cancel)
+    with job._lock:
+        job.catalog_refresh = refresh
+    for f in catalog.find(job.norm_lots, since_ts=job.threshold_ts, exclude=PREPARE_EXCLUDES):
+        if job._cancel:
+            raise RuntimeError('用户取消')
+        matched = job.match(f.name)
+        if matched:
+            yield Path(f.path), matched
+
+
+def _open_catalog(job: PrepareJob):
+    if not job.use_catalog:
+        return None
+    # 不吞掉导入错误：发布包缺少 sum_catalog 时应当报错，而不是悄悄退回遍历共享盘
+    from tools.calcSumXlsx.sum_catalog import get_sum_catalog, start_background_refresh
+    catalog = get_sum_catalog(str(job.src_root))
+    if catalog is not None:
+        # 之后由后台线程定期增量刷新，准备任务通常直接命中已刷新的目录
+        start_background_refresh(str(job.src_root))
+    return catalog
+
+
+def _open_mirror(job: PrepareJob):
+    """本地镜像的读取函数（记为 job.mirror_reader，第一次读取时才打开镜像）；未启用或已关闭时返回 None。"""
+    if not job.use_mirror or mirror_max_bytes() <= 0:
+        return None
+    job.mirror_reader = MirrorReader()
+    return job.mirror_reader
+
+
+def _open_stage(job: PrepareJob, reader=None):
+    """按准备模式创建放置阶段：copy 为 CopyStage，manifest/link 为 ManifestStage（接口相同）。
+
+    镜像读取函数只交给 manifest/link：复制模式经由内存读写会失去 copy_file_range/sendfile
+    的内核态复制，且每个文件要多写一份镜像副本，复制本身已在本地留下了副本。
+    """
+    kwargs = {'workers': job.copy_workers, 'dedup': job.dedup, 'verify_hash': job.dedup_hash}
+    if job.mode == 'copy':
+        return CopyStage(**kwargs)
+    return ManifestStage(mode=job.mode, source_root=str(job.src_root), reader=reader, **kwargs)
+
+
+def _open_aggregator(job: PrepareJob, reader=None):
+    if job.aggregate is None:
+        return None
+    if sa is None:
+        raise RuntimeError('tools.calcSumXlsx.sum_aggregator 导入失败')
+    run = job.aggregate
+    return sa.StreamingAggregator(
+        tp_name_filter=run['tp_filter'],
+        split_by_tp=run['split_by_tp'],
+        tp_names=run['tp_names'],
+        use_cache=run['use_cache'],
+        clear_cache=run['clear_cache'],
+        prefetch_remarks=run['prefetch_remarks'],
+        mirror=reader,
+    )
+
+
+def _finish_aggregate(job: PrepareJob, aggregator) -> dict:
+    """补上各 lot 目录中已有的文件（之前准备过的、去重跳过的），写出本次 lot 的汇总结果。"""
+    aggregator.complete([str(LOTS_DIR / ln) for ln in job.norm_lots])
+    sheets = aggregator.results(job.norm_lots)
+    if not any(lots for _name, lots in sheets):
+        raise ValueError('没有找到任何 lot 的 SUM 文件')
+    tables = [(name, sa.build_result_table(lots)) for name, lots in sheets]
+    return _write_tables(tables, job.aggregate)
+
+
+def _prepare_worker(job: PrepareJob):
+    aggregator = None
+    try:
+        catalog = _open_catalog(job)
+        if catalog is not None:
+            job.source = 'catalog'
+            matches = _iter_catalog_matches(job, catalog)
+        else:
+            matches = _iter_scan_matches(job)
+        reader = _open_mirror(job)
+        aggregator = _open_aggregator(job, reader)
+        job.aggregator = aggregator
+        # 复制阶段：有界队列 + 固定复制线程，队列满时扫描阻塞等待
+        with _open_stage(job, reader) as stage:
+            job.copy_stage = stage
+            try:
+                for src_file, matched in matches:
+
+                    def _copied(_name, _size, skipped, ln=matched):
+                        with job._lock:
+                            if skipped:
+                                job.stats[ln]['skipped'] += 1
+                                job.skipped_files += 1
+                            else:
+                                job.stats[ln]['copied'] += 1
+                                job.copied_files += 1
+
+                    on_data = None
+                    if aggregator is not None:
+                        # 复制时已读入内存的内容直接解析归并，不必复制完成后再读一遍
+                        on_data = functools.partial(aggregator.add_bytes, matched)
+                    stage.submit(src_file, LOTS_DIR / matched, on_done=_copied, on_data=on_data)
+            finally:
+                with job._lock:
+                    job.scan_end_ts = time.time()
+        if aggregator is not None:
+            result = _finish_aggregate(job, aggregator)
+            with job._lock:
+                job.result = result
         with job._lock:
             job.running = False
             job.end_ts = time.time()
@@ -406,50 +622,29 @@ def _prepare_worker(job: PrepareJob):
             job.error = str(exc)
             job.running = False
             job.end_ts = time.time()
+    finally:
+        if aggregator is not None:
+            aggregator.close()
 
 
 @csrf_exempt
 def api_sum_prepare_start(request):
-    """启动异步准备任务，返回 job_id。"""
+    """启动异步准备任务，返回 job_id。
+
+    请求字段同 api_sum_prepare；use_catalog=false 时不使用本地文件目录，直接遍历共享盘。
+    """
     if request.method != 'POST':
         return JsonResponse({'ok': False, 'error': '仅支持 POST'})
     try:
         body = json.loads(request.body or '{}')
     except Exception:
         body = {}
-    lot_names = body.get('lot_names') or []
-    source_root = body.get('source_root')
-    # 新增：近 N 天过滤（整数，单位：天）。不填则全量扫描
-    try:
-        recent_days = int(body.get('recent_days')) if body.get('recent_days') is not None else None
-        if isinstance(recent_days, int) and recent_days <= 0:
-            recent_days = None
-    except Exception:
-        recent_days = None
-    threshold_ts = (time.time() - recent_days * 86400) if isinstance(recent_days, int) else None
-    if not isinstance(lot_names, list) or not lot_names:
-        return JsonResponse({'ok': False, 'error': '请提供至少一个 lot 名（数组）'})
-
-    # 规范化 lot 名列表：去重、去空格、转小写
-    norm_lots = []
-    seen = set()
-    for ln in lot_names:
-        s = str(ln or '').strip()
-        if not s:
-            continue
-        sl = s.lower()
-        if sl not in seen:
-            seen.add(sl)
-            norm_lots.append(sl)
-    if not norm_lots:
-        return JsonResponse({'ok': False, 'error': 'lot 名列表为空'})
-
-    src_root = _resolve_slt_summary_root(source_root)
-    if not src_root.exists() or not src_root.is_dir():
-        return JsonResponse({'ok': False, 'error': f'源目录不可访问：{src_root}. 请在 config/config.json 设置 SLT_SUMMARY_ROOT 或配置环境变量 SLT_SUMMARY_ROOT。'})
+    norm_lots, src_root, threshold_ts, error = _parse_prepare_body(body)
+    if error:
+        return JsonResponse({'ok': False, 'error': error})
 
     job_id = uuid.uuid4().hex
-    job = PrepareJob(job_id, norm_lots, src_root, threshold_ts)
+    job = PrepareJob(job_id, norm_lots, src_root, threshold_ts, **_prepare_options(body))
     PREPARE_JOBS[job_id] = job
     t = threading.Thread(target=_prepare_worker, args=(job,), daemon=True)
     job._thread = t
@@ -494,37 +689,75 @@ def api_sum_run(request):
     try:
         body = json.loads(request.body or '{}')
         lots_dir = body.get('lots_dir') or str(BASE_ROOT / 'lots')
-        use_tp_filter = bool(body.get('use_tp_filter'))
-        tp_name = (body.get('tp_name') or '').strip()
+        run = _run_options(body)
+        use_cache = run['use_cache']
         abs_lots = _ensure_safe_path(lots_dir)
         if not abs_lots.exists() or not abs_lots.is_dir():
             return JsonResponse({'ok': False, 'error': 'lots 目录不存在'})
 
         if sa is None:
             return JsonResponse({'ok': False, 'error': 'tools.calcSumXlsx.sum_aggregator 导入失败'})
+        # 并行进程数：默认 1（串行），0 表示使用全部 CPU 核心
+        jobs = sa.resolve_jobs(body.get('jobs'))
 
         # 聚合并写出到 exports
         lot_subdirs = [str(abs_lots / d) for d in os.listdir(abs_lots) if (abs_lots / d).is_dir()]
         if not lot_subdirs:
             return JsonResponse({'ok': False, 'error': 'lots 目录下没有子目录'})
 
-        tp_filter_value = (tp_name if use_tp_filter and tp_name else None)
-        lot_summaries = [sa.aggregate_lot(ld, tp_filter_value) for ld in lot_subdirs]
-        df = sa.build_dataframe(lot_summaries)
-        final_path = sa.write_excel(df, str(EXPORTS_DIR / 'result.xlsx'))
-        rel_name = os.path.basename(final_path)
-        return JsonResponse({'ok': True, 'filename': rel_name, 'download_url': f"/api/sum/download/{rel_name}"})
+        cache_stats = {}
+        if run['split_by_tp'] or run['tp_names']:
+            sheets = sa.aggregate_lots_by_tp(
+                lot_subdirs,
+                run['tp_names'],
+                jobs=jobs,
+                use_cache=use_cache,
+                clear_cache=run['clear_cache'],
+                stats=cache_stats,
+                prefetch_remarks=run['prefetch_remarks'],
+                use_mirror=run['use_mirror'],
+            )
+            tables = [(name, sa.build_result_table(lots)) for name, lots in sheets]
+        else:
+            lot_summaries = sa.aggregate_lots(
+                lot_subdirs,
+                run['tp_filter'],
+                jobs=jobs,
+                use_cache=use_cache,
+                clear_cache=run['clear_cache'],
+                stats=cache_stats,
+                tp_prefilter=run['tp_prefilter'],
+                prefetch_remarks=run['prefetch_remarks'],
+                use_mirror=run['use_mirror'],
+            )
+            tables = [('result', sa.build_result_table(lot_summaries))]
+        mirror_stats = cache_stats.pop('mirror', None)
+        return JsonResponse({
+            'ok': True,
+            **_write_tables(tables, run),
+            'cache': cache_stats if use_cache else None,
+            'mirror': mirror_stats,
+        })
     except Exception as exc:
         return JsonResponse({'ok': False, 'error': str(exc)})
 
 
+_EXPORT_CONTENT_TYPES = {
+    '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    '.csv': 'text/csv; charset=utf-8',
+    '.jsonl': 'application/x-ndjson; charset=utf-8',
+    '.parquet': 'application/vnd.apache.parquet',
+}
+
+
 def api_sum_download(_request, filename: str):
-    """下载生成的 xlsx。"""
+    """下载生成的结果文件（xlsx / csv / jsonl / parquet）。"""
     file_path = EXPORTS_DIR / filename
     if not file_path.exists():
         return JsonResponse({'ok': False, 'error': '文件不存在'})
+    content_type = _EXPORT_CONTENT_TYPES.get(file_path.suffix.lower(), 'application/octet-stream')
     f = open(file_path, 'rb')
-    return FileResponse(f, content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', as_attachment=True, filename=os.path.basename(file_path))
+    return FileResponse(f, content_type=content_type, as_attachment=True, filename=os.path.basename(file_path))
 
 
 @csrf_exempt
@@ -610,12 +843,16 @@ def api_sum_upload_run(request):
         if sa is None:
             return JsonResponse({'ok': False, 'error': 'sum_aggregator 导入失败'})
 
-        # 聚合并写出到 exports
-        lot_summaries = [sa.aggregate_lot(ld) for ld in lot_dirs]
-        df = sa.build_dataframe(lot_summaries)
-        final_path = sa.write_excel(df, str(EXPORTS_DIR / 'result.xlsx'))
-        rel_name = os.path.basename(final_path)
-        return JsonResponse({'ok': True, 'filename': rel_name, 'download_url': f"/api/sum/download/{rel_name}", 'uploaded_files': count})
+        # 聚合并写出到 exports（表单字段 jobs：并行进程数，默认 1）
+        # 上传目录每次都是新的会话目录，缓存无法复用，因此不写入解析缓存
+        lot_summaries = sa.aggregate_lots(lot_dirs, jobs=sa.resolve_jobs(request.POST.get('jobs')), use_cache=False)
+        report = sa.write_result_excel(
+            [('result', sa.build_result_table(lot_summaries))],
+            str(EXPORTS_DIR / 'result.xlsx'),
+            engine=(request.POST.get('excel_engine') or 'xlsxwriter').strip(),
+        )
+        rel_name = os.path.basename(report.path)
+        return JsonResponse({'ok': True, 'filename': rel_name, 'download_url': f"/api/sum/download/{rel_name}", 'uploaded_files': count, 'output': report.to_dict()})
     except Exception as exc:
         return JsonResponse({'ok': False, 'error': str(exc)})
 
@@ -663,14 +900,19 @@ def api_sum_clear(request):
         if norm_targets is not None and lot_dir_name not in norm_targets:
             continue
         # 统计数量
+        paths = []
         for root, dirs, files in os.walk(child):
             deleted_files += len(files)
             deleted_dirs += len(dirs)
+            paths.extend(os.path.join(root, f) for f in files)
         try:
             shutil.rmtree(child)
             removed.append(child.name)
         except Exception as e:
             return JsonResponse({'ok': False, 'error': f'移除 {child.name} 失败: {e}'}, status=500)
+        # 删除的文件不会再被汇总，一并清除其解析缓存记录（清单中的共享盘源文件不在此列，仍可能被其它 lot 使用）
+        if sa is not None:
+            sa.forget_parse_cache(paths)
 
     return JsonResponse({
         'ok': True,
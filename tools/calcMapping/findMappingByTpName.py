@@ -1,7 +1,10 @@
 import os
 import re
+import threading
 import zipfile
+from collections import OrderedDict
 from tools.config_loader import get_config
+from tools.calcMapping.zip_members import list_members, read_member
 
 def _validate_mapping_name(name: str) -> bool:
     return bool(re.compile(r'^OVT FT\+SLT_A V[3-4]\.0_[a-zA-Z0-9]{7}_(Nor|New[0-4])\.mapping$').match(name))
@@ -52,35 +55,29 @@ def _parse_category_remark(text: str) -> dict:
             result.setdefault(cat, s)
     return result
 
-def get_category_remark_map(tp: str) -> dict:
-    directory_path = get_config('MAPPING_ROOT') or ''
-    if not directory_path:
-        # 保持函数健壮性：返回空映射，并提醒配置
-        print("请在 config/config.json 设置 MAPPING_ROOT 或配置环境变量 MAPPING_ROOT")
-        return {}
+def _iter_mapping_sources(directory_path: str, tp: str):
+    """按 MAPPING_ROOT 中的候选顺序，逐个产出各 TP 条目里排名最高的 .mapping：(kind, 容器路径, 成员)。
+
+    kind 为 'zip'（容器为 zip 包，成员为包内路径）或 'dir'（容器与成员均为 .mapping 文件路径）。
+    """
     candidates = [f for f in os.listdir(directory_path) if tp in f]
     for entry in candidates:
         if '.zip' in entry:
             zip_path = os.path.join(directory_path, entry)
             target_path = 'Image/ProductFile/Category/'
             try:
-                with zipfile.ZipFile(zip_path, 'r') as zf:
-                    names = []
-                    for info in zf.infolist():
-                        if not info.is_dir() and info.filename.startswith(target_path) and info.filename.endswith('.mapping'):
-                            name = info.filename.split(target_path)[1]
-                            if _validate_mapping_name(name):
-                                names.append(name)
-                    if names:
-                        best = sorted(names, key=_rank_mapping_name, reverse=True)[0]
-                        target = target_path + best
-                        try:
-                            data = zf.read(target).decode('utf-8', errors='ignore')
-                            return _parse_category_remark(data)
-                        except Exception:
-                            continue
+                # 只取 Category 下成员的位置（按 zip 大小/mtime 缓存），不再遍历整个包
+                names = []
+                for member in list_members(zip_path, target_path):
+                    if member.endswith('.mapping'):
+                        name = member.split(target_path)[1]
+                        if _validate_mapping_name(name):
+                            names.append(name)
             except zipfile.BadZipFile:
                 continue
+            if names:
+                best = sorted(names, key=_rank_mapping_name, reverse=True)[0]
+                yield ('zip', zip_path, target_path + best)
         else:
             cat_dir = os.path.join(directory_path, entry, 'ProductFile', 'Category')
             if not os.path.isdir(cat_dir):
@@ -89,12 +86,169 @@ def get_category_remark_map(tp: str) -> dict:
             if names:
                 best = sorted(names, key=_rank_mapping_name, reverse=True)[0]
                 path = os.path.join(cat_dir, best)
-                try:
-                    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
-                        return _parse_category_remark(f.read())
-                except Exception:
-                    continue
-    return {}
+                yield ('dir', path, path)
+
+def _read_mapping_text(source: tuple) -> str:
+    kind, container, member = source
+    if kind == 'zip':
+        return read_member(container, member).decode('utf-8', errors='ignore')
+    with open(member, 'r', encoding='utf-8', errors='ignore') as f:
+        return f.read()
+
+def _file_identity(path: str):
+    """(路径, mtime_ns, 大小)；文件不可访问时为 None。"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (path, st.st_mtime_ns, st.st_size)
+
+def _get_mapping_index(directory_path: str):
+    try:
+        from tools.calcMapping.mapping_index import get_mapping_index
+    except Exception:
+        return None
+    return get_mapping_index(directory_path)
+
+def _load_category_remark_map(directory_path: str, tp: str) -> tuple:
+    """加载一次，返回 (依据文件的标识, category -> remark)。
+
+    标识取选中的 .mapping 文件（zip 则为 zip 包）；没找到 Mapping 时取 MAPPING_ROOT 目录本身，
+    目录有增删后即会重新查找。优先从本地索引（mapping_index）查找，索引不可用时直接扫描共享目录。
+    """
+    index = _get_mapping_index(directory_path)
+    if index is not None:
+        try:
+            return index.remark_map(tp)
+        except Exception:
+            pass
+    for source in _iter_mapping_sources(directory_path, tp):
+        try:
+            data = _read_mapping_text(source)
+        except Exception:
+            continue
+        return _file_identity(source[1]), _parse_category_remark(data)
+    return _file_identity(directory_path), {}
+
+# -----------------------------
+# 进程内 LRU 缓存
+# -----------------------------
+
+REMARK_CACHE_SIZE = 256
+
+class _RemarkMapCache:
+    """get_category_remark_map 的进程内 LRU 缓存。
+
+    - 键为 (MAPPING_ROOT, TP)，值记录依据文件的 (路径, mtime, 大小)；命中时只 stat 该文件一次，
+      文件变化（或消失）即重新加载；
+    - 同一 TP 的并发调用只有一个线程访问共享目录，其余线程等待其结果（single-flight）。
+    """
+
+    def __init__(self, maxsize: int = REMARK_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def get(self, directory_path: str, tp: str, validate: bool = True) -> dict:
+        key = (directory_path, tp)
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                waiter = self._inflight.get(key) if entry is None else None
+                if entry is None and waiter is None:
+                    waiter = self._inflight[key] = threading.Event()
+                    owner = True
+                else:
+                    owner = False
+            if entry is not None:
+                identity, remark_map = entry
+                if not validate or (identity is not None and _file_identity(identity[0]) == identity):
+                    with self._lock:
+                        if key in self._entries:
+                            self._entries.move_to_end(key)
+                        self.hits += 1
+                    return dict(remark_map)
+                with self._lock:
+                    # 已失效：丢弃后重新走加载流程
+                    if self._entries.get(key) is entry:
+                        del self._entries[key]
+                continue
+            if not owner:
+                waiter.wait()
+                continue
+            try:
+                identity, remark_map = _load_category_remark_map(directory_path, tp)
+                with self._lock:
+                    self.misses += 1
+                    self._entries[key] = (identity, remark_map)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.maxsize:
+                        self._entries.popitem(last=False)
+                return dict(remark_map)
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+                waiter.set()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> dict:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'maxsize': self.maxsize}
+
+_REMARK_CACHE = _RemarkMapCache()
+
+def clear_remark_cache() -> None:
+    """清空进程内的 remark 缓存。"""
+    _REMARK_CACHE.clear()
+
+def remark_cache_info() -> dict:
+    """缓存统计：hits、misses、size、maxsize。"""
+    return _REMARK_CACHE.info()
+
+def _mapping_root() -> str:
+    directory_path = get_config('MAPPING_ROOT') or ''
+    if not directory_path:
+        # 保持函数健壮性：返回空映射，并提醒配置
+        print("请在 config/config.json 设置 MAPPING_ROOT 或配置环境变量 MAPPING_ROOT")
+    return directory_path
+
+def get_category_remark_map(tp: str, use_cache: bool = True) -> dict:
+    directory_path = _mapping_root()
+    if not directory_path:
+        return {}
+    if not use_cache:
+        return _load_category_remark_map(directory_path, tp)[1]
+    return _REMARK_CACHE.get(directory_path, tp)
+
+def get_category_remark_maps(tps, use_cache: bool = True) -> dict:
+    """批量获取：同一批中相同的 TP 只解析一次，返回 {TP: category -> remark}。
+
+    单个 TP 出错时该 TP 返回空映射，不影响其他 TP。
+    """
+    distinct = list(dict.fromkeys(tp for tp in tps if tp))
+    if not distinct:
+        return {}
+    directory_path = _mapping_root()
+    if not directory_path:
+        return {tp: {} for tp in distinct}
+    result = {}
+    for tp in distinct:
+        try:
+            if use_cache:
+                result[tp] = _REMARK_CACHE.get(directory_path, tp)
+            else:
+                result[tp] = _load_category_remark_map(directory_path, tp)[1]
+        except Exception:
+            result[tp] = {}
+    return result
 
 if __name__ == '__main__':
     import sys
@@ -1,10 +1,241 @@
 import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from tools.config_loader import get_config
+from tools.calcMapping.mapping_index import get_mapping_index
+
+# 各 mapping 类型的说明与重流等级（Hardware BIN 等级）
+_MAPPING_TYPES = (
+    ("Nor", "mappingtype为Nor，所有不良品等级都重流", ['1', '2', '3', '4', '5']),
+    ("New0", "mappingType为New0，D级不重流", ['1', '2', '3', '5']),
+    ("New1", "mappingType为New1，B+D级不重流", ['1', '3', '5']),
+    ("New2", "mappingType为New2，C+D级不重流", ['1', '2', '5']),
+    ("New3", "mappingType为New3，B+C级不重流", ['1', '4', '5']),
+    ("New4", "mappingType为New4，B级不重流", ['1', '3', '4', '5']),
+)
+_UNKNOWN_MAPPING_TYPE = "请确认程式内mappingtype类型是否正确"
+REFLOW = 'bin对应等级重流'
+NOT_REFLOW = 'bin对应等级不重流'
+
+# 批量模式默认线程数：每个 TP 只有几次共享盘往返，线程多一些才能把延迟重叠起来
+BATCH_WORKERS = 16
+
+
+def mapping_retest_type(mapping_file: str) -> tuple:
+    """按 mapping 文件名判断类型，返回 (类型说明, 重流等级列表)。"""
+    for tag, desc, retest in _MAPPING_TYPES:
+        if tag in mapping_file:
+            return desc, list(retest)
+    return _UNKNOWN_MAPPING_TYPE, []
+
+
+def classify_mapping_lines(mapping_file: str, lines: list) -> list:
+    """把 mapping 内容（已跳过表头）按重流/不重流分类，返回与 get_info_from_mapping 相同的记录列表。"""
+    mapping_type, mapping_type_retest = mapping_retest_type(mapping_file)
+    results = []
+    for line in lines:
+        parts = line.strip().split('\t')  # 使用制表符分割
+        if len(parts) < 5:
+            continue  # 确保行的长度足够（至少5个部分）
+        software_value = parts[0]  # 获取第一列（Software）
+        stack_value = parts[1]  # 获取第二列（Hardware）
+        results.append({
+            "Bin": software_value,
+            "Bin对应的等级": stack_value,
+            "是否重流": REFLOW if stack_value in mapping_type_retest else NOT_REFLOW,
+            "MappingTypeDes": mapping_type,
+        })
+    return results
+
+
+def split_reflow_bins(results: list) -> dict:
+    """把 classify_mapping_lines 的记录分为重流与不重流的 Bin。"""
+    not_reflows = []
+    reflows = []
+    for item in results:
+        if item['是否重流'] == REFLOW:
+            reflows.append(item['Bin'])
+        elif item['是否重流'] == NOT_REFLOW:
+            not_reflows.append(item['Bin'])
+        else:
+            print(f"{item['Bin']}该 Mapping 有误")
+    return {
+        '重流的 Bin 有': reflows,
+        '不重流的 Bin 有': not_reflows
+    }
+
+
+# -----------------------------
+# mapping 读取（按文件 mtime/大小缓存）
+# -----------------------------
+
+_LINES_CACHE_SIZE = 4096
+_LINES_CACHE = OrderedDict()
+_LINES_LOCK = threading.Lock()
+
+
+def _read_mapping_lines(path: str) -> list:
+    """读取 mapping 的数据行（跳过表头）；同一文件 mtime、大小未变时直接复用上次读取的结果。"""
+    st = os.stat(path)
+    key = (path, st.st_mtime_ns, st.st_size)
+    with _LINES_LOCK:
+        lines = _LINES_CACHE.get(key)
+        if lines is not None:
+            _LINES_CACHE.move_to_end(key)
+            return lines
+    with open(path, 'r', encoding='utf-8') as file:
+        lines = file.readlines()[1:]
+    with _LINES_LOCK:
+        _LINES_CACHE[key] = lines
+        while len(_LINES_CACHE) > _LINES_CACHE_SIZE:
+            _LINES_CACHE.popitem(last=False)
+    return lines
+
+
+def _category_mapping_files(directory_path: str, tp_name: str) -> list:
+    """<MAPPING_ROOT>/<tpName>/ProductFile/Category 下的 .mapping 文件名（优先用本地索引中的文件名列表）。"""
+    entry = None
+    index = get_mapping_index(directory_path)
+    if index is not None:
+        try:
+            entry = index.get_entry(tp_name)
+        except Exception:
+            entry = None
+    if entry is not None and entry.mapping_names is not None:
+        return list(entry.mapping_names)
+    software_files = os.path.join(directory_path, tp_name, "ProductFile", "Category")
+    return [f for f in os.listdir(software_files) if f.endswith('.mapping')]
+
+
+def classify_tp_name(tp_name: str, directory_path: str = None) -> dict:
+    """对单个 tpName（MAPPING_ROOT 下的 TP 文件夹名）做重流分类，出错时写入 error 而不抛出。
+
+    返回 {tp_name, mapping_file, mapping_type, bins, reflow_bins, not_reflow_bins, error, elapsed_seconds}，
+    bins 为 classify_mapping_lines 的记录。
+    """
+    t0 = time.perf_counter()
+    directory_path = directory_path or get_config('MAPPING_ROOT') or ''
+    result = {
+        'tp_name': tp_name,
+        'mapping_file': '',
+        'mapping_type': '',
+        'bins': [],
+        'reflow_bins': [],
+        'not_reflow_bins': [],
+        'error': '',
+    }
+    try:
+        if not directory_path:
+            raise ValueError("未配置 MAPPING_ROOT")
+        mapping_files = _category_mapping_files(directory_path, tp_name)
+        if not mapping_files:
+            raise FileNotFoundError("Category 下没有 .mapping 文件")
+        # 与交互模式一致：取第一个 .mapping
+        mapping_file = mapping_files[0]
+        path = os.path.join(directory_path, tp_name, "ProductFile", "Category", mapping_file)
+        results = classify_mapping_lines(mapping_file, _read_mapping_lines(path))
+        split = split_reflow_bins(results)
+        result.update(
+            mapping_file=mapping_file,
+            mapping_type=mapping_retest_type(mapping_file)[0],
+            bins=results,
+            reflow_bins=split['重流的 Bin 有'],
+            not_reflow_bins=split['不重流的 Bin 有'],
+        )
+    except Exception as exc:
+        result['error'] = f"{type(exc).__name__}: {exc}"
+    result['elapsed_seconds'] = round(time.perf_counter() - t0, 3)
+    return result
+
+
+def resolve_tp_names(items: list, directory_path: str = None) -> list:
+    """把输入展开为 tpName 列表：与 MAPPING_ROOT 下某个 TP 文件夹同名的原样保留，
+    否则视为产品型号，展开为名称包含它的全部 TP 文件夹（与 get_tp_name_from_3270 相同规则）；
+    都找不到时原样保留，由分类结果报告错误。结果去重并保持输入顺序。
+    """
+    directory_path = directory_path or get_config('MAPPING_ROOT') or ''
+    index = get_mapping_index(directory_path) if directory_path else None
+    listing = None
+    names = []
+    for item in items:
+        item = str(item or '').strip()
+        if not item:
+            continue
+        matches = None
+        if index is not None:
+            try:
+                matches = [e.name for e in index.find_entries(item, validate=False) if e.is_dir]
+            except Exception:
+                matches = None
+        if matches is None and directory_path:
+            if listing is None:
+                listing = [f for f in os.listdir(directory_path) if os.path.isdir(os.path.join(directory_path, f))]
+            matches = [f for f in listing if item in f]
+        if not matches or item in matches:
+            names.append(item)
+        else:
+            names.extend(matches)
+    return list(dict.fromkeys(names))
+
+
+def classify_tp_names(tp_names: list, workers: int = BATCH_WORKERS, directory_path: str = None) -> list:
+    """批量分类：在线程池中并行处理各 tpName，结果顺序与输入一致。"""
+    directory_path = directory_path or get_config('MAPPING_ROOT') or ''
+    if not tp_names:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(int(workers or 1), len(tp_names)))) as pool:
+        return list(pool.map(lambda tp: classify_tp_name(tp, directory_path), tp_names))
+
+
+def write_batch_csv(results: list, out_path: str) -> None:
+    """每个 tpName × Bin 一行；分类失败的 tpName 写一行，error 列给出原因。"""
+    import csv
+
+    columns = ['tp_name', 'mapping_file', 'mapping_type', 'bin', 'grade', 'reflow', 'error']
+    with open(out_path, 'w', encoding='utf-8-sig', newline='') as fh:
+        writer = csv.writer(fh)
+        writer.writerow(columns)
+        for r in results:
+            if r['error'] or not r['bins']:
+                writer.writerow([r['tp_name'], r['mapping_file'], r['mapping_type'], '', '', '', r['error']])
+                continue
+            for item in r['bins']:
+                writer.writerow([
+                    r['tp_name'], r['mapping_file'], r['mapping_type'],
+                    item['Bin'], item['Bin对应的等级'], int(item['是否重流'] == REFLOW), '',
+                ])
+
+
+def write_batch_json(results: list, out_path: str) -> None:
+    """每个 tpName 一个对象（不含逐条 bins 明细，只给出重流/不重流的 Bin 列表）。"""
+    import json
+
+    payload = [{k: v for k, v in r.items() if k != 'bins'} for r in results]
+    with open(out_path, 'w', encoding='utf-8') as fh:
+        json.dump(payload, fh, ensure_ascii=False, indent=2)
+
+
+def _read_tp_list(path: str) -> list:
+    """读取 TP 列表文件：每行一个，忽略空行与 # 开头的注释，行内逗号分隔也可。"""
+    items = []
+    with open(path, 'r', encoding='utf-8-sig') as fh:
+        for line in fh:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            items.extend(t.strip() for t in line.split(',') if t.strip())
+    return items
 
 
 class mapping_bin():  # 要加上self归类
-    def __init__(self, TP):
+    def __init__(self, TP, tpName=None):
         self.TP = TP
+        # 交互模式下由 get_tp_name_from_3270 设置；直接调用 get_info_from_mapping 时默认与 TP 相同
+        self.tpName = tpName or TP
+        self.results = []
 
     # 定义函数 查找 mapping 文件并读取内容 入参： tpName 输出 list(bin是否重流)
     # 需求： 根据TP在3270文件夹下查询大mapping对应名称, 请使用Python根据给出的TffP给出重流与不重流的bin有那些。
@@ -14,87 +245,21 @@ class mapping_bin():  # 要加上self归类
         if not directory_path:
             print("请在 config/config.json 设置 MAPPING_ROOT 或配置环境变量 MAPPING_ROOT")
             return []
-        # 2. 查找 mapping 文件：<MAPPING_ROOT>/<TP>/ProductFile/Category
+        # 2. 查找 mapping 文件：<MAPPING_ROOT>/<TP>/ProductFile/Category（优先用本地索引中的文件名列表）
         software_files = os.path.join(directory_path, self.tpName, "ProductFile", "Category")
-        mapping_files = [f for f in os.listdir(software_files) if f.endswith('.mapping')]  # 列表推导式
-        print('11111', mapping_files)
+        mapping_files = _category_mapping_files(directory_path, self.tpName)
         # 因为我遇到的这个文件夹下有且仅有一个文件，所以取第零位
         mapping_file = mapping_files[0]
         open_mapping_file = os.path.join(software_files, mapping_file)
-        # 3.判断mapping类型，’r'为只读文件，strip可以去掉两个字符中间的空格，制表符 /t /n
-        results = []
-        mapping_type = ''
-        mapping_type_retest = []
+        # 3.判断mapping类型并逐行分类（同一文件未变化时不重复读取）
         if not os.path.exists(open_mapping_file):
             print("Mapping file not found.")
-            return results
-        else:
-            if "Nor" in mapping_file:  # 判断mapping的种类并打印出来每个等级对应是否重流
-                mapping_type = "mappingtype为Nor，所有不良品等级都重流"
-                mapping_type_retest = ['1', '2', '3', '4', '5']
-            elif "New0" in mapping_file:
-                mapping_type = "mappingType为New0，D级不重流"
-                mapping_type_retest = ['1', '2', '3', '5']
-            elif "New1" in mapping_file:
-                mapping_type = "mappingType为New1，B+D级不重流"
-                mapping_type_retest = ['1', '3', '5']
-            elif "New2" in mapping_file:
-                mapping_type = "mappingType为New2，C+D级不重流"
-                mapping_type_retest = ['1', '2', '5']
-            elif "New3" in mapping_file:
-                mapping_type = "mappingType为New3，B+C级不重流"
-                mapping_type_retest = ['1', '4', '5']
-            elif "New4" in mapping_file:
-                mapping_type = "mappingType为New4，B级不重流"
-                mapping_type_retest = ['1', '3', '4', '5']
-            else:
-                mapping_type = "请确认程式内mappingtype类型是否正确"
-
-        with open(open_mapping_file, 'r', encoding='utf-8') as file:
-            # 读取每一行，跳过第一行（表头）
-            lines = file.readlines()[1:]
-            # print('LINES::::', lines)
-            # 遍历读取的行
-            for line in lines:
-                parts = line.strip().split('\t')  # 使用制表符分割
-                if len(parts) < 5:
-                    continue  # 确保行的长度足够（至少5个部分）
-
-                software_value = parts[0]  # 获取第一列（Software）
-                stack_value = parts[1]  # 获取第二列（Hardware）
-                code_value = parts[2]  # 获取第三列（Code）
-                description = parts[3]  # 获取第四列（Description）
-                pass_value = parts[4]  # 获取第五列（Pass）
-                stack_is_retest = ''  # Stack 说明
-                if stack_value in mapping_type_retest:
-                    stack_is_retest = 'bin对应等级重流'
-                else:
-                    stack_is_retest = 'bin对应等级不重流'
-
-                results.append({
-                    "Bin": software_value,
-                    "Bin对应的等级": stack_value,
-                    "是否重流": stack_is_retest,
-                    "MappingTypeDes": mapping_type,
-                })
-
-        return results
+            return []
+        return classify_mapping_lines(mapping_file, _read_mapping_lines(open_mapping_file))
 
     # 将重流和不重流的bin根据results分类
     def get_reflow_list_from_mapping(self) -> object:
-        not_reflows = []
-        reflows = []
-        for item in self.results:
-            if item['是否重流'] == 'bin对应等级重流':
-                reflows.append(item['Bin'])
-            elif item['是否重流'] == 'bin对应等级不重流':
-                not_reflows.append(item['Bin'])
-            else:
-                print(f"{item['Bin']}该 Mapping 有误")
-        return {
-            '重流的 Bin 有': reflows,
-            '不重流的 Bin 有': not_reflows
-        }
+        return split_reflow_bins(self.results)
 
     # 查询 3270 下 符合输入 tp 的 tpName 有哪些
     def get_tp_name_from_3270(self) -> list:
@@ -104,8 +269,14 @@ class mapping_bin():  # 要加上self归类
             return []
         # 获取 3270 文件夹下 都有哪些文件名
         # 且为了保持唯一性（去除 zip 文件）、需要确保 条件1. 该文件是 文件夹 且 满足名字符合 tp 的文件有哪些（isdir的作用）
-        mapping_files = [f for f in os.listdir(directory_path)
-                         if os.path.isdir(os.path.join(directory_path, f)) and self.TP in f]
+        index = get_mapping_index(directory_path)
+        try:
+            mapping_files = [e.name for e in index.find_entries(self.TP, validate=False) if e.is_dir] if index else None
+        except Exception:
+            mapping_files = None
+        if mapping_files is None:
+            mapping_files = [f for f in os.listdir(directory_path)
+                             if os.path.isdir(os.path.join(directory_path, f)) and self.TP in f]
         print(f'符合 tp 为 {self.TP} 的 tpName 有：{mapping_files}')
         tpname = input('请输入要查询的 tpName: ')
         self.tpName = tpname
@@ -116,8 +287,44 @@ class mapping_bin():  # 要加上self归类
             print(is_reflows)  # for result in results:
 
 
+def main(argv: list) -> int:
+    """批量模式：python -m tools.calcMapping.mappingBinCheck (--tps A,B | --tp-file FILE) [--out result.csv|result.json]"""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="mappingBinCheck", description="批量判断 TP 的重流/不重流 Bin")
+    parser.add_argument("--tps", default="", help="逗号分隔的 tpName 或产品型号（产品型号展开为全部匹配的 tpName）")
+    parser.add_argument("--tp-file", default=None, help="TP 列表文件，每行一个")
+    parser.add_argument("--out", default="mapping_bin_check.csv", help="输出路径，.json 输出 JSON，其余输出 CSV")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help=f"并行线程数，默认 {BATCH_WORKERS}")
+    args = parser.parse_args(argv[1:])
+
+    items = [t.strip() for t in args.tps.split(",") if t.strip()]
+    if args.tp_file:
+        items.extend(_read_tp_list(args.tp_file))
+    directory_path = get_config('MAPPING_ROOT') or ''
+    if not directory_path:
+        print("请在 config/config.json 设置 MAPPING_ROOT 或配置环境变量 MAPPING_ROOT", file=sys.stderr)
+        return 2
+    if not items:
+        print("请通过 --tps 或 --tp-file 提供至少一个 TP", file=sys.stderr)
+        return 2
+
+    t0 = time.perf_counter()
+    tp_names = resolve_tp_names(items, directory_path)
+    results = classify_tp_names(tp_names, workers=args.workers, directory_path=directory_path)
+    if args.out.lower().endswith(".json"):
+        write_batch_json(results, args.out)
+    else:
+        write_batch_csv(results, args.out)
+    failed = sum(1 for r in results if r['error'])
+    print(f"已处理 {len(results)} 个 tpName（失败 {failed}），耗时 {time.perf_counter() - t0:.2f} 秒，输出: {args.out}")
+    return 1 if failed and failed == len(results) else 0
+
+
 # 主逻辑开始 ⬇
 if __name__ == '__main__':  # 判断该段代码是作为脚本执行还是模块导入的，如果是脚本运行就用__name__,如果是导入的下面就不会运行
+    if len(sys.argv) > 1:
+        sys.exit(main(sys.argv))
     tp = input("请输入要查询的产品型号: ")
     mapping_is_reflows = mapping_bin(tp)
-    mapping_is_reflows.get_tp_name_from_3270()
\ No newline at end of file
+    mapping_is_reflows.get_tp_name_from_3270()
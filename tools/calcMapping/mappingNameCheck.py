@@ -1,12 +1,105 @@
 import os
+import sys
+import time
 import zipfile  # 用于解压缩 zip 文件
 import re #引入正则表达式
 from tools.config_loader import get_config
+from tools.calcMapping.findMappingByTpName import _validate_mapping_name
+from tools.calcMapping.mapping_index import MappingIndex, get_mapping_index
+from tools.calcMapping.zip_members import list_members
+
+# 全量审计默认线程数
+AUDIT_WORKERS = 16
+
+
+def _entry_audit_record(entry, seconds: float, rescanned: bool) -> dict:
+    """一个 TP 条目的审计记录。
+
+    status：ok（全部合规）、invalid（有不合规命名）、no_mapping（Category 下没有 .mapping）、
+    no_category（TP 文件夹缺少 ProductFile/Category）、bad_zip（zip 损坏或无法读取）。
+    """
+    names = entry.mapping_names
+    invalid = [n for n in names or [] if not _validate_mapping_name(n)]
+    if names is None:
+        status = 'bad_zip' if entry.kind == 'zip' else 'no_category'
+    elif not names:
+        status = 'no_mapping'
+    elif invalid:
+        status = 'invalid'
+    else:
+        status = 'ok'
+    return {
+        'name': entry.name,
+        'kind': entry.kind,
+        'status': status,
+        'mapping_names': names or [],
+        'invalid_names': invalid,
+        'cached': not rescanned,
+        'elapsed_seconds': round(seconds, 4),
+    }
+
+
+def audit_mapping_names(directory_path: str = None, workers: int = AUDIT_WORKERS, full: bool = False) -> dict:
+    """审计 MAPPING_ROOT 下全部 TP 条目的 mapping 命名，返回结构化报告。
+
+    条目的检查与重扫在线程池中并行进行，结果写入本地索引（mapping_index）：
+    条目及其 Category 目录未变化时直接复用上次结果（cached=True），再次审计只访问有变化的条目；
+    full=True 时全部重扫。索引被关闭（MAPPING_INDEX=0）时使用内存索引，每次都全量扫描。
+    报告含 root、generated_at、summary（各 status 计数与耗时）与 entries（逐条目记录，按列出顺序）。
+    """
+    directory_path = directory_path or get_config('MAPPING_ROOT') or ''
+    if not directory_path:
+        raise ValueError("未配置 MAPPING_ROOT")
+    t0 = time.perf_counter()
+    shared = get_mapping_index(directory_path)
+    index = shared or MappingIndex(db_path=':memory:', root=directory_path)
+    try:
+        details = {}
+        stats = index.refresh(full=full, workers=workers, details=details, deep=True)
+        entries = [
+            _entry_audit_record(e, *details.get(e.name, (0.0, False)))
+            for e in index.all_entries()
+        ]
+    finally:
+        if shared is None:
+            index.close()
+    summary = {'entries': len(entries), 'rescanned': stats['rescanned'], 'removed': stats['removed']}
+    for status in ('ok', 'invalid', 'no_mapping', 'no_category', 'bad_zip'):
+        summary[status] = sum(1 for r in entries if r['status'] == status)
+    summary['elapsed_seconds'] = round(time.perf_counter() - t0, 3)
+    return {
+        'root': directory_path,
+        'generated_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'summary': summary,
+        'entries': entries,
+    }
+
+
+def write_audit_report(report: dict, out_path: str) -> None:
+    """.json 输出完整报告；其余输出 CSV，每个条目一行（名称列表以 | 分隔）。"""
+    if out_path.lower().endswith('.json'):
+        import json
+
+        with open(out_path, 'w', encoding='utf-8') as fh:
+            json.dump(report, fh, ensure_ascii=False, indent=2)
+        return
+    import csv
+
+    with open(out_path, 'w', encoding='utf-8-sig', newline='') as fh:
+        writer = csv.writer(fh)
+        writer.writerow(['name', 'kind', 'status', 'mapping_names', 'invalid_names', 'cached', 'elapsed_seconds'])
+        for r in report['entries']:
+            writer.writerow([
+                r['name'], r['kind'], r['status'], '|'.join(r['mapping_names']), '|'.join(r['invalid_names']),
+                int(r['cached']), r['elapsed_seconds'],
+            ])
+
 
 class mappingNameCheck():  # 要加上self归类
     def __init__(self, TP):
-        self.mapping_names = None
-        self.zip_mapping_names = None
+        # 累积所有匹配条目的 mapping 名（每个条目追加，而不是覆盖为最后一个条目）
+        self.mapping_names = []
+        self.zip_mapping_names = []
         self.TP = TP
 
     # 三、公共方法 用于通过正则匹配校验名字是否符合规范
@@ -17,11 +110,31 @@ class mappingNameCheck():  # 要加上self归类
         return bool(patten.match(fileName))
     # 一、获取 mapping name
     def get_mapping_name(self):
+        self.mapping_names = []
+        self.zip_mapping_names = []
         # 1. 指定文件夹路径 - 根路径 3270 文件夹（读取配置或环境变量 MAPPING_ROOT）
         directory_path = get_config('MAPPING_ROOT') or ''
         if not directory_path:
             print("请在 config/config.json 设置 MAPPING_ROOT 或配置环境变量 MAPPING_ROOT")
             return
+        # 2. 优先从本地索引读取各条目 Category 下的 mapping 文件名，不再逐个打开共享目录上的 zip
+        index = get_mapping_index(directory_path)
+        if index is not None:
+            try:
+                entries = index.find_entries(self.TP)
+            except Exception:
+                entries = None
+            if entries is not None:
+                for entry in entries:
+                    if entry.kind == 'zip':
+                        if entry.mapping_names is None:
+                            print(f"zip文件损坏: {entry.path}")
+                        else:
+                            self.zip_mapping_names.extend(entry.mapping_names)
+                    else:
+                        self.mapping_names.extend(entry.mapping_names or [])
+                self.check_name()
+                return
         # 2. 查找 mapping 文件：在 MAPPING_ROOT 下符合 TP 的文件或文件夹有哪些
         files = [f for f in os.listdir(directory_path) if self.TP in f]  # 列表推导式
         # 3. 遍历文件列表
@@ -32,22 +145,17 @@ class mappingNameCheck():  # 要加上self归类
                 zip_path = os.path.join(directory_path, file)
                 target_path = 'Image/ProductFile/Category/'
                 try:
-                    with zipfile.ZipFile(zip_path, 'r') as zip_ref:  # 解压Zip为 zipFile 文件类型
-                        zip_names_results = [] # 初始化一个压缩包 mapping name合集
-                        for file_info in zip_ref.infolist():  # 遍历 平铺子集
-                            # 如果是 Category 文件夹
-                            # if 'ProductFile/Category/' in entry.filename and entry.is_dir():
-                            #     for file_info in zip_ref.infolist():
-                            # 6. 判断筛选出子集中符合条件的 mapping
-                            # ps1: 该文件不是文件夹 且 该文件以Image/ProductFile/Category/开头 且 以.mapping 结尾
-                            if not file_info.is_dir() and file_info.filename.startswith(target_path) \
-                                    and file_info.filename.endswith('.mapping'):
-                                # 7. 如果 这个 文件名 拆分 split Image/ProductFile/Category/ 数组长度大于 1
-                                # 说明 arr[1] 为这个子集的 mapping_name
-                                if len(file_info.filename.split(target_path)) > 1:
-                                    zip_names_results.append(file_info.filename.split(target_path)[1])
-                        # 8. 把这个 mapping name 集合给全局参数
-                        self.zip_mapping_names = zip_names_results
+                    zip_names_results = [] # 初始化一个压缩包 mapping name合集
+                    # 6. 只取 Category 下的成员（位置按 zip 大小/mtime 缓存，不遍历整个压缩包）
+                    for member in list_members(zip_path, target_path):
+                        # ps1: 该文件以Image/ProductFile/Category/开头 且 以.mapping 结尾
+                        if member.endswith('.mapping'):
+                            # 7. 如果 这个 文件名 拆分 split Image/ProductFile/Category/ 数组长度大于 1
+                            # 说明 arr[1] 为这个子集的 mapping_name
+                            if len(member.split(target_path)) > 1:
+                                zip_names_results.append(member.split(target_path)[1])
+                    # 8. 把这个 mapping name 集合追加到全局参数
+                    self.zip_mapping_names.extend(zip_names_results)
                 except zipfile.BadZipFile:
                     print(f"zip文件损坏: {zip_path}")
             # 4. 如果该文件不是压缩包
@@ -56,8 +164,8 @@ class mappingNameCheck():  # 要加上self归类
                 file_path = os.path.join(directory_path, file, 'ProductFile', 'Category')
                 # 6. 遍历查找其子文件有哪些
                 mapping_files = [f for f in os.listdir(file_path) if f.endswith('.mapping')]
-                # 7. 把子所有的 mapping 文件赋值给全局参数
-                self.mapping_names = mapping_files
+                # 7. 把子所有的 mapping 文件追加到全局参数
+                self.mapping_names.extend(mapping_files)
         self.check_name()
     # 二、检查已经已经获取的 mapping Name，是否符合规范
     def check_name(self) -> list:
@@ -73,8 +181,39 @@ class mappingNameCheck():  # 要加上self归类
                 print(r'Category文件夹中的 mapping 命名均符合规范')
             else:
                 print(f'{file} 的命名不符合规范')
+
+
+def main(argv: list) -> int:
+    """全量审计：python -m tools.calcMapping.mappingNameCheck --audit [--out report.json|report.csv]"""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="mappingNameCheck", description="审计 MAPPING_ROOT 下全部 mapping 命名")
+    parser.add_argument("--audit", action="store_true", help="全量审计（必填，用于区分交互模式）")
+    parser.add_argument("--out", default="mapping_name_audit.json", help="报告路径，.json 输出完整报告，其余输出 CSV")
+    parser.add_argument("--workers", type=int, default=AUDIT_WORKERS, help=f"并行线程数，默认 {AUDIT_WORKERS}")
+    parser.add_argument("--full", action="store_true", help="忽略上次结果，全部重扫")
+    args = parser.parse_args(argv[1:])
+    if not args.audit:
+        parser.error("命令行参数只用于全量审计，需加 --audit；不带参数运行进入交互模式")
+    try:
+        report = audit_mapping_names(workers=args.workers, full=args.full)
+    except ValueError:
+        print("请在 config/config.json 设置 MAPPING_ROOT 或配置环境变量 MAPPING_ROOT", file=sys.stderr)
+        return 2
+    write_audit_report(report, args.out)
+    s = report['summary']
+    print(
+        f"已审计 {s['entries']} 个条目（重扫 {s['rescanned']}）：合规 {s['ok']}，不合规 {s['invalid']}，"
+        f"无 mapping {s['no_mapping']}，无 Category {s['no_category']}，zip 损坏 {s['bad_zip']}，"
+        f"耗时 {s['elapsed_seconds']:.2f} 秒，报告: {args.out}"
+    )
+    return 0
+
+
 # 主逻辑开始 ⬇
 if __name__ == '__main__':  # 判断该段代码是作为脚本执行还是模块导入的，如果是脚本运行就用__name__,如果是导入的下面就不会运行
+    if len(sys.argv) > 1:
+        sys.exit(main(sys.argv))
     tp = input("请输入要查询的产品型号: ")
     mapping_is_reflows = mappingNameCheck(tp)
     mapping_is_reflows.get_mapping_name()
\ No newline at end of file
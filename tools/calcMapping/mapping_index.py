@@ -0,0 +1,463 @@
+"""
+MAPPING_ROOT（3270 共享目录）的本地持久化索引（SQLite）。
+
+- 扫描一次 MAPPING_ROOT，按条目（TP 文件夹或 zip 包）记录：
+  Category 下全部 .mapping 文件名、按 _rank_mapping_name 选出的最优合规 .mapping，以及其 category → remark 表；
+- 增量刷新：只重扫修改时间或大小变化的条目，已删除的条目随之移除；
+- 查询时不再 listdir 共享目录：按名称包含 TP 在索引中筛选，只 stat 选中的 .mapping（或 zip 包）确认未变化，
+  变化则只重扫该条目；索引中查不到时，若 MAPPING_ROOT 目录有变化则先刷新再查。
+- 默认位置：项目根目录下 cache/mapping_index.sqlite3（与解析缓存同级，不随发布包打包）。
+
+命令行：python -m tools.calcMapping.mapping_index [--full] [--workers N] 刷新索引并打印统计。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+from tools.calcMapping.findMappingByTpName import _parse_category_remark, _rank_mapping_name, _validate_mapping_name
+from tools.calcMapping.zip_members import list_members, read_member
+from tools.config_loader import get_config
+
+DEFAULT_INDEX_PATH = Path(__file__).resolve().parent.parent.parent / "cache" / "mapping_index.sqlite3"
+CATEGORY_PATH_IN_ZIP = "Image/ProductFile/Category/"
+# 条目命中时 MAPPING_ROOT 目录有变化，距上次刷新超过该秒数才顺带刷新（查不到时总是刷新）
+DEFAULT_MAX_AGE = 300
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    root          TEXT NOT NULL,
+    name          TEXT NOT NULL,
+    ordinal       INTEGER NOT NULL,
+    kind          TEXT NOT NULL,
+    is_dir        INTEGER NOT NULL,
+    mtime_ns      INTEGER NOT NULL,
+    size          INTEGER NOT NULL,
+    cat_mtime_ns  INTEGER,
+    mapping_names TEXT,
+    best          TEXT,
+    best_mtime_ns INTEGER,
+    best_size     INTEGER,
+    remarks       TEXT,
+    PRIMARY KEY (root, name)
+);
+CREATE TABLE IF NOT EXISTS roots (
+    root         TEXT PRIMARY KEY,
+    mtime_ns     INTEGER NOT NULL,
+    refreshed_at REAL NOT NULL
+);
+"""
+
+
+@dataclass
+class MappingEntry:
+    """索引中的一个 TP 条目。
+
+    - kind：'zip'（名称含 .zip）或 'dir'；
+    - mapping_names：Category 下全部 .mapping 文件名（不做命名校验）；Category 不存在或 zip 损坏时为 None；
+    - best：合规 .mapping 中排名最高者（zip 为包内完整路径，dir 为文件完整路径），没有则为 None；
+    - remarks：best 解析出的 category → remark；best 读取失败时为 None。
+    """
+
+    root: str
+    name: str
+    kind: str
+    is_dir: bool
+    mapping_names: Union[List[str], None]
+    best: Union[str, None]
+    remarks: Union[Dict[int, str], None]
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.root, self.name)
+
+    @property
+    def source_path(self) -> Union[str, None]:
+        """remark 依据的文件：zip 为包本身，dir 为 best 文件。"""
+        if not self.best:
+            return None
+        return self.path if self.kind == "zip" else self.best
+
+
+def _stat_key(path: str) -> Union[Tuple[int, int], None]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _scan_entry(root: str, name: str, is_dir: bool, mtime_ns: int, size: int, ordinal: int) -> tuple:
+    """访问共享目录扫描一个条目，返回写入 entries 表的一行。"""
+    path = os.path.join(root, name)
+    kind = "zip" if ".zip" in name else "dir"
+    names: Union[List[str], None] = None
+    cat_mtime_ns = None
+    best = None
+    best_stat = None
+    remarks = None
+    if kind == "zip":
+        try:
+            names = [
+                member.split(CATEGORY_PATH_IN_ZIP)[1]
+                for member in list_members(path, CATEGORY_PATH_IN_ZIP)
+                if member.endswith(".mapping")
+            ]
+        except (zipfile.BadZipFile, OSError):
+            names = None
+        valid = [n for n in names or [] if _validate_mapping_name(n)]
+        if valid:
+            best = CATEGORY_PATH_IN_ZIP + sorted(valid, key=_rank_mapping_name, reverse=True)[0]
+            best_stat = (mtime_ns, size)
+            try:
+                remarks = _parse_category_remark(read_member(path, best).decode("utf-8", errors="ignore"))
+            except Exception:
+                remarks = None
+    else:
+        cat_dir = os.path.join(path, "ProductFile", "Category")
+        try:
+            cat_mtime_ns = os.stat(cat_dir).st_mtime_ns
+            names = [n for n in os.listdir(cat_dir) if n.endswith(".mapping")]
+        except OSError:
+            names = None
+            cat_mtime_ns = None
+        valid = [n for n in names or [] if _validate_mapping_name(n)]
+        if valid:
+            best = os.path.join(cat_dir, sorted(valid, key=_rank_mapping_name, reverse=True)[0])
+            best_stat = _stat_key(best)
+            try:
+                with open(best, "r", encoding="utf-8", errors="ignore") as f:
+                    remarks = _parse_category_remark(f.read())
+            except Exception:
+                remarks = None
+    return (
+        root,
+        name,
+        ordinal,
+        kind,
+        int(is_dir),
+        mtime_ns,
+        size,
+        cat_mtime_ns,
+        None if names is None else json.dumps(names, ensure_ascii=False),
+        best,
+        best_stat[0] if best_stat else None,
+        best_stat[1] if best_stat else None,
+        None if remarks is None else json.dumps(remarks, ensure_ascii=False),
+    )
+
+
+_ENTRY_COLUMNS = (
+    "root, name, ordinal, kind, is_dir, mtime_ns, size, cat_mtime_ns, "
+    "mapping_names, best, best_mtime_ns, best_size, remarks"
+)
+
+
+def _row_to_entry(row: tuple) -> MappingEntry:
+    root, name, _ordinal, kind, is_dir = row[:5]
+    mapping_names, best, remarks = row[8], row[9], row[12]
+    return MappingEntry(
+        root=root,
+        name=name,
+        kind=kind,
+        is_dir=bool(is_dir),
+        mapping_names=None if mapping_names is None else json.loads(mapping_names),
+        best=best,
+        remarks=None if remarks is None else {int(k): v for k, v in json.loads(remarks).items()},
+    )
+
+
+class MappingIndex:
+    """MAPPING_ROOT 索引。一个实例对应一个 SQLite 连接，可跨线程共享（内部加锁）。
+
+    用法：
+        with MappingIndex(root=MAPPING_ROOT) as index:
+            index.refresh()
+            entries = index.find_entries("TPA1234")
+    """
+
+    def __init__(self, db_path: Union[str, Path, None] = None, root: Union[str, None] = None, max_age: float = DEFAULT_MAX_AGE):
+        self.db_path = Path(db_path) if db_path else DEFAULT_INDEX_PATH
+        self.root = root or get_config("MAPPING_ROOT") or ""
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        # 刷新互斥：并发查询同时触发刷新时只刷新一次
+        self._refresh_lock = threading.Lock()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+        try:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.DatabaseError:
+            pass
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    # ------------------------------------------------------------------
+    # 刷新
+    # ------------------------------------------------------------------
+
+    def refresh(
+        self,
+        full: bool = False,
+        workers: int = 1,
+        details: Union[Dict[str, Tuple[float, bool]], None] = None,
+        deep: bool = False,
+    ) -> Dict[str, Union[int, float]]:
+        """列一次 MAPPING_ROOT，重扫新增或 mtime/大小变化的条目（full=True 时全部重扫），删除已消失的条目。
+
+        - deep=True 时，条目本身未变化的 TP 文件夹还会 stat 其 Category 目录，Category 有增删改名也重扫
+          （文件夹的 mtime 只反映直接子项的变化）；
+        - workers > 1 时在线程池中并行检查与重扫条目（共享盘上每个条目耗时主要是往返延迟）；
+        - 传入 details 字典时写入本次各条目的 (处理耗时秒, 是否重扫)，键为条目名。
+        返回统计：entries、rescanned、removed、elapsed_seconds。
+        """
+        if not self.root:
+            raise ValueError("未配置 MAPPING_ROOT")
+        t0 = time.perf_counter()
+        root_stat = os.stat(self.root)
+        listed = []
+        with os.scandir(self.root) as it:
+            for ordinal, de in enumerate(it):
+                try:
+                    st = de.stat()
+                    is_dir = de.is_dir()
+                except OSError:
+                    continue
+                listed.append((de.name, is_dir, st.st_mtime_ns, st.st_size, ordinal))
+        with self._lock:
+            known = {
+                name: (mtime_ns, size, kind, cat_mtime_ns)
+                for name, mtime_ns, size, kind, cat_mtime_ns in self._conn.execute(
+                    "SELECT name, mtime_ns, size, kind, cat_mtime_ns FROM entries WHERE root = ?", (self.root,)
+                )
+            }
+
+        def _process(item: tuple) -> Tuple[Union[tuple, None], float]:
+            name, is_dir, mtime_ns, size, ordinal = item
+            t1 = time.perf_counter()
+            old = known.get(name)
+            stale = full or old is None or old[:2] != (mtime_ns, size)
+            if not stale and deep and old[2] == "dir":
+                cat_key = _stat_key(os.path.join(self.root, name, "ProductFile", "Category"))
+                stale = (cat_key[0] if cat_key else None) != old[3]
+            row = _scan_entry(self.root, name, is_dir, mtime_ns, size, ordinal) if stale else None
+            return row, time.perf_counter() - t1
+
+        if workers > 1 and len(listed) > 1:
+            with ThreadPoolExecutor(max_workers=min(workers, len(listed))) as pool:
+                processed = list(pool.map(_process, listed))
+        else:
+            processed = [_process(item) for item in listed]
+        rows = []
+        ordinals = []
+        for item, (row, seconds) in zip(listed, processed):
+            if row is None:
+                ordinals.append((item[4], self.root, item[0]))
+            else:
+                rows.append(row)
+            if details is not None:
+                details[item[0]] = (seconds, row is not None)
+        gone = set(known) - {item[0] for item in listed}
+        with self._lock:
+            self._conn.executemany(f"INSERT OR REPLACE INTO entries ({_ENTRY_COLUMNS}) VALUES ({', '.join('?' * 13)})", rows)
+            self._conn.executemany("UPDATE entries SET ordinal = ? WHERE root = ? AND name = ?", ordinals)
+            self._conn.executemany("DELETE FROM entries WHERE root = ? AND name = ?", [(self.root, n) for n in gone])
+            self._conn.execute(
+                "INSERT OR REPLACE INTO roots (root, mtime_ns, refreshed_at) VALUES (?, ?, ?)",
+                (self.root, root_stat.st_mtime_ns, time.time()),
+            )
+            self._conn.commit()
+        return {
+            "entries": len(listed),
+            "rescanned": len(rows),
+            "removed": len(gone),
+            "elapsed_seconds": round(time.perf_counter() - t0, 3),
+        }
+
+    def _root_state(self) -> Union[Tuple[int, float], None]:
+        with self._lock:
+            row = self._conn.execute("SELECT mtime_ns, refreshed_at FROM roots WHERE root = ?", (self.root,)).fetchone()
+        return row
+
+    def _refresh_if_root_changed(self, force: bool) -> bool:
+        """MAPPING_ROOT 目录 mtime 与上次刷新不同时刷新；force=False 时还需距上次刷新超过 max_age。"""
+        with self._refresh_lock:
+            state = self._root_state()
+            if state is None:
+                self.refresh()
+                return True
+            if not force and time.time() - state[1] < self.max_age:
+                return False
+            key = _stat_key(self.root)
+            if key is None or key[0] == state[0]:
+                return False
+            self.refresh()
+            return True
+
+    def _revalidate(self, row: tuple) -> Union[tuple, None]:
+        """确认条目中 remark 依据的文件未变化；变化则只重扫该条目，条目已消失返回 None。"""
+        root, name, ordinal, kind, is_dir, mtime_ns, size, cat_mtime_ns = row[:8]
+        best, best_mtime_ns, best_size = row[9], row[10], row[11]
+        path = os.path.join(root, name)
+        if kind == "zip":
+            current = _stat_key(path)
+            if current is not None and current == (mtime_ns, size):
+                return row
+        else:
+            cat_key = _stat_key(os.path.join(path, "ProductFile", "Category"))
+            best_ok = best is None or _stat_key(best) == (best_mtime_ns, best_size)
+            if best_ok and (cat_key[0] if cat_key else None) == cat_mtime_ns:
+                return row
+        try:
+            st = os.stat(path)
+        except OSError:
+            with self._lock:
+                self._conn.execute("DELETE FROM entries WHERE root = ? AND name = ?", (root, name))
+                self._conn.commit()
+            return None
+        fresh = _scan_entry(root, name, os.path.isdir(path), st.st_mtime_ns, st.st_size, ordinal)
+        with self._lock:
+            self._conn.execute(f"INSERT OR REPLACE INTO entries ({_ENTRY_COLUMNS}) VALUES ({', '.join('?' * 13)})", fresh)
+            self._conn.commit()
+        return fresh
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    def _query(self, tp: str) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT {_ENTRY_COLUMNS} FROM entries WHERE root = ? AND instr(name, ?) > 0 ORDER BY ordinal",
+                (self.root, tp),
+            ).fetchall()
+
+    def all_entries(self) -> List[MappingEntry]:
+        """索引中该 MAPPING_ROOT 的全部条目（按列出顺序），不做刷新与校验。"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_ENTRY_COLUMNS} FROM entries WHERE root = ? ORDER BY ordinal", (self.root,)
+            ).fetchall()
+        return [_row_to_entry(row) for row in rows]
+
+    def find_entries(self, tp: str, validate: bool = True) -> List[MappingEntry]:
+        """名称包含 tp 的条目（按 MAPPING_ROOT 列出顺序）；validate=True 时确认各条目的 mapping 未变化。"""
+        if not self.root:
+            return []
+        rows = self._query(tp)
+        if not rows:
+            if self._refresh_if_root_changed(force=True):
+                rows = self._query(tp)
+        elif self._refresh_if_root_changed(force=False):
+            rows = self._query(tp)
+        if validate:
+            rows = [r for r in (self._revalidate(row) for row in rows) if r is not None]
+        return [_row_to_entry(row) for row in rows]
+
+    def get_entry(self, name: str, validate: bool = True) -> Union[MappingEntry, None]:
+        """按条目全名查找（如 mappingBinCheck 中用户选定的 tpName）。"""
+        for entry in self.find_entries(name, validate=validate):
+            if entry.name == name:
+                return entry
+        return None
+
+    def remark_map(self, tp: str) -> Tuple[Union[Tuple[str, int, int], None], Dict[int, str]]:
+        """与 get_category_remark_map 相同的查找规则，返回 (依据文件的 (路径, mtime, 大小), category → remark)。
+
+        按条目顺序取第一个有合规 mapping 且读取成功的条目；都没有时依据为 MAPPING_ROOT 目录本身。
+        """
+        for entry in self.find_entries(tp):
+            if entry.best and entry.remarks is not None:
+                src = entry.source_path
+                key = _stat_key(src)
+                return ((src, key[0], key[1]) if key else None), entry.remarks
+        key = _stat_key(self.root)
+        return ((self.root, key[0], key[1]) if key else None), {}
+
+    def stats(self) -> Dict[str, Union[int, float, None]]:
+        """索引中该 MAPPING_ROOT 的条目数、有合规 mapping 的条目数及上次刷新时间。"""
+        with self._lock:
+            total, with_best = self._conn.execute(
+                "SELECT COUNT(*), COUNT(best) FROM entries WHERE root = ?", (self.root,)
+            ).fetchone()
+        state = self._root_state()
+        return {"entries": total, "with_mapping": with_best, "refreshed_at": state[1] if state else None}
+
+    def close(self) -> None:
+        with self._lock:
+            try:
+                self._conn.commit()
+            finally:
+                self._conn.close()
+
+    def __enter__(self) -> "MappingIndex":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+# -----------------------------
+# 进程内共享实例
+# -----------------------------
+
+_SHARED: Dict[str, MappingIndex] = {}
+_SHARED_LOCK = threading.Lock()
+
+
+def index_enabled() -> bool:
+    """配置 MAPPING_INDEX=0（config.json 或环境变量）可关闭索引，回到直接扫描共享目录。"""
+    return str(get_config("MAPPING_INDEX", "1")).strip().lower() not in ("0", "false", "no", "off")
+
+
+def get_mapping_index(root: Union[str, None] = None) -> Union[MappingIndex, None]:
+    """返回当前 MAPPING_ROOT 的共享索引实例；未配置、已关闭或无法打开时返回 None（调用方回退到直接扫描）。"""
+    root = root or get_config("MAPPING_ROOT") or ""
+    if not root or not index_enabled():
+        return None
+    with _SHARED_LOCK:
+        index = _SHARED.get(root)
+        if index is None:
+            try:
+                index = _SHARED[root] = MappingIndex(root=root)
+            except Exception:
+                return None
+        return index
+
+
+def main(argv: List[str]) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="mapping_index", description="刷新 MAPPING_ROOT 本地索引")
+    parser.add_argument("--root", default=None, help="MAPPING_ROOT，默认读取配置")
+    parser.add_argument("--db", default=None, help="索引文件路径，默认 cache/mapping_index.sqlite3")
+    parser.add_argument("--full", action="store_true", help="忽略修改时间，全部重扫")
+    parser.add_argument("--workers", type=int, default=1, help="并行重扫条目的线程数，默认 1")
+    args = parser.parse_args(argv[1:])
+    root = args.root or get_config("MAPPING_ROOT") or ""
+    if not root:
+        print("请在 config/config.json 设置 MAPPING_ROOT 或配置环境变量 MAPPING_ROOT", file=sys.stderr)
+        return 2
+    with MappingIndex(args.db, root=root) as index:
+        result = index.refresh(full=args.full, workers=args.workers)
+        result.update(index.stats())
+    print(
+        f"索引已刷新：条目 {result['entries']}，重扫 {result['rescanned']}，移除 {result['removed']}，"
+        f"有合规 mapping {result['with_mapping']}，耗时 {result['elapsed_seconds']:.2f} 秒"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,140 @@
+"""
+zip 包内指定目录成员的定点读取。
+
+TP 的 zip 包往往有几百 MB（含固件镜像），而 mapping 查找只关心 Image/ProductFile/Category/ 下的几个小文件：
+- 首次访问某个 zip 时读一次中央目录，只把指定前缀下文件的位置（本地文件头偏移、压缩/原始大小、压缩方式、CRC）
+  缓存在进程内，键为 (路径, 大小, mtime)，zip 被替换后自动失效；
+- 之后列出成员不再打开 zip，读取成员时直接 seek 到本地文件头，一次读出文件头与压缩数据后解压并校验 CRC；
+- 加密或非 stored/deflate 压缩的成员回退到 zipfile 读取。
+"""
+
+from __future__ import annotations
+
+import os
+import struct
+import threading
+import zipfile
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+ZIP_CACHE_SIZE = 512
+# 本地文件头的扩展字段可能比中央目录中的长，多读一点避免二次读取
+_LOCAL_HEADER_SLACK = 256
+_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+_LOCAL_SIGNATURE = b"PK\x03\x04"
+
+
+@dataclass(frozen=True)
+class _MemberLoc:
+    header_offset: int
+    compress_size: int
+    file_size: int
+    compress_type: int
+    crc: int
+    flag_bits: int
+    name_len: int
+    extra_len: int
+
+
+class _ZipDirCache:
+    """(zip 路径, 大小, mtime, 前缀) -> {成员名: 位置} 的 LRU。"""
+
+    def __init__(self, maxsize: int = ZIP_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple, Dict[str, _MemberLoc]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def members(self, zip_path: str, prefix: str) -> Dict[str, _MemberLoc]:
+        path = os.path.abspath(zip_path)
+        st = os.stat(path)
+        key = (path, st.st_size, st.st_mtime_ns, prefix)
+        with self._lock:
+            found = self._entries.get(key)
+            if found is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return found
+        locs: Dict[str, _MemberLoc] = {}
+        with zipfile.ZipFile(path, "r") as zf:
+            for info in zf.infolist():
+                if info.is_dir() or not info.filename.startswith(prefix):
+                    continue
+                locs[info.filename] = _MemberLoc(
+                    header_offset=info.header_offset,
+                    compress_size=info.compress_size,
+                    file_size=info.file_size,
+                    compress_type=info.compress_type,
+                    crc=info.CRC,
+                    flag_bits=info.flag_bits,
+                    name_len=len(info.orig_filename.encode("utf-8", errors="ignore")),
+                    extra_len=len(info.extra),
+                )
+        with self._lock:
+            self.misses += 1
+            # 同一 zip 旧版本（大小或 mtime 不同）的记录一并丢弃
+            for old in [k for k in self._entries if k[0] == path and k[3] == prefix]:
+                del self._entries[old]
+            self._entries[key] = locs
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return locs
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxsize": self.maxsize}
+
+
+_CACHE = _ZipDirCache()
+
+
+def list_members(zip_path: str, prefix: str) -> List[str]:
+    """zip 中以 prefix 开头的文件成员（完整包内路径，按中央目录顺序）。zip 损坏时抛出 zipfile.BadZipFile。"""
+    return list(_CACHE.members(zip_path, prefix))
+
+
+def read_member(zip_path: str, member: str) -> bytes:
+    """定点读取一个成员的内容；成员需位于此前 list_members 用过的前缀下，否则先按其所在目录建立缓存。"""
+    prefix = member.rsplit("/", 1)[0] + "/" if "/" in member else ""
+    locs = _CACHE.members(zip_path, prefix)
+    loc = locs.get(member)
+    if loc is None:
+        raise KeyError(f"There is no item named {member!r} in the archive")
+    if loc.flag_bits & 0x1 or loc.compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+        with zipfile.ZipFile(zip_path, "r") as zf:
+            return zf.read(member)
+    with open(zip_path, "rb") as f:
+        f.seek(loc.header_offset)
+        want = _LOCAL_HEADER.size + loc.name_len + loc.extra_len + loc.compress_size + _LOCAL_HEADER_SLACK
+        buf = f.read(want)
+        if len(buf) < _LOCAL_HEADER.size or buf[:4] != _LOCAL_SIGNATURE:
+            raise zipfile.BadZipFile(f"Bad local file header: {member}")
+        fields = _LOCAL_HEADER.unpack(buf[: _LOCAL_HEADER.size])
+        start = _LOCAL_HEADER.size + fields[10] + fields[11]
+        end = start + loc.compress_size
+        if end > len(buf):
+            buf += f.read(end - len(buf))
+    raw = buf[start:end]
+    data = raw if loc.compress_type == zipfile.ZIP_STORED else zlib.decompress(raw, -15)
+    if len(data) != loc.file_size or zlib.crc32(data) & 0xFFFFFFFF != loc.crc:
+        raise zipfile.BadZipFile(f"Bad CRC-32 for file {member!r}")
+    return data
+
+
+def clear_zip_cache() -> None:
+    """清空进程内的 zip 成员位置缓存。"""
+    _CACHE.clear()
+
+
+def zip_cache_info() -> Dict[str, int]:
+    """缓存统计：hits、misses、size、maxsize。"""
+    return _CACHE.info()
@@ -3,4 +3,11 @@ calcSumXlsx：SUM 汇总工具包。
 
 包含：
 - sum_aggregator.py：读取 lots 目录，生成 result.xlsx。
+- parse_cache.py：SUM 解析结果的持久化缓存（SQLite）。
+- sum_catalog.py：SLT_Summary 共享目录的本地文件目录（SQLite），供准备任务按 lot 名查找。
+- file_copy.py：准备任务的复制阶段（有界队列、内核辅助复制、吞吐统计）。
+- lot_manifest.py：lot 文件清单（只记录共享盘源路径，不复制即可汇总）。
+- lot_matcher.py：文件名中的 lot 名多模式匹配（Aho–Corasick）。
+- share_walker.py：共享盘多线程并行目录遍历（准备任务扫描与目录刷新共用）。
+- mirror_cache.py：SLT_Summary 文件的本地镜像缓存（读穿透、按容量 LRU 淘汰）。
 """
\ No newline at end of file
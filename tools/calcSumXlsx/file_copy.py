@@ -0,0 +1,386 @@
+"""
+准备任务的复制阶段。
+
+- copy_file(src, dest_dir)：复制到目标目录，重名时依次尝试 name(1).ext、name(2).ext……
+  目标文件以独占方式创建（O_EXCL），多个复制线程同时写同名文件时不会互相覆盖，也不需要先逐个 exists() 探测；
+  Linux 上优先 os.copy_file_range（SMB/NFS 挂载可由服务器端直接复制，数据不经过本机），
+  不支持时退回 os.sendfile，其它系统使用 1 MiB 缓冲区复制；之后保留修改时间等元数据（copystat）。
+- CopyStage：有界复制队列 + 固定数量的复制线程。队列满时 submit 阻塞，扫描线程随之放慢，
+  扫描再快也只在内存中保留有限个待复制任务；同时统计复制的文件数、字节数与吞吐。
+- 去重（CopyStage(dedup=True)，默认开启）：目标目录中已有同名（含 name(n).ext 形式）且大小相同、
+  修改时间相差不超过 MTIME_TOLERANCE_NS 的文件时视为同一文件，跳过复制并计入 skipped；
+  verify_hash=True 时还要求内容哈希（BLAKE2b）一致。重复准备同一批 lot 因此不会再生成 (n) 副本，
+  也不会让汇总重复解析同一文件。
+- CopyStage(reader=...)：源文件内容改由 reader 提供，同样读入内存后写出。准备任务只给 ManifestStage
+  传入本地镜像缓存的读取函数（见 mirror_cache）；复制模式不经镜像，保留内核复制，复制结果本身就是本地副本。
+- 边复制边汇总（submit(..., on_data=...)）：新复制的文件改为读入内存再写出，内容交给 on_data 直接解析，
+  汇总不必在复制完成后再从磁盘读一遍；SUM 文件只有几十 KB，放弃内核复制的代价可以忽略。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import shutil
+import stat
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Union
+
+# 默认复制线程数，可用配置 SUM_COPY_WORKERS 覆盖
+DEFAULT_COPY_WORKERS = 4
+# 每个复制线程允许排队的任务数；队列上限 = 线程数 × 该值
+QUEUE_PER_WORKER = 64
+# 非内核复制时的缓冲区大小
+COPY_BUFFER = 1024 * 1024
+# 单次 copy_file_range / sendfile 的最大字节数
+_KERNEL_CHUNK = 64 * 1024 * 1024
+# 判断“同一文件”时允许的修改时间误差（FAT/exFAT 等文件系统只精确到 2 秒）
+MTIME_TOLERANCE_NS = 2_000_000_000
+# 重名副本 name(n).ext 还原为原文件名
+_COPY_SUFFIX_RE = re.compile(r"^(.*)\((\d+)\)(\.[^.]*)?$")
+
+
+def _get_config(key: str, default=None):
+    try:
+        from tools.config_loader import get_config
+    except Exception:
+        return os.environ.get(key, default)
+    return get_config(key, default)
+
+
+def copy_workers(value=None) -> int:
+    """复制线程数：优先取传入值，其次配置 SUM_COPY_WORKERS，默认 DEFAULT_COPY_WORKERS；至少为 1。"""
+    if value is None:
+        value = _get_config("SUM_COPY_WORKERS", DEFAULT_COPY_WORKERS)
+    try:
+        return max(1, int(value))
+    except (TypeError, ValueError):
+        return DEFAULT_COPY_WORKERS
+
+
+def _kernel_copy(fsrc, fdst, size: int) -> bool:
+    """用 copy_file_range，其次 sendfile 复制整个文件；都不可用时返回 False（尚未写入任何数据）。"""
+    infd, outfd = fsrc.fileno(), fdst.fileno()
+    for name in ("copy_file_range", "sendfile"):
+        func = getattr(os, name, None)
+        if func is None:
+            continue
+        offset = 0
+        try:
+            while True:
+                if name == "copy_file_range":
+                    sent = func(infd, outfd, _KERNEL_CHUNK)
+                else:
+                    sent = func(outfd, infd, offset, _KERNEL_CHUNK)
+                if sent == 0:
+                    break
+                offset += sent
+        except OSError:
+            if offset == 0:
+                # 该文件系统不支持，换下一种方式
+                continue
+            raise
+        if offset == 0 and size > 0:
+            # 部分文件系统（如 procfs、某些网络盘）对非空文件返回 0，视为不支持
+            continue
+        return True
+    return False
+
+
+def _open_exclusive(dest_dir: Path, base: str):
+    """以独占方式创建目标文件，重名时加 (1)、(2)… 后缀；返回 (文件对象, 文件名)。"""
+    name, ext = os.path.splitext(base)
+    candidate = base
+    idx = 1
+    while True:
+        try:
+            return open(dest_dir / candidate, "xb"), candidate
+        except FileExistsError:
+            candidate = f"{name}({idx}){ext}"
+            idx += 1
+
+
+def _write_bytes(src: Path, dest_dir: Path, data: bytes, st: os.stat_result) -> str:
+    """把已读入内存的内容写成目标文件（重名自动加后缀），保留修改时间与权限位，返回最终文件名。"""
+    fdst, candidate = _open_exclusive(dest_dir, src.name)
+    try:
+        with fdst:
+            fdst.write(data)
+    except BaseException:
+        try:
+            os.remove(dest_dir / candidate)
+        except OSError:
+            pass
+        raise
+    dest = dest_dir / candidate
+    os.utime(dest, ns=(st.st_atime_ns, st.st_mtime_ns))
+    try:
+        os.chmod(dest, stat.S_IMODE(st.st_mode))
+    except OSError:
+        pass
+    return candidate
+
+
+def copy_file(
+    src: Union[str, Path],
+    dest_dir: Union[str, Path],
+    sink: Union[Callable[[Path, bytes], None], None] = None,
+    reader: Union[Callable[[Path, os.stat_result], bytes], None] = None,
+    st: Union[os.stat_result, None] = None,
+) -> tuple:
+    """将文件复制到目标目录（重名自动加后缀），返回 (最终文件名, 字节数)。
+
+    传入 sink 时整个文件读入内存后写出，复制完成后调用 sink(目标路径, 文件内容)。
+    传入 reader 时源文件内容由 reader(源路径, stat 结果) 提供（如本地镜像缓存），同样整个读入内存后写出；
+    st 为调用方已取得的源文件 stat 结果。
+    """
+    src = Path(src)
+    dest_dir = Path(dest_dir)
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    if sink is not None or reader is not None:
+        if st is None:
+            st = os.stat(src)
+        if reader is not None:
+            data = reader(src, st)
+        else:
+            with open(src, "rb") as fsrc:
+                data = fsrc.read()
+        candidate = _write_bytes(src, dest_dir, data, st)
+        if sink is not None:
+            sink(dest_dir / candidate, data)
+        return candidate, len(data)
+    with open(src, "rb") as fsrc:
+        size = os.fstat(fsrc.fileno()).st_size
+        fdst, candidate = _open_exclusive(dest_dir, src.name)
+        try:
+            with fdst:
+                if not _kernel_copy(fsrc, fdst, size):
+                    shutil.copyfileobj(fsrc, fdst, COPY_BUFFER)
+        except BaseException:
+            # 复制失败不留下半个文件
+            try:
+                os.remove(dest_dir / candidate)
+            except OSError:
+                pass
+            raise
+    shutil.copystat(str(src), str(dest_dir / candidate))
+    return candidate, size
+
+
+def original_name(name: str) -> str:
+    """去掉重名副本后缀：a(2).SUM → a.SUM；不是副本形式时原样返回。"""
+    m = _COPY_SUFFIX_RE.match(name)
+    if not m:
+        return name
+    return m.group(1) + (m.group(3) or "")
+
+
+def file_digest(path: Union[str, Path]) -> str:
+    """文件内容的 BLAKE2b 摘要（16 字节，十六进制）。"""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(COPY_BUFFER), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class DestIndex:
+    """目标目录中已有文件的索引：原文件名 → [(文件名, 大小, mtime_ns)]。
+
+    每个目标目录首次使用时列一次目录，之后随复制更新，不再逐个 exists() 探测。
+    同一目录、同一原文件名的判断与复制由同一把锁串行化，并发复制同名同内容的文件时也只保留一份。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dirs: Dict[str, Dict[str, list]] = {}
+        self._key_locks: Dict[tuple, threading.Lock] = {}
+
+    def _entries(self, dest_dir: Path) -> Dict[str, list]:
+        key = str(dest_dir)
+        with self._lock:
+            entries = self._dirs.get(key)
+            if entries is not None:
+                return entries
+        entries = {}
+        try:
+            with os.scandir(dest_dir) as it:
+                for entry in it:
+                    try:
+                        if not entry.is_file(follow_symlinks=False):
+                            continue
+                        st = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    record = (entry.name, st.st_size, st.st_mtime_ns)
+                    # 同时按自身名称与去掉 (n) 后的名称登记：源文件本身就叫 a(1).SUM 时也能找到
+                    for key in {entry.name, original_name(entry.name)}:
+                        entries.setdefault(key, []).append(record)
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            return self._dirs.setdefault(key, entries)
+
+    def key_lock(self, dest_dir: Path, name: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault((str(dest_dir), name), threading.Lock())
+
+    def find(self, dest_dir: Path, name: str, size: int, mtime_ns: int) -> list:
+        """大小相同、修改时间接近的已有文件名（可能多个）。"""
+        entries = self._entries(dest_dir)
+        with self._lock:
+            return [
+                n for n, sz, mt in entries.get(name, ())
+                if sz == size and abs(mt - mtime_ns) <= MTIME_TOLERANCE_NS
+            ]
+
+    def add(self, dest_dir: Path, name: str, copied_as: str, size: int, mtime_ns: int) -> None:
+        entries = self._entries(dest_dir)
+        with self._lock:
+            entries.setdefault(name, []).append((copied_as, size, mtime_ns))
+
+
+class CopyStage:
+    """有界复制阶段：submit 在排队任务达到上限时阻塞；统计文件数、字节数与吞吐。
+
+    用法：
+        with CopyStage(workers=4) as stage:
+            for src, dest_dir in matches:
+                stage.submit(src, dest_dir, on_done=...)
+        stage.to_dict()
+    """
+
+    def __init__(
+        self,
+        workers: Union[int, None] = None,
+        max_queue: Union[int, None] = None,
+        dedup: bool = True,
+        verify_hash: bool = False,
+        reader: Union[Callable[[Path, os.stat_result], bytes], None] = None,
+    ):
+        self.workers = copy_workers(workers)
+        # 读取源文件内容的函数（如本地镜像缓存）；None 时直接复制源文件
+        self.reader = reader
+        self.dedup = dedup
+        self.verify_hash = verify_hash
+        self._index = DestIndex() if dedup else None
+        self.max_queue = max(1, max_queue or self.workers * QUEUE_PER_WORKER)
+        self._slots = threading.BoundedSemaphore(self.max_queue)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="sum-copy")
+        self._lock = threading.Lock()
+        self.files = 0
+        self.bytes = 0
+        self.errors = 0
+        self.skipped = 0
+        self.skipped_bytes = 0
+        self.queued = 0
+        # 提交方因队列满而阻塞的累计秒数
+        self.blocked_seconds = 0.0
+        self.start_ts: Union[float, None] = None
+        self.end_ts: Union[float, None] = None
+
+    def submit(
+        self,
+        src: Path,
+        dest_dir: Path,
+        on_done: Union[Callable[[str, int, bool], None], None] = None,
+        on_data: Union[Callable[[str, bytes, int, int], None], None] = None,
+    ) -> None:
+        """排队复制一个文件；队列满时阻塞到有空位。
+
+        on_done(文件名, 字节数, 是否因重复跳过) 在复制成功或跳过后于复制线程中调用。
+        on_data(路径, 文件内容, 字节数, mtime_ns) 只对本次新复制的文件调用（先于 on_done），
+        路径是汇总时会看到的路径（复制后的目标文件）。
+        """
+        if not self._slots.acquire(blocking=False):
+            t0 = time.perf_counter()
+            self._slots.acquire()
+            with self._lock:
+                self.blocked_seconds += time.perf_counter() - t0
+        with self._lock:
+            if self.start_ts is None:
+                self.start_ts = time.time()
+            self.queued += 1
+        try:
+            self._pool.submit(self._run, src, dest_dir, on_done, on_data)
+        except BaseException:
+            with self._lock:
+                self.queued -= 1
+            self._slots.release()
+            raise
+
+    def _copy(self, src: Path, dest_dir: Path, on_data=None) -> tuple:
+        """复制或按去重规则跳过，返回 (文件名, 字节数, 是否跳过)。"""
+        sink = None
+        if on_data is not None:
+            def sink(path: Path, data: bytes) -> None:
+                st_dest = os.stat(path)
+                on_data(str(path), data, st_dest.st_size, st_dest.st_mtime_ns)
+        if self._index is None:
+            return copy_file(src, dest_dir, sink, self.reader) + (False,)
+        st = os.stat(src)
+        with self._index.key_lock(dest_dir, src.name):
+            for existing in self._index.find(dest_dir, src.name, st.st_size, st.st_mtime_ns):
+                if not self.verify_hash or file_digest(src) == file_digest(dest_dir / existing):
+                    return existing, st.st_size, True
+            name, size = copy_file(src, dest_dir, sink, self.reader, st)
+            self._index.add(dest_dir, src.name, name, size, st.st_mtime_ns)
+            return name, size, False
+
+    def _run(self, src: Path, dest_dir: Path, on_done, on_data=None) -> None:
+        try:
+            name, size, skipped = self._copy(src, dest_dir, on_data)
+            with self._lock:
+                if skipped:
+                    self.skipped += 1
+                    self.skipped_bytes += size
+                else:
+                    self.files += 1
+                    self.bytes += size
+            if on_done is not None:
+                on_done(name, size, skipped)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+        finally:
+            with self._lock:
+                self.queued -= 1
+                self.end_ts = time.time()
+            self._slots.release()
+
+    def close(self) -> None:
+        """等待已排队的复制全部完成。"""
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self) -> "CopyStage":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def to_dict(self) -> Dict[str, Union[int, float]]:
+        """复制统计：files、bytes、skipped、skipped_bytes、errors、queued、workers、elapsed_seconds、files_per_second、mb_per_second。"""
+        with self._lock:
+            if self.start_ts is None:
+                elapsed = 0.0
+            else:
+                end = self.end_ts if self.queued == 0 and self.end_ts else time.time()
+                elapsed = max(0.0, end - self.start_ts)
+            return {
+                "files": self.files,
+                "bytes": self.bytes,
+                "skipped": self.skipped,
+                "skipped_bytes": self.skipped_bytes,
+                "errors": self.errors,
+                "queued": self.queued,
+                "max_queue": self.max_queue,
+                "workers": self.workers,
+                "blocked_seconds": round(self.blocked_seconds, 3),
+                "elapsed_seconds": round(elapsed, 3),
+                "files_per_second": round(self.files / elapsed, 1) if elapsed > 0 else 0.0,
+                "mb_per_second": round(self.bytes / elapsed / 1e6, 2) if elapsed > 0 else 0.0,
+            }
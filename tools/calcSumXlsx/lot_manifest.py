@@ -0,0 +1,222 @@
+"""
+lot 文件清单（manifest）：不复制文件，直接从共享盘汇总。
+
+准备任务默认把匹配到的 SUM 文件复制到 lots/<lot>/，汇总时再从那里读一遍，I/O 与磁盘占用都翻倍。
+清单模式下准备任务只在 lots/<lot>/sum_manifest.json 中记录源文件路径（及大小、修改时间），
+汇总时 lot 的文件 = 目录中的 SUM 文件 + 清单中的源文件，解析直接读共享盘（解析缓存按路径照常生效）。
+
+- mode="manifest"：只写清单；
+- mode="link"：先尝试硬链接、再尝试符号链接放入 lots/<lot>/（同一文件系统或有权限时可用），都不行才记入清单；
+- 清单与目录中的文件一起参与去重（同名、同大小、修改时间一致视为同一文件），重复准备不会重复记录；
+- 清单中的文件名同样需要符合 SUM 文件规则（扩展名与时间戳），与复制后再列目录的结果一致；
+- 边准备边汇总（submit(..., on_data=...)）时，新链接或记录的文件读一遍源文件交给 on_data，
+  路径为汇总时会看到的路径（链接为 lots/<lot>/ 下的链接，清单条目为源文件）；传入 reader 时经由它读取。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Union
+
+try:
+    from tools.calcSumXlsx.file_copy import MTIME_TOLERANCE_NS, CopyStage, original_name
+except Exception:
+    import sys
+
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from file_copy import MTIME_TOLERANCE_NS, CopyStage, original_name  # type: ignore
+
+MANIFEST_NAME = "sum_manifest.json"
+MANIFEST_VERSION = 1
+PREPARE_MODES = ("copy", "manifest", "link")
+
+
+def manifest_path(lot_dir: Union[str, Path]) -> Path:
+    return Path(lot_dir) / MANIFEST_NAME
+
+
+def read_manifest(lot_dir: Union[str, Path]) -> List[Dict]:
+    """读取 lot 目录的清单条目 [{path, size, mtime_ns}]；没有清单或无法解析时返回空列表。"""
+    try:
+        with open(manifest_path(lot_dir), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return []
+    files = data.get("files") if isinstance(data, dict) else None
+    return [e for e in files or [] if isinstance(e, dict) and e.get("path")]
+
+
+def manifest_files(lot_dir: Union[str, Path]) -> List[str]:
+    """清单中记录的源文件路径（按记录顺序）。"""
+    return [str(e["path"]) for e in read_manifest(lot_dir)]
+
+
+def write_manifest(lot_dir: Union[str, Path], entries: List[Dict], source_root: Union[str, None] = None) -> Path:
+    """写入清单（先写临时文件再替换，汇总同时读取时不会读到半个文件）。"""
+    path = manifest_path(lot_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = {
+        "version": MANIFEST_VERSION,
+        "source_root": source_root,
+        "updated_at": time.time(),
+        "files": entries,
+    }
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+    return path
+
+
+def _link(src: Path, dest: Path) -> bool:
+    """在 dest 建立指向 src 的硬链接，不行再建符号链接；都失败返回 False。"""
+    for make in (os.link, os.symlink):
+        try:
+            make(str(src), str(dest))
+            return True
+        except (OSError, NotImplementedError):
+            continue
+    return False
+
+
+class ManifestStage(CopyStage):
+    """清单/链接模式的准备阶段，与 CopyStage 接口相同（submit / close / to_dict）。
+
+    close() 时把各 lot 的新条目并入已有清单并写回。
+    """
+
+    def __init__(self, mode: str = "manifest", source_root: Union[str, None] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.mode = mode
+        self.source_root = source_root
+        self.linked = 0
+        self.recorded = 0
+        # 目标目录 → 清单条目（含已有清单）；按原文件名索引用于去重
+        self._manifests: Dict[str, List[Dict]] = {}
+        self._by_name: Dict[str, Dict[str, List[Dict]]] = {}
+        self._dirty: set = set()
+        self._manifest_lock = threading.Lock()
+
+    def _entries(self, dest_dir: Path) -> List[Dict]:
+        key = str(dest_dir)
+        with self._manifest_lock:
+            entries = self._manifests.get(key)
+            if entries is None:
+                entries = self._manifests[key] = read_manifest(dest_dir)
+                by_name: Dict[str, List[Dict]] = {}
+                for e in entries:
+                    by_name.setdefault(os.path.basename(str(e["path"])), []).append(e)
+                self._by_name[key] = by_name
+            return entries
+
+    def _recorded_entry(self, dest_dir: Path, src: Path, size: int, mtime_ns: int) -> tuple:
+        """在清单中查找已有记录，返回 (是否重复, 需沿用的已有条目)。
+
+        同一路径但大小或修改时间已变化（源文件被更新）的条目就地更新并标记写回，不算重复，
+        返回该条目，调用方不再追加新条目。
+        """
+        key = str(dest_dir)
+        self._entries(dest_dir)
+        with self._manifest_lock:
+            for e in self._by_name[key].get(src.name, ()):
+                same = e.get("size") == size and abs(int(e.get("mtime_ns") or 0) - mtime_ns) <= MTIME_TOLERANCE_NS
+                if str(e["path"]) == str(src):
+                    if same:
+                        return True, None
+                    e["size"] = size
+                    e["mtime_ns"] = mtime_ns
+                    self._dirty.add(key)
+                    return False, e
+                if self.dedup and same:
+                    return True, None
+        return False, None
+
+    def _feed(self, on_data, path: Path, src: Path, st: os.stat_result) -> None:
+        if on_data is None:
+            return
+        if self.reader is not None:
+            data = self.reader(src, st)
+        else:
+            with open(src, "rb") as f:
+                data = f.read()
+        on_data(str(path), data, st.st_size, st.st_mtime_ns)
+
+    def _copy(self, src: Path, dest_dir: Path, on_data=None) -> tuple:
+        st = os.stat(src)
+        lock = self._index.key_lock(dest_dir, src.name) if self._index is not None else threading.Lock()
+        with lock:
+            # 目录中已有相同文件（之前复制或链接过）
+            if self._index is not None and self._index.find(dest_dir, src.name, st.st_size, st.st_mtime_ns):
+                return src.name, st.st_size, True
+            duplicate, updated = self._recorded_entry(dest_dir, src, st.st_size, st.st_mtime_ns)
+            if duplicate:
+                return src.name, st.st_size, True
+            # 已记入清单的源文件有更新时沿用原条目（已就地更新），不再尝试链接
+            if self.mode == "link" and updated is None:
+                dest_dir.mkdir(parents=True, exist_ok=True)
+                dest = dest_dir / src.name
+                if not dest.exists() and _link(src, dest):
+                    if self._index is not None:
+                        self._index.add(dest_dir, src.name, src.name, st.st_size, st.st_mtime_ns)
+                    with self._lock:
+                        self.linked += 1
+                    self._feed(on_data, dest, src, st)
+                    return src.name, st.st_size, False
+            if updated is None:
+                entry = {"path": str(src), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+                with self._manifest_lock:
+                    self._manifests[str(dest_dir)].append(entry)
+                    self._by_name[str(dest_dir)].setdefault(src.name, []).append(entry)
+                    self._dirty.add(str(dest_dir))
+            with self._lock:
+                self.recorded += 1
+            self._feed(on_data, src, src, st)
+            return src.name, st.st_size, False
+
+    def close(self) -> None:
+        super().close()
+        with self._manifest_lock:
+            dirty = sorted(self._dirty)
+            self._dirty.clear()
+            for key in dirty:
+                write_manifest(key, self._manifests[key], self.source_root)
+
+    def to_dict(self) -> Dict[str, Union[int, float, str]]:
+        """在 CopyStage 统计之外给出 mode、linked（链接数）、recorded（记入清单数）；bytes 为引用的字节数。"""
+        d = super().to_dict()
+        with self._lock:
+            d.update(mode=self.mode, linked=self.linked, recorded=self.recorded)
+        return d
+
+
+def manifest_extra_files(lot_dir: Union[str, Path], local_files: List[str]) -> List[str]:
+    """清单中需要额外汇总的源文件：去掉目录中已有相同文件（同名、同大小、修改时间一致）的条目。
+
+    同一 lot 先后用复制和清单两种方式准备时，同一文件不会被汇总两次。
+    """
+    entries = read_manifest(lot_dir)
+    if not entries:
+        return []
+    local: Dict[str, List[tuple]] = {}
+    for p in local_files:
+        try:
+            st = os.stat(p)
+        except OSError:
+            continue
+        local.setdefault(original_name(os.path.basename(p)), []).append((st.st_size, st.st_mtime_ns))
+    extra: List[str] = []
+    seen = set()
+    for e in entries:
+        path = str(e["path"])
+        if path in seen:
+            continue
+        seen.add(path)
+        size, mtime_ns = e.get("size"), int(e.get("mtime_ns") or 0)
+        if any(sz == size and abs(mt - mtime_ns) <= MTIME_TOLERANCE_NS for sz, mt in local.get(os.path.basename(path), ())):
+            continue
+        extra.append(path)
+    return extra
@@ -0,0 +1,321 @@
+"""
+SLT_Summary 文件的本地镜像缓存（读穿透，按总字节数限额，LRU 淘汰）。
+
+工程师经常反复准备有重叠的 lot，每次都要从慢速共享盘重新读取同一批文件。镜像缓存把读过的源文件内容
+保存在本地磁盘，之后再读同一文件直接取本地副本：
+
+- 以 (源路径, 大小, mtime_ns) 判断是否命中；源文件大小或修改时间变化视为未命中，重新读取后覆盖；
+- 内容文件位于 cache/sum_mirror/data/，索引（路径、大小、修改时间、最近使用时间）在 cache/sum_mirror/index.sqlite3；
+- 总字节数超过上限（配置 SUM_MIRROR_MAX_MB，默认 2048；0 关闭镜像）时按最近使用时间淘汰，降到上限的 90%；
+- 多个线程、多个进程（并行汇总）可同时使用：内容先写临时文件再替换，
+  读取时内容文件已被其它进程淘汰则按未命中处理；
+- 命中时仍需 stat 源文件一次确认未变化（一次往返），省下的是读取内容的往返与带宽。
+
+清单/链接模式的准备任务边准备边汇总时读取源文件内容、以及从清单直接汇总（读取共享盘上的源文件）经由镜像读取；
+复制模式不经镜像（仍走内核复制，复制出的文件本身就是本地副本）。
+MirrorStats 记录一次任务的命中/未命中次数与字节数、淘汰的文件数与字节数；MirrorReader 在第一次读取时才打开镜像。
+
+命令行：python -m tools.calcSumXlsx.mirror_cache --stats 查看占用，--clear 清空。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Union
+
+DEFAULT_MIRROR_DIR = Path(__file__).resolve().parent.parent.parent / "cache" / "sum_mirror"
+# 默认容量上限（MB），可用配置 SUM_MIRROR_MAX_MB 覆盖；0 关闭镜像
+DEFAULT_MIRROR_MAX_MB = 2048
+# 超过上限时淘汰到上限的这个比例，避免每写入一个文件都触发淘汰
+EVICT_TARGET_RATIO = 0.9
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mirror (
+    path      TEXT PRIMARY KEY,
+    size      INTEGER NOT NULL,
+    mtime_ns  INTEGER NOT NULL,
+    blob      TEXT NOT NULL,
+    last_used REAL NOT NULL
+)
+"""
+_INDEX = "CREATE INDEX IF NOT EXISTS mirror_last_used ON mirror (last_used)"
+
+
+def _get_config(key: str, default=None):
+    try:
+        from tools.config_loader import get_config
+    except Exception:
+        return os.environ.get(key, default)
+    return get_config(key, default)
+
+
+def mirror_max_bytes(value=None) -> int:
+    """镜像容量上限（字节）：优先取传入值（MB），其次配置 SUM_MIRROR_MAX_MB，默认 DEFAULT_MIRROR_MAX_MB；0 表示关闭。"""
+    if value is None:
+        value = _get_config("SUM_MIRROR_MAX_MB", DEFAULT_MIRROR_MAX_MB)
+    try:
+        return max(0, int(float(value) * 1024 * 1024))
+    except (TypeError, ValueError):
+        return DEFAULT_MIRROR_MAX_MB * 1024 * 1024
+
+
+class MirrorStats:
+    """一次任务经由镜像读取的统计；可在多个线程中累加，也可并入其它进程返回的 to_dict() 结果。"""
+
+    FIELDS = ("hits", "misses", "hit_bytes", "miss_bytes", "evicted_files", "evicted_bytes")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.hit_bytes = 0
+        self.miss_bytes = 0
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+
+    def add(self, **counts: int) -> None:
+        with self._lock:
+            for key, n in counts.items():
+                setattr(self, key, getattr(self, key) + int(n or 0))
+
+    def merge(self, data: Union[Dict[str, int], None]) -> None:
+        if data:
+            self.add(**{k: data.get(k, 0) for k in self.FIELDS})
+
+    def to_dict(self) -> Dict[str, int]:
+        with self._lock:
+            return {k: getattr(self, k) for k in self.FIELDS}
+
+
+class SumMirror:
+    """本地镜像。一个实例对应一个 SQLite 连接，可在多个线程中共用（内部加锁）。
+
+    用法：
+        mirror = SumMirror()
+        data = mirror.read(path, stats=job_stats)   # 命中读本地副本，未命中读源文件并存入镜像
+    """
+
+    def __init__(self, root: Union[str, Path, None] = None, max_bytes: Union[int, None] = None):
+        self.root = Path(root) if root else DEFAULT_MIRROR_DIR
+        self.max_bytes = mirror_max_bytes() if max_bytes is None else max(0, int(max_bytes))
+        self._data_dir = self.root / "data"
+        self._data_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # 自动提交：每条索引写入立即可见，其它进程不必等本实例关闭
+        self._conn = sqlite3.connect(
+            str(self.root / "index.sqlite3"), timeout=30, check_same_thread=False, isolation_level=None
+        )
+        try:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.DatabaseError:
+            pass
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SCHEMA)
+        self._conn.execute(_INDEX)
+        # 本进程视角的总字节数；其它进程也会写入，淘汰前以索引重新统计为准
+        self._total = self._stored_bytes()
+
+    def _stored_bytes(self) -> int:
+        return int(self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM mirror").fetchone()[0])
+
+    def _blob_path(self, blob: str) -> Path:
+        return self._data_dir / blob[:2] / blob
+
+    # ------------------------------------------------------------------
+    # 读取
+    # ------------------------------------------------------------------
+
+    def _lookup(self, key: str, size: int, mtime_ns: int) -> Union[bytes, None]:
+        with self._lock:
+            row = self._conn.execute("SELECT size, mtime_ns, blob FROM mirror WHERE path = ?", (key,)).fetchone()
+        if row is None or row[0] != size or row[1] != mtime_ns:
+            return None
+        try:
+            with open(self._blob_path(row[2]), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if len(data) != size:
+            return None
+        with self._lock:
+            self._conn.execute("UPDATE mirror SET last_used = ? WHERE path = ?", (time.time(), key))
+        return data
+
+    def read(self, path: Union[str, Path], st: Union[os.stat_result, None] = None, stats: Union[MirrorStats, None] = None) -> bytes:
+        """读取源文件内容：镜像中有大小与修改时间一致的副本时读本地副本，否则读源文件并存入镜像。
+
+        st 为调用方已取得的源文件 stat 结果（省一次往返）；stats 累加本次读取的命中/未命中与淘汰统计。
+        """
+        key = os.path.abspath(str(path))
+        if st is None:
+            st = os.stat(key)
+        data = self._lookup(key, st.st_size, st.st_mtime_ns)
+        if data is not None:
+            if stats is not None:
+                stats.add(hits=1, hit_bytes=len(data))
+            return data
+        with open(key, "rb") as f:
+            data = f.read()
+        if stats is not None:
+            stats.add(misses=1, miss_bytes=len(data))
+        # 读取过程中文件被改写（长度与 stat 不符）时不存入镜像
+        if len(data) == st.st_size and len(data) <= self.max_bytes:
+            try:
+                self._store(key, st.st_size, st.st_mtime_ns, data, stats)
+            except (OSError, sqlite3.Error) as exc:
+                print(f"镜像写入失败（不影响本次读取）: {exc}", file=sys.stderr)
+        return data
+
+    # ------------------------------------------------------------------
+    # 写入与淘汰
+    # ------------------------------------------------------------------
+
+    def _store(self, key: str, size: int, mtime_ns: int, data: bytes, stats: Union[MirrorStats, None]) -> None:
+        blob = hashlib.blake2b(key.encode("utf-8", "surrogateescape"), digest_size=16).hexdigest()
+        dest = self._blob_path(blob)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dest.with_name(f"{blob}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, dest)
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM mirror WHERE path = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO mirror (path, size, mtime_ns, blob, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, int(size), int(mtime_ns), blob, time.time()),
+            )
+            self._total += int(size) - (old[0] if old else 0)
+            over = self._total > self.max_bytes
+        if over:
+            self.evict(stats=stats)
+
+    def evict(self, target: Union[int, None] = None, stats: Union[MirrorStats, None] = None) -> int:
+        """按最近使用时间从旧到新淘汰，直到总字节数不超过 target（默认上限的 EVICT_TARGET_RATIO）；返回淘汰的字节数。"""
+        if target is None:
+            target = int(self.max_bytes * EVICT_TARGET_RATIO)
+        removed: List[tuple] = []
+        with self._lock:
+            total = self._stored_bytes()
+            if total > target:
+                rows = self._conn.execute("SELECT path, size, blob FROM mirror ORDER BY last_used").fetchall()
+                for key, size, blob in rows:
+                    if total <= target:
+                        break
+                    removed.append((key, size, blob))
+                    total -= size
+                self._conn.executemany("DELETE FROM mirror WHERE path = ?", [(k,) for k, _s, _b in removed])
+            self._total = total
+        freed = 0
+        for _key, size, blob in removed:
+            try:
+                os.remove(self._blob_path(blob))
+            except OSError:
+                pass
+            freed += size
+        if stats is not None and removed:
+            stats.add(evicted_files=len(removed), evicted_bytes=freed)
+        return freed
+
+    # ------------------------------------------------------------------
+    # 维护
+    # ------------------------------------------------------------------
+
+    def usage(self) -> Dict[str, int]:
+        """当前镜像的文件数、字节数与上限。"""
+        with self._lock:
+            files, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM mirror").fetchone()
+        return {"files": int(files), "bytes": int(size), "max_bytes": self.max_bytes}
+
+    def clear(self) -> None:
+        """清空镜像（索引与内容文件）。"""
+        with self._lock:
+            self._conn.execute("DELETE FROM mirror")
+            shutil.rmtree(self._data_dir, ignore_errors=True)
+            self._data_dir.mkdir(parents=True, exist_ok=True)
+            self._total = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_SHARED: Dict[str, tuple] = {}
+_SHARED_LOCK = threading.Lock()
+
+
+def get_sum_mirror(root: Union[str, Path, None] = None) -> Union[SumMirror, None]:
+    """本进程共用的镜像实例；容量上限为 0（已关闭）或无法打开时返回 None（调用方直接读源文件）。
+
+    进程池 fork 出的子进程不沿用父进程的 SQLite 连接，会各自重新打开。
+    """
+    if mirror_max_bytes() <= 0:
+        return None
+    key = str(root or DEFAULT_MIRROR_DIR)
+    with _SHARED_LOCK:
+        pid, mirror = _SHARED.get(key, (None, None))
+        if mirror is None or pid != os.getpid():
+            try:
+                mirror = SumMirror(root)
+            except Exception as exc:
+                print(f"本地镜像不可用，直接读取源文件: {exc}", file=sys.stderr)
+                return None
+            _SHARED[key] = (os.getpid(), mirror)
+        return mirror
+
+
+class MirrorReader:
+    """经由本进程共用镜像读取源文件的函数（reader(路径, stat 结果)），统计累加到 stats。
+
+    第一次读取时才打开镜像（创建 cache/sum_mirror 与索引），没有文件需要经由镜像读取的任务不会创建镜像；
+    镜像不可用时直接读源文件。used 为 True 表示确实经由镜像读取过，此时 stats 才有意义。
+    """
+
+    def __init__(self, stats: Union[MirrorStats, None] = None, root: Union[str, Path, None] = None):
+        self.stats = stats if stats is not None else MirrorStats()
+        self.root = root
+        self._mirror: Union[SumMirror, None] = None
+        self._opened = False
+
+    @property
+    def used(self) -> bool:
+        return self._mirror is not None
+
+    def __call__(self, path: Union[str, Path], st: Union[os.stat_result, None] = None) -> bytes:
+        if not self._opened:
+            self._mirror = get_sum_mirror(self.root)
+            self._opened = True
+        if self._mirror is None:
+            with open(path, "rb") as f:
+                return f.read()
+        return self._mirror.read(path, st, self.stats)
+
+
+def main(argv: List[str]) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="mirror_cache", description="SLT_Summary 本地镜像缓存维护")
+    parser.add_argument("--root", default=None, help="镜像目录，默认 cache/sum_mirror")
+    parser.add_argument("--stats", action="store_true", help="显示文件数与占用")
+    parser.add_argument("--clear", action="store_true", help="清空镜像")
+    args = parser.parse_args(argv[1:])
+    mirror = SumMirror(args.root)
+    try:
+        if args.clear:
+            mirror.clear()
+        if args.stats or not args.clear:
+            u = mirror.usage()
+            print(f"镜像 {mirror.root}：{u['files']} 个文件，{u['bytes'] / 1048576:.1f} MB / 上限 {u['max_bytes'] / 1048576:.0f} MB")
+    finally:
+        mirror.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,172 @@
+"""
+SUM 解析结果持久化缓存（SQLite）。
+
+- 以文件路径为主键，记录文件大小、mtime_ns 与解析器版本；三者任一变化即视为失效，
+  下次解析后覆盖写入，因此同一路径只保留一条记录。
+- 缓存内容为解析得到的 TotalPass、TotalFail、Program ID 与明细三列（JSON 序列化），
+  时间戳仍由文件名解析，不写入缓存。
+- 默认位置：项目根目录下 cache/sum_parse_cache.sqlite3（与 exports/ 同级，不随发布包打包）。
+
+本模块不依赖 sum_aggregator，序列化/反序列化由调用方负责。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Tuple, Union
+
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parent.parent.parent / "cache" / "sum_parse_cache.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS parsed_sum (
+    path     TEXT PRIMARY KEY,
+    size     INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    version  INTEGER NOT NULL,
+    payload  TEXT NOT NULL
+)
+"""
+
+
+class SumParseCache:
+    """解析结果缓存。一个实例对应一个 SQLite 连接，可在同一线程内反复使用。
+
+    用法：
+        with SumParseCache(version=PARSER_VERSION) as cache:
+            payload = cache.get(path, st.st_size, st.st_mtime_ns)
+            ...
+            cache.put(path, st.st_size, st.st_mtime_ns, payload)
+
+    退出 with 块时提交写入；hits / misses 记录本实例的命中情况。
+    """
+
+    def __init__(self, db_path: Union[str, Path, None] = None, version: int = 0):
+        self.db_path = Path(db_path) if db_path else DEFAULT_CACHE_PATH
+        self.version = int(version)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # timeout：多进程/多线程同时写入时等待锁，而不是直接报错
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+        try:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.DatabaseError:
+            pass
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SCHEMA)
+        self._conn.commit()
+
+    # ------------------------------------------------------------------
+    # 读写
+    # ------------------------------------------------------------------
+
+    def get(self, path: str, size: int, mtime_ns: int) -> Union[Dict, None]:
+        """命中返回缓存的 payload 字典；文件大小、mtime 或解析器版本不一致视为未命中。"""
+        key = os.path.abspath(path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, version, payload FROM parsed_sum WHERE path = ?", (key,)
+            ).fetchone()
+        if row is None or row[0] != size or row[1] != mtime_ns or row[2] != self.version:
+            self.misses += 1
+            return None
+        try:
+            payload = json.loads(row[3])
+        except ValueError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return payload
+
+    def put(self, path: str, size: int, mtime_ns: int, payload: Dict) -> None:
+        """写入（覆盖）一条记录；在 commit() 或退出 with 块时落盘。"""
+        key = os.path.abspath(path)
+        data = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO parsed_sum (path, size, mtime_ns, version, payload) VALUES (?, ?, ?, ?, ?)",
+                (key, int(size), int(mtime_ns), self.version, data),
+            )
+
+    def commit(self) -> None:
+        with self._lock:
+            self._conn.commit()
+
+    # ------------------------------------------------------------------
+    # 维护
+    # ------------------------------------------------------------------
+
+    def evict_stale(self, check_files: bool = True) -> int:
+        """清除过期记录，返回删除条数。
+
+        - 解析器版本不同的记录一律删除；
+        - check_files=True 时，同时删除源文件已不存在或大小/mtime 已变化的记录。
+        """
+        removed = 0
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM parsed_sum WHERE version != ?", (self.version,))
+            removed += cur.rowcount
+            if check_files:
+                stale = []
+                for path, size, mtime_ns in self._conn.execute("SELECT path, size, mtime_ns FROM parsed_sum"):
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        stale.append((path,))
+                        continue
+                    if st.st_size != size or st.st_mtime_ns != mtime_ns:
+                        stale.append((path,))
+                if stale:
+                    self._conn.executemany("DELETE FROM parsed_sum WHERE path = ?", stale)
+                    removed += len(stale)
+            self._conn.commit()
+        return removed
+
+    def forget(self, paths: Iterable[str]) -> None:
+        """删除指定路径的记录。"""
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM parsed_sum WHERE path = ?", [(os.path.abspath(p),) for p in paths]
+            )
+            self._conn.commit()
+
+    def clear(self) -> None:
+        """清空缓存。"""
+        with self._lock:
+            self._conn.execute("DELETE FROM parsed_sum")
+            self._conn.commit()
+            try:
+                self._conn.execute("VACUUM")
+            except sqlite3.DatabaseError:
+                pass
+
+    def stats(self) -> Tuple[int, int]:
+        """返回 (命中数, 未命中数)。"""
+        return self.hits, self.misses
+
+    def close(self) -> None:
+        with self._lock:
+            try:
+                self._conn.commit()
+            finally:
+                self._conn.close()
+
+    def __enter__(self) -> "SumParseCache":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def clear_cache(db_path: Union[str, Path, None] = None) -> None:
+    """清空缓存文件（不存在则忽略）。"""
+    path = Path(db_path) if db_path else DEFAULT_CACHE_PATH
+    if not path.exists():
+        return
+    with SumParseCache(path) as cache:
+        cache.clear()
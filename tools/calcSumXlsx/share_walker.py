@@ -0,0 +1,237 @@
+"""
+共享盘并行目录遍历。
+
+SMB 共享盘上列一个目录的耗时主要是网络往返，单线程逐个目录 scandir 时往返延迟完全串行叠加。
+这里用 N 个列目录线程并行遍历：
+
+- 每个线程有自己的双端队列，新发现的子目录压入自己队列尾部并优先从尾部取（深度优先，队列保持很短）；
+  自己的队列空了就从其它线程队列头部“窃取”（取走的是较浅、子树较大的目录，窃取次数少）；
+- 调用方提供 scan(node) -> (子节点列表, 结果列表)，在列目录线程中执行（列目录、stat、文件名匹配都在这里做）；
+  结果经有界队列交给迭代方（调用线程），迭代方处理不过来时列目录线程会阻塞，内存占用有上限；
+- scan 抛出 OSError 视为该目录暂不可访问，跳过；其它异常中止遍历并在迭代方重新抛出；
+- cancel() 返回 True 时迭代方抛出 RuntimeError("用户取消")，列目录线程随即退出。
+
+节点是不透明对象：最简单的用法是目录路径本身，也可以带上父目录等额外信息（见 sum_catalog 的增量刷新）。
+folder_date_end(name) 把日期形式的目录名（2023、2023-05、20230515 等）换算成该区间的结束时刻，供按日期剪枝使用。
+
+用法：
+    for item in walk(root, scan, workers=8, cancel=lambda: job._cancel):
+        ...
+"""
+
+from __future__ import annotations
+
+import os
+import queue
+import re
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Callable, Iterable, Iterator, List, Tuple, Union
+
+# 默认列目录线程数，可用配置 SUM_WALK_WORKERS 覆盖
+DEFAULT_WALK_WORKERS = 8
+# 结果队列上限（条）；迭代方处理不过来时列目录线程阻塞
+DEFAULT_MAX_PENDING = 10000
+# 阻塞等待时检查取消/停止的间隔（秒）
+_POLL_SECONDS = 0.2
+
+ScanResult = Tuple[Iterable[Any], Iterable[Any]]
+
+
+def _get_config(key: str, default=None):
+    try:
+        from tools.config_loader import get_config
+    except Exception:
+        return os.environ.get(key, default)
+    return get_config(key, default)
+
+
+def walk_workers(value=None) -> int:
+    """列目录线程数：优先取传入值，其次配置 SUM_WALK_WORKERS，默认 DEFAULT_WALK_WORKERS；至少为 1。"""
+    if value is None:
+        value = _get_config("SUM_WALK_WORKERS", DEFAULT_WALK_WORKERS)
+    try:
+        return max(1, int(value))
+    except (TypeError, ValueError):
+        return DEFAULT_WALK_WORKERS
+
+
+class _Failure:
+    """列目录线程中 scan 抛出的非 OSError 异常，交给迭代方重新抛出。"""
+
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+_DONE = object()
+
+
+class ParallelWalker:
+    """工作窃取式并行遍历器；一个实例只迭代一次。"""
+
+    def __init__(
+        self,
+        root: Any,
+        scan: Callable[[Any], ScanResult],
+        workers: Union[int, None] = None,
+        cancel: Union[Callable[[], bool], None] = None,
+        max_pending: int = DEFAULT_MAX_PENDING,
+    ):
+        self.root = root
+        self.scan = scan
+        self.workers = walk_workers(workers)
+        self.cancel = cancel
+        self._deques: List[deque] = [deque() for _ in range(self.workers)]
+        self._cond = threading.Condition()
+        # 已发现但尚未处理完的节点数；为 0 时遍历结束
+        self._outstanding = 0
+        self._stop = False
+        self._alive = 0
+        self._out: queue.Queue = queue.Queue(maxsize=max(1, max_pending))
+        # 统计：已列出的节点数、被窃取的节点数
+        self.scanned = 0
+        self.stolen = 0
+
+    # ------------------------------------------------------------------
+    # 列目录线程
+    # ------------------------------------------------------------------
+
+    def _take(self, idx: int):
+        """取下一个节点：先取自己队列尾部，再窃取其它队列头部；全部完成或停止时返回 _DONE。"""
+        with self._cond:
+            while True:
+                if self._stop:
+                    return _DONE
+                own = self._deques[idx]
+                if own:
+                    return own.pop()
+                for k in range(1, self.workers):
+                    victim = self._deques[(idx + k) % self.workers]
+                    if victim:
+                        self.stolen += 1
+                        return victim.popleft()
+                if self._outstanding == 0:
+                    return _DONE
+                self._cond.wait(_POLL_SECONDS)
+
+    def _put(self, item) -> bool:
+        """放入结果队列；队列满时阻塞，停止后放弃并返回 False。"""
+        while not self._stop:
+            try:
+                self._out.put(item, timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self, idx: int) -> None:
+        try:
+            while True:
+                node = self._take(idx)
+                if node is _DONE:
+                    return
+                try:
+                    children, items = self.scan(node)
+                    children = list(children or ())
+                except OSError:
+                    children, items = [], ()
+                except BaseException as exc:
+                    self._put(_Failure(exc))
+                    self._halt()
+                    return
+                with self._cond:
+                    self.scanned += 1
+                    if children:
+                        self._deques[idx].extend(children)
+                        self._outstanding += len(children)
+                    self._outstanding -= 1
+                    self._cond.notify_all()
+                for item in items or ():
+                    if not self._put(item):
+                        return
+        finally:
+            with self._cond:
+                self._alive -= 1
+                last = self._alive == 0
+            if last:
+                self._put(_DONE)
+
+    def _halt(self) -> None:
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+
+    # ------------------------------------------------------------------
+    # 迭代方
+    # ------------------------------------------------------------------
+
+    def __iter__(self) -> Iterator[Any]:
+        with self._cond:
+            self._deques[0].append(self.root)
+            self._outstanding = 1
+            self._alive = self.workers
+        threads = [
+            threading.Thread(target=self._run, args=(i,), name=f"share-walker-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for t in threads:
+            t.start()
+        try:
+            while True:
+                if self.cancel is not None and self.cancel():
+                    raise RuntimeError("用户取消")
+                try:
+                    item = self._out.get(timeout=_POLL_SECONDS)
+                except queue.Empty:
+                    continue
+                if item is _DONE:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.exc
+                yield item
+        finally:
+            # 正常结束、取消或迭代方提前退出：通知列目录线程停止并等待退出
+            self._halt()
+            for t in threads:
+                t.join()
+
+
+def walk(
+    root: Any,
+    scan: Callable[[Any], ScanResult],
+    workers: Union[int, None] = None,
+    cancel: Union[Callable[[], bool], None] = None,
+    max_pending: int = DEFAULT_MAX_PENDING,
+) -> Iterator[Any]:
+    """并行遍历 root，逐个产出 scan 返回的结果；结果顺序不固定。"""
+    return iter(ParallelWalker(root, scan, workers=workers, cancel=cancel, max_pending=max_pending))
+
+
+# 形如 2023、202301、2023-01、20230115、2023_01_15 的日期目录名
+_DATE_DIR_RE = re.compile(r"^((?:19|20)\d{2})(?:[-_.]?(\d{2})(?:[-_.]?(\d{2}))?)?$")
+
+
+def folder_date_end(name: str) -> Union[float, None]:
+    """目录名表示的日期区间的结束时刻（本地时间戳）；不是日期形式的目录名返回 None。
+
+    例：2023 → 2024-01-01 00:00，2023-05 → 2023-06-01 00:00，20230515 → 2023-05-16 00:00。
+    """
+    m = _DATE_DIR_RE.match(name)
+    if not m:
+        return None
+    year = int(m.group(1))
+    month = int(m.group(2)) if m.group(2) else None
+    day = int(m.group(3)) if m.group(3) else None
+    if month is not None and not 1 <= month <= 12:
+        return None
+    try:
+        if month is None:
+            end = datetime(year + 1, 1, 1)
+        elif day is None:
+            end = datetime(year + (month == 12), month % 12 + 1, 1)
+        else:
+            end = datetime(year, month, day) + timedelta(days=1)
+    except ValueError:
+        return None
+    return end.timestamp()
@@ -16,23 +16,49 @@ SUM 汇总小工具
 - 生成 xlsx（result.xlsx），列包含各 lot 名称、sum、rate（百分比，两位小数）；
   行包含 Total、TotalPass、TotalFail 及各 Category_BIN 条目（数值或 "error"）。
 
-依赖：pandas、openpyxl（或 xlsxwriter）。
+依赖：pandas、xlsxwriter（openpyxl 可选，需用 --excel-engine openpyxl 显式指定）。
 
 用法：
   python3 sum_aggregator.py /Users/admin/Desktop/fjn-tools/lots /Users/admin/Desktop/fjn-tools/result.xlsx
+
+解析结果缓存在项目根目录 cache/sum_parse_cache.sqlite3（按路径、大小、mtime 与解析器版本判断是否有效），
+可用 --no-cache 跳过缓存、--clear-cache 在运行前清空；--jobs N 使用 N 个进程并行解析（0 为全部核心）。
+--split-by-tp（或 --tp-names A,B）一次解析后输出 all 表及每个 Program ID 一张表。
+--format csv|jsonl|parquet（不填按输出路径扩展名推断）输出机器可读格式，Parquet 需 pyarrow；
+--layout long 输出长表（lot, category, bin, value, is_error）。
 """
 
 from __future__ import annotations
 
+import argparse
+import functools
+import io
 import os
 import re
 import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Dict, List, Tuple, Union
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple, Union
 
+import numpy as np
 import pandas as pd
 
+try:
+    from tools.calcSumXlsx.lot_manifest import manifest_extra_files
+    from tools.calcSumXlsx.mirror_cache import MirrorReader, MirrorStats, mirror_max_bytes
+    from tools.calcSumXlsx.parse_cache import SumParseCache, clear_cache
+except Exception:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from lot_manifest import manifest_extra_files  # type: ignore
+    from mirror_cache import MirrorReader, MirrorStats, mirror_max_bytes  # type: ignore
+    from parse_cache import SumParseCache, clear_cache  # type: ignore
+
+# 解析规则变化时递增，旧版本的缓存记录会自动失效
+PARSER_VERSION = 1
+
 
 # -----------------------------
 # 解析与模型
@@ -70,10 +96,52 @@ def parse_timestamp_from_filename(filename: str) -> datetime:
         raise ValueError(f"无法解析时间戳 '{date_str}' 于文件: {filename}") from exc
 
 
-def _search_int_patterns(text: str, patterns: List[str]) -> Union[int, None]:
-    """在文本中按模式列表逐个搜索整数值，返回首个匹配的整数。大小写不敏感。"""
+# 预编译正则：解析引擎只编译一次，避免逐行调用 re.search 时反复查询模式缓存
+_TOTAL_PASS_RES = (
+    re.compile(r"\bTotalPass\b\s*[:=]?\s*(\d+)", re.IGNORECASE),
+    re.compile(r"\bTotal\s*Pass\b\s*[:=]?\s*(\d+)", re.IGNORECASE),
+)
+_TOTAL_FAIL_RES = (
+    re.compile(r"\bTotalFail\b\s*[:=]?\s*(\d+)", re.IGNORECASE),
+    re.compile(r"\bTotal\s*Fail\b\s*[:=]?\s*(\d+)", re.IGNORECASE),
+)
+# Program ID 作为 TP 名来源，兼容多种写法（ProgramID、Program Id 均由第一个模式覆盖）
+_TP_NAME_RES = (
+    re.compile(r"\bProgram\s*ID\b\s*[:=]?\s*([^\r\n]+)", re.IGNORECASE),
+    re.compile(r"\bprogram_id\b\s*[:=]?\s*([^\r\n]+)", re.IGNORECASE),
+)
+_SITE_SUMMARY_RE = re.compile(r"Site\s+Total\s+Summary", re.IGNORECASE)
+_STAR_TITLE_RE = re.compile(r"^\*{3,}.*\*{3,}\s*$")
+_SINGLE_HEADER_RES = (
+    re.compile(r"Software\s*Category", re.IGNORECASE),
+    re.compile(r"Hardware\s*BIN", re.IGNORECASE),
+)
+_PAIR_HEADER_L1_RES = (
+    re.compile(r"Software", re.IGNORECASE),
+    re.compile(r"Hardware", re.IGNORECASE),
+)
+_PAIR_HEADER_L2_RES = (
+    re.compile(r"Category", re.IGNORECASE),
+    re.compile(r"BIN", re.IGNORECASE),
+)
+_COUNT_RE = re.compile(r"COUNT", re.IGNORECASE)
+_ALPHA_RE = re.compile(r"[A-Za-z]")
+_DIGITS_RE = re.compile(r"\d+")
+_INLINE_DETAIL_RE = re.compile(
+    r"(?:Software\s*Category|Category)\s*[:=]?\s*(\d+)\D+"
+    r"(?:Hardware\s*BIN|BIN)\s*[:=]?\s*(\d+)\D+"
+    r"COUNT\s*[:=]?\s*(\d+)",
+    re.IGNORECASE,
+)
+
+
+def _search_int_patterns(text: str, patterns) -> Union[int, None]:
+    """在文本中按模式列表逐个搜索整数值，返回首个匹配的整数。大小写不敏感。
+
+    patterns 可为字符串或预编译正则。
+    """
     for pat in patterns:
-        m = re.search(pat, text, flags=re.IGNORECASE)
+        m = pat.search(text) if isinstance(pat, re.Pattern) else re.search(pat, text, flags=re.IGNORECASE)
         if m:
             try:
                 return int(m.group(1))
@@ -82,77 +150,70 @@ def _search_int_patterns(text: str, patterns: List[str]) -> Union[int, None]:
     return None
 
 
-def _extract_site_total_summary_text(text: str) -> Union[str, None]:
-    """从文本中提取“Site Total Summary”所在的块。
-
-    规则：
-    - 找到包含“Site Total Summary”的标题行（大小写不敏感）。
-    - 该行之后到下一个以大量 * 组成的标题（例如 "********* ... *********"）之间的内容作为块。
-    - 如未找到该块，则返回 None。
-    """
-    lines = text.splitlines()
+def _site_total_summary_lines(lines: List[str]) -> Union[List[str], None]:
+    """从已切分的行中截取“Site Total Summary”块（不含标题行），块为空则返回 None。"""
     header_idx = None
     for i, line in enumerate(lines):
-        if re.search(r"Site\s+Total\s+Summary", line, flags=re.IGNORECASE):
+        if _SITE_SUMMARY_RE.search(line):
             header_idx = i
             break
     if header_idx is None:
         return None
+    return _block_until_star_title(lines, header_idx + 1)
 
+
+def _block_until_star_title(lines: List[str], start: int) -> Union[List[str], None]:
     block_lines: List[str] = []
-    for j in range(header_idx + 1, len(lines)):
+    for j in range(start, len(lines)):
         # 下一个以大量 * 开始并包含 * 的标题行，认为到此为止
-        if re.match(r"^\*{3,}.*\*{3,}\s*$", lines[j]):
+        line = lines[j]
+        if line.startswith("***") and _STAR_TITLE_RE.match(line):
             break
-        block_lines.append(lines[j])
-    block = "\n".join(block_lines).strip()
-    return block if block else None
+        block_lines.append(line)
+    if not any(ln.strip() for ln in block_lines):
+        return None
+    return block_lines
+
+
+def _detail_region_lines(text: str) -> List[str]:
+    """返回明细解析区域的行：优先“Site Total Summary”块，否则为全文各行。
+
+    标题先在全文上做一次正则定位，只切分标题之后的文本，避免逐行匹配标题；
+    若命中跨越了换行（逐行匹配不会命中），退回逐行查找以保持规则一致。
+    """
+    m = _SITE_SUMMARY_RE.search(text)
+    if m is None:
+        return text.splitlines()
+    if any(ch in m.group(0) for ch in "\r\n\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029"):
+        lines = text.splitlines()
+        return _site_total_summary_lines(lines) or lines
+    block = _block_until_star_title(text[m.start():].splitlines(), 1)
+    return block if block is not None else text.splitlines()
+
+
+def _extract_site_total_summary_text(text: str) -> Union[str, None]:
+    """从文本中提取“Site Total Summary”所在的块。
+
+    规则：
+    - 找到包含“Site Total Summary”的标题行（大小写不敏感）。
+    - 该行之后到下一个以大量 * 组成的标题（例如 "********* ... *********"）之间的内容作为块。
+    - 如未找到该块，则返回 None。
+    """
+    block_lines = _site_total_summary_lines(text.splitlines())
+    if block_lines is None:
+        return None
+    return "\n".join(block_lines).strip()
 
 
 def extract_totals(text: str) -> Tuple[int, int]:
     """提取 TotalPass 与 TotalFail（非负整数）。
 
     规则：
-    - 先在全文中查找 TotalPass/TotalFail；
-    - 如未找到，再回退到“Site Total Summary”块中尝试；
+    - 在全文中查找 TotalPass/TotalFail（“Site Total Summary”块是全文的子集，无需再回退搜索）；
     - 两者任一缺失则报错。
     """
-    total_pass = _search_int_patterns(
-        text,
-        [
-            r"\bTotalPass\b\s*[:=]?\s*(\d+)",
-            r"\bTotal\s*Pass\b\s*[:=]?\s*(\d+)",
-        ],
-    )
-    total_fail = _search_int_patterns(
-        text,
-        [
-            r"\bTotalFail\b\s*[:=]?\s*(\d+)",
-            r"\bTotal\s*Fail\b\s*[:=]?\s*(\d+)",
-        ],
-    )
-
-    if total_pass is None or total_fail is None:
-        # 回退到 Site Total Summary 块
-        summary_text = _extract_site_total_summary_text(text)
-        if summary_text:
-            if total_pass is None:
-                total_pass = _search_int_patterns(
-                    summary_text,
-                    [
-                        r"\bTotalPass\b\s*[:=]?\s*(\d+)",
-                        r"\bTotal\s*Pass\b\s*[:=]?\s*(\d+)",
-                    ],
-                )
-            if total_fail is None:
-                total_fail = _search_int_patterns(
-                    summary_text,
-                    [
-                        r"\bTotalFail\b\s*[:=]?\s*(\d+)",
-                        r"\bTotal\s*Fail\b\s*[:=]?\s*(\d+)",
-                    ],
-                )
-
+    total_pass = _search_int_patterns(text, _TOTAL_PASS_RES)
+    total_fail = _search_int_patterns(text, _TOTAL_FAIL_RES)
     if total_pass is None or total_fail is None:
         raise ValueError("文件中缺少 TotalPass 或 TotalFail 字段")
     if total_pass < 0 or total_fail < 0:
@@ -160,80 +221,57 @@ def extract_totals(text: str) -> Tuple[int, int]:
     return total_pass, total_fail
 
 
-def extract_details(text: str) -> List[SumDetail]:
-    """提取明细三列：Software Category、Hardware BIN、COUNT。
-
-    仅在“Site Total Summary”块中优先解析；若未找到该块，则回退到全文解析。
+def _find_detail_header(lines: List[str]) -> Tuple[Union[int, None], int]:
+    """定位明细表头，返回 (表头行下标, 表头占用行数)；未找到返回 (None, 0)。
 
-    尝试两种解析方式：
-    1) 表头识别：
-       - 单行表头（同一行包含 "Software Category"、"Hardware BIN"、"COUNT"），随后逐行解析三整数；
-       - 双行表头（第一行包含 "Software"、"Hardware"、"COUNT"，第二行包含 "Category"、"BIN"），随后逐行解析三整数；
-    2) 行内键值模式识别（Category ... BIN ... COUNT ...）。
+    单行表头优先于双行表头；三个表头条件都要求行内含 COUNT，先用它快速排除。
     """
-    details: List[SumDetail] = []
-    base_text = _extract_site_total_summary_text(text) or text
-    lines = base_text.splitlines()
-
-    # 方式 1：表头后按行解析（支持单行或双行表头）
-    single_header_idx = None
+    pair_header_idx = None
+    last = len(lines) - 1
     for i, line in enumerate(lines):
+        if not _COUNT_RE.search(line):
+            continue
+        if all(r.search(line) for r in _SINGLE_HEADER_RES):
+            return i, 1
         if (
-            re.search(r"Software\s*Category", line, re.IGNORECASE)
-            and re.search(r"Hardware\s*BIN", line, re.IGNORECASE)
-            and re.search(r"COUNT", line, re.IGNORECASE)
+            pair_header_idx is None
+            and i < last
+            and all(r.search(line) for r in _PAIR_HEADER_L1_RES)
+            and all(r.search(lines[i + 1]) for r in _PAIR_HEADER_L2_RES)
         ):
-            single_header_idx = i
-            break
+            pair_header_idx = i
+    if pair_header_idx is not None:
+        return pair_header_idx, 2
+    return None, 0
 
-    pair_header_idx = None
-    if single_header_idx is None:
-        for i in range(len(lines) - 1):
-            l1 = lines[i]
-            l2 = lines[i + 1]
-            if (
-                re.search(r"Software", l1, re.IGNORECASE)
-                and re.search(r"Hardware", l1, re.IGNORECASE)
-                and re.search(r"COUNT", l1, re.IGNORECASE)
-                and re.search(r"Category", l2, re.IGNORECASE)
-                and re.search(r"BIN", l2, re.IGNORECASE)
-            ):
-                pair_header_idx = i
-                break
 
-    def _parse_rows(start_idx: int) -> None:
-        for j in range(start_idx, len(lines)):
+def _extract_details_from_lines(lines: List[str]) -> List[SumDetail]:
+    details: List[SumDetail] = []
+
+    # 方式 1：表头后按行解析（支持单行或双行表头）
+    header_idx, header_len = _find_detail_header(lines)
+    if header_idx is not None:
+        for j in range(header_idx + header_len, len(lines)):
             raw = lines[j].strip()
             if not raw:
                 continue
+            nums = _DIGITS_RE.findall(raw)
             # 含明显字母且无数字（如分隔符、注释、结束标记）
-            if re.search(r"[A-Za-z]", raw) and not re.search(r"\d", raw):
+            if not nums and _ALPHA_RE.search(raw):
                 if details:
                     break
-                else:
-                    continue
-
-            nums = re.findall(r"\d+", raw)
+                continue
             if len(nums) >= 3:
                 cat, binv, cnt = int(nums[0]), int(nums[1]), int(nums[2])
                 if 1 <= binv <= 5 and cnt > 0:
                     details.append(SumDetail(cat, binv, cnt))
 
-    if single_header_idx is not None:
-        _parse_rows(single_header_idx + 1)
-    elif pair_header_idx is not None:
-        _parse_rows(pair_header_idx + 2)
-
-    # 方式 2：行内键值模式（补充解析）
-    inline_pat = re.compile(
-        r"(?:Software\s*Category|Category)\s*[:=]?\s*(\d+)\D+"
-        r"(?:Hardware\s*BIN|BIN)\s*[:=]?\s*(\d+)\D+"
-        r"COUNT\s*[:=]?\s*(\d+)",
-        re.IGNORECASE,
-    )
+    # 方式 2：行内键值模式（补充解析）；先用 COUNT 关键字排除绝大多数行
     if not details:
         for line in lines:
-            m = inline_pat.search(line)
+            if not _COUNT_RE.search(line):
+                continue
+            m = _INLINE_DETAIL_RE.search(line)
             if m:
                 cat, binv, cnt = int(m.group(1)), int(m.group(2)), int(m.group(3))
                 if 1 <= binv <= 5 and cnt > 0:
@@ -242,6 +280,52 @@ def extract_details(text: str) -> List[SumDetail]:
     return details
 
 
+def extract_details(text: str) -> List[SumDetail]:
+    """提取明细三列：Software Category、Hardware BIN、COUNT。
+
+    仅在“Site Total Summary”块中优先解析；若未找到该块，则回退到全文解析。
+
+    尝试两种解析方式：
+    1) 表头识别：
+       - 单行表头（同一行包含 "Software Category"、"Hardware BIN"、"COUNT"），随后逐行解析三整数；
+       - 双行表头（第一行包含 "Software"、"Hardware"、"COUNT"，第二行包含 "Category"、"BIN"），随后逐行解析三整数；
+    2) 行内键值模式识别（Category ... BIN ... COUNT ...）。
+    """
+    return _extract_details_from_lines(_detail_region_lines(text))
+
+
+def extract_tp_name(text: str) -> Union[str, None]:
+    """提取 Program ID（作为 TpName），未找到返回 None。"""
+    for pat in _TP_NAME_RES:
+        m = pat.search(text)
+        if m:
+            return m.group(1).strip()
+    return None
+
+
+def parse_sum_text(text: str, path: str = "", timestamp: Union[datetime, None] = None) -> SumFile:
+    """解析 SUM 文本。
+
+    不是单次扫描：TotalPass/TotalFail 与 Program ID 各自用预编译正则在全文中搜索（命中首个即停）；
+    “Site Total Summary”标题在全文上定位一次，只切分一次明细区域的行，
+    明细表（单行表头、双行表头、行内键值）在同一份行列表上定位与解析。
+    结果与 extract_totals / extract_details / extract_tp_name 分别调用一致。
+    """
+    total_pass, total_fail = extract_totals(text)
+    details = _extract_details_from_lines(_detail_region_lines(text))
+    tp_name = extract_tp_name(text) or ""
+    if timestamp is None:
+        timestamp = parse_timestamp_from_filename(os.path.basename(path))
+    return SumFile(path=path, timestamp=timestamp, total_pass=total_pass, total_fail=total_fail, details=details, tp_name=tp_name)
+
+
+def parse_sum_bytes(data: bytes, path: str) -> SumFile:
+    """解析已读入内存的文件内容；解码与换行处理与 parse_sum_file 读文件时一致。"""
+    ts = parse_timestamp_from_filename(os.path.basename(path))
+    text = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8", errors="ignore").read()
+    return parse_sum_text(text, path=path, timestamp=ts)
+
+
 def parse_sum_file(path: str) -> SumFile:
     """解析单个 SUM 文件为结构化对象。"""
     filename = os.path.basename(path)
@@ -251,11 +335,197 @@ def parse_sum_file(path: str) -> SumFile:
             text = f.read()
     except Exception as exc:
         raise IOError(f"读取文件失败: {path}") from exc
+    return parse_sum_text(text, path=path, timestamp=ts)
+
+
+def _sum_file_to_payload(sf: SumFile) -> Dict:
+    return {
+        "pass": sf.total_pass,
+        "fail": sf.total_fail,
+        "tp": sf.tp_name,
+        "details": [[d.category, d.bin, d.count] for d in sf.details],
+    }
+
+
+def _sum_file_from_payload(path: str, ts: datetime, payload: Dict) -> SumFile:
+    return SumFile(
+        path=path,
+        timestamp=ts,
+        total_pass=int(payload["pass"]),
+        total_fail=int(payload["fail"]),
+        details=[SumDetail(int(c), int(b), int(n)) for c, b, n in payload["details"]],
+        tp_name=str(payload.get("tp") or ""),
+    )
 
-    total_pass, total_fail = extract_totals(text)
-    details = extract_details(text)
-    tp_name = extract_tp_name(text) or ""
-    return SumFile(path=path, timestamp=ts, total_pass=total_pass, total_fail=total_fail, details=details, tp_name=tp_name)
+
+def open_parse_cache(enabled: bool = True, clear: bool = False) -> Union[SumParseCache, None]:
+    """打开解析结果缓存；enabled=False 或缓存不可用（如目录只读）时返回 None，即不使用缓存。
+
+    clear=True 时先清空缓存再打开。
+    """
+    try:
+        if clear:
+            clear_cache()
+        if not enabled:
+            return None
+        return SumParseCache(version=PARSER_VERSION)
+    except Exception as exc:
+        print(f"解析缓存不可用，改为直接解析: {exc}", file=sys.stderr)
+        return None
+
+
+def evict_parse_cache(check_files: bool = True) -> int:
+    """清除解析缓存中的过期记录（解析器版本不同；check_files=True 时还有源文件已删除或已变化的），返回删除条数。"""
+    cache = open_parse_cache()
+    if cache is None:
+        return 0
+    with cache:
+        return cache.evict_stale(check_files)
+
+
+def forget_parse_cache(paths: Iterable[str]) -> None:
+    """删除指定文件的解析缓存记录（如 lot 目录被清理时）；缓存不可用时忽略。"""
+    cache = open_parse_cache()
+    if cache is None:
+        return
+    with cache:
+        cache.forget(paths)
+
+
+def parse_sum_file_cached(path: str, cache: Union[SumParseCache, None] = None) -> SumFile:
+    """带缓存的 parse_sum_file：以 (路径, 大小, mtime_ns, 解析器版本) 判断是否命中。"""
+    return _parse_lot_file(path, cache, None)  # type: ignore[return-value]
+
+
+# Program ID 位于文件头部，预筛时只读取这么多字符
+_TP_HEAD_CHARS = 16384
+
+
+def _normalize_tp(tp_name: Union[str, None]) -> str:
+    return str(tp_name or '').strip().lower()
+
+
+def read_head_tp_name(path: str, head_chars: int = _TP_HEAD_CHARS) -> Tuple[bool, str]:
+    """只读取文件开头来确定 Program ID，返回 (是否可确定, TpName)。
+
+    结果与对全文调用 extract_tp_name 一致时才返回“可确定”：
+    - 文件整体不超过 head_chars：头部即全文；
+    - 头部内命中 “Program ID” 且取值行已在头部内结束（全文的首个命中必然就是它）。
+    其余情况（例如头部只有 program_id 写法、或取值被截断）返回 (False, "")，需完整解析。
+    """
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            head = f.read(head_chars)
+            complete = not f.read(1)
+    except Exception as exc:
+        raise IOError(f"读取文件失败: {path}") from exc
+    return _head_tp_name(head, complete)
+
+
+def read_head_tp_name_bytes(data: bytes, head_chars: int = _TP_HEAD_CHARS) -> Tuple[bool, str]:
+    """同 read_head_tp_name，判断已读入内存的文件内容（如镜像读取的内容）；解码与换行处理与读文件时一致。"""
+    f = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8", errors="ignore")
+    head = f.read(head_chars)
+    complete = not f.read(1)
+    return _head_tp_name(head, complete)
+
+
+def _head_tp_name(head: str, complete: bool) -> Tuple[bool, str]:
+    if complete:
+        return True, extract_tp_name(head) or ""
+    m = _TP_NAME_RES[0].search(head)
+    if m and m.end() < len(head):
+        return True, m.group(1).strip()
+    return False, ""
+
+
+def _parse_lot_file(
+    path: str,
+    cache: Union[SumParseCache, None],
+    tp_norm: Union[str, None],
+    mirror: Union[Callable[[str, os.stat_result], bytes], None] = None,
+) -> Union[SumFile, None]:
+    """解析 lot 内的单个文件（可带缓存）。
+
+    tp_norm 非 None 时启用两阶段模式：缓存未命中的文件先只读头部确定 Program ID，
+    与过滤值不一致则返回 None，不做完整解析（因此也不会因该文件损坏而报错）；
+    无法仅凭头部确定的文件照常完整解析。
+    传入 mirror（本地镜像的读取函数）时，解析缓存未命中的文件经由镜像读取全文，
+    同样先在内容开头判断 Program ID，不匹配的文件不做完整解析。
+    """
+    if cache is None and tp_norm is None and mirror is None:
+        return parse_sum_file(path)
+    ts = parse_timestamp_from_filename(os.path.basename(path))
+    st = None
+    if cache is not None or mirror is not None:
+        try:
+            st = os.stat(path)
+        except OSError as exc:
+            raise IOError(f"读取文件失败: {path}") from exc
+    if cache is not None:
+        payload = cache.get(path, st.st_size, st.st_mtime_ns)
+        if payload is not None:
+            try:
+                return _sum_file_from_payload(path, ts, payload)
+            except Exception:
+                pass
+    if mirror is not None:
+        try:
+            data = mirror(path, st)
+        except OSError as exc:
+            raise IOError(f"读取文件失败: {path}") from exc
+        if tp_norm is not None:
+            decided, tp_name = read_head_tp_name_bytes(data)
+            if decided and _normalize_tp(tp_name) != tp_norm:
+                return None
+        sf = parse_sum_bytes(data, path)
+    else:
+        if tp_norm is not None:
+            decided, tp_name = read_head_tp_name(path)
+            if decided and _normalize_tp(tp_name) != tp_norm:
+                return None
+        sf = parse_sum_file(path)
+    if cache is not None and st is not None:
+        cache.put(path, st.st_size, st.st_mtime_ns, _sum_file_to_payload(sf))
+    return sf
+
+
+def _iter_lot_files(
+    paths: Iterable[str],
+    cache: Union[SumParseCache, None],
+    tp_name_filter: Union[str, None] = None,
+    tp_prefilter: bool = True,
+    mirror: Union[Callable[[str, os.stat_result], bytes], None] = None,
+    remote: Iterable[str] = (),
+) -> Iterator[SumFile]:
+    """逐个解析 lot 内文件；启用 TpName 过滤与预筛时跳过头部即可判定不匹配的文件。
+
+    remote 中的文件（不在 lot 目录内的源文件）经由 mirror 读取。
+    """
+    tp_norm = _normalize_tp(tp_name_filter) if (tp_name_filter and tp_prefilter) else None
+    remote = set(remote) if mirror is not None else set()
+    for p in paths:
+        sf = _parse_lot_file(p, cache, tp_norm, mirror if p in remote else None)
+        if sf is not None:
+            yield sf
+
+
+def _remote_files(lot_dir: str, paths: Iterable[str]) -> List[str]:
+    """不在 lot 目录内的文件（清单中的共享盘源文件、直接传入的源路径），这些文件经由本地镜像读取。"""
+    base = os.path.abspath(lot_dir)
+    return [p for p in paths if os.path.dirname(os.path.abspath(p)) != base]
+
+
+def _mirror_reader(use_mirror: bool, stats: Union[MirrorStats, None]) -> Union[MirrorReader, None]:
+    """本地镜像的读取函数（累加到 stats，第一次读取 lot 目录外的文件时才打开镜像）；未启用或已关闭时返回 None。"""
+    if not use_mirror or mirror_max_bytes() <= 0:
+        return None
+    return MirrorReader(stats)
+
+
+def _mirror_counts(mirror: Union[MirrorReader, None]) -> Union[Dict[str, int], None]:
+    """镜像确实被使用过时返回统计，否则返回 None（不报告）。"""
+    return mirror.stats.to_dict() if mirror is not None and mirror.used else None
 
 
 # -----------------------------
@@ -277,28 +547,186 @@ def _row_key(category: int, binv: int) -> str:
     return f"{category}_{binv}"
 
 
-def aggregate_lot(lot_dir: str, tp_name_filter: Union[str, None] = None) -> LotSummary:
-    lot_name = os.path.basename(lot_dir.rstrip(os.sep))
-    # 允许 .SUM/.sum/.txt 扩展名
+_SUM_EXT_RE = re.compile(r"\.(?i:sum|txt)$")
+_SUM_TS_RE = re.compile(r"_\d{6}_\d{6}")
+
+
+def _is_sum_name(fname: str) -> bool:
+    # 允许 .SUM/.sum/.txt 扩展名，文件名必须包含时间戳
+    return bool(_SUM_EXT_RE.search(fname) and _SUM_TS_RE.search(fname))
+
+
+def list_lot_sum_files(lot_dir: str) -> List[str]:
+    """列出 lot 目录下的 SUM 文件（.SUM/.sum/.txt，文件名需含时间戳），保持 os.listdir 顺序。"""
     candidates: List[str] = []
     for fname in os.listdir(lot_dir):
         if not os.path.isfile(os.path.join(lot_dir, fname)):
             continue
-        if re.search(r"\.(?i:sum|txt)$", fname):
-            # 文件名必须包含时间戳
-            if re.search(r"_\d{6}_\d{6}", fname):
-                candidates.append(os.path.join(lot_dir, fname))
+        if _is_sum_name(fname):
+            candidates.append(os.path.join(lot_dir, fname))
+    return candidates
+
+
+def lot_sum_files(lot_dir: str) -> List[str]:
+    """lot 的全部 SUM 文件：目录中的文件在前，清单（sum_manifest.json）中记录的源文件在后。
+
+    清单由准备任务的清单/链接模式写入，源文件直接从共享盘读取；目录中已有相同文件的条目不重复计入。
+    """
+    local = list_lot_sum_files(lot_dir)
+    extra = [p for p in manifest_extra_files(lot_dir, local) if _is_sum_name(os.path.basename(p))]
+    return local + extra
+
+
+def _lot_name_of(lot_dir: str) -> str:
+    return os.path.basename(lot_dir.rstrip(os.sep))
+
 
+def aggregate_lot(
+    lot_dir: str,
+    tp_name_filter: Union[str, None] = None,
+    cache: Union[SumParseCache, None] = None,
+    tp_prefilter: bool = True,
+    files: Union[List[str], None] = None,
+) -> LotSummary:
+    """汇总单个 lot；传入 cache 时复用未变化文件的解析结果。
+
+    files 为 None 时汇总 lot_sum_files(lot_dir)（目录中的文件 + 清单中的源文件）；
+    传入文件路径列表时只汇总这些文件（可直接是共享盘上的路径），lot 名仍取 lot_dir 的末级目录名。
+
+    文件逐个解析并立即归并进 LotReducer，不保留解析结果列表。
+    按 TpName 过滤且 tp_prefilter=True 时，先只读文件头部判断 Program ID，
+    不匹配的文件不做完整解析：能正常解析的文件结果与完整解析后再过滤一致，
+    但错误语义不同——头部已排除的文件即使损坏或被截断（缺少 TotalPass/TotalFail）也不再报错，
+    汇总照常完成。需要任何损坏文件都让该 lot 失败时传 tp_prefilter=False。
+    """
+    make_reducer = functools.partial(LotReducer, tp_name_filter=tp_name_filter)
+    return _reduce_lot(lot_dir, make_reducer, cache, tp_name_filter, tp_prefilter, files=files).result()
+
+
+def _reduce_lot(
+    lot_dir: str,
+    make_reducer: Callable,
+    cache: Union[SumParseCache, None],
+    tp_name_filter: Union[str, None] = None,
+    tp_prefilter: bool = True,
+    prefetcher: Union["RemarkPrefetcher", None] = None,
+    files: Union[List[str], None] = None,
+    mirror: Union[Callable[[str, os.stat_result], bytes], None] = None,
+):
+    """列出并逐个解析 lot 内文件，归并进 make_reducer(lot_name) 创建的归并器并返回它。
+
+    传入 prefetcher 时，每个文件解析出的 Program ID 立即提交后台预取 Mapping。
+    files 非 None 时不列目录，直接使用给定的文件列表。
+    传入 mirror 时，不在 lot 目录内的文件经由本地镜像读取。
+    """
+    lot_name = _lot_name_of(lot_dir)
+    candidates = list(files) if files is not None else lot_sum_files(lot_dir)
     if not candidates:
         raise ValueError(f"lot '{lot_name}' 下未找到 SUM 文件")
 
-    files: List[SumFile] = [parse_sum_file(p) for p in candidates]
-    # 可选：按 Program ID（TpName）过滤
-    if tp_name_filter:
-        norm = str(tp_name_filter).strip().lower()
-        files = [f for f in files if str(f.tp_name or '').strip().lower() == norm]
+    reducer = make_reducer(lot_name)
+    remote = _remote_files(lot_dir, candidates) if mirror is not None else ()
+    files = _iter_lot_files(candidates, cache, tp_name_filter, tp_prefilter, mirror, remote)
+    if prefetcher is not None:
+        files = prefetcher.watch(files)
+    reducer.add_all(files)
+    if cache is not None:
+        cache.commit()
+    return reducer
+
+
+def summarize_lot(lot_name: str, files: Iterable[SumFile], tp_name_filter: Union[str, None] = None) -> LotSummary:
+    """按汇总规则把单个 lot 已解析的文件（列表或生成器）归并为 LotSummary。"""
+    reducer = LotReducer(lot_name, tp_name_filter)
+    reducer.add_all(files)
+    return reducer.result()
+
+
+class LotReducer:
+    """单个 lot 的流式归并状态，内存占用与 category 数量相关，与文件数量无关。
+
+    只保留：最老文件的 Total、TotalPass 累计、各 category 出现过的 BIN 集合、
+    BIN 1/4 的 COUNT 累计，以及当前最新文件的 BIN 2/3/5 取值与 Program ID。
+    时间戳相同的文件以先加入者为准（与对列表取 min/max 的结果一致）。
+    多个 LotReducer 可按文件顺序 merge，用于 lot 内分块并行解析。
+    """
+
+    def __init__(self, lot_name: str, tp_name_filter: Union[str, None] = None):
+        self.lot_name = lot_name
+        self.tp_norm = _normalize_tp(tp_name_filter) if tp_name_filter else None
+        self.tp_label = str(tp_name_filter).strip() if tp_name_filter else ""
+        self.file_count = 0
+        self.earliest_ts: Union[datetime, None] = None
+        self.earliest_total = 0
+        self.latest_ts: Union[datetime, None] = None
+        self.latest_tp_name = ""
+        self.latest_map: Dict[Tuple[int, int], int] = {}
+        self.total_pass_sum = 0
+        self.category_bins: Dict[int, set] = {}
+        self.agg_counts: Dict[Tuple[int, int], int] = {}
+
+    def add(self, f: SumFile) -> None:
+        # 可选：按 Program ID（TpName）过滤
+        if self.tp_norm is not None and _normalize_tp(f.tp_name) != self.tp_norm:
+            return
+        self.file_count += 1
+        self.total_pass_sum += f.total_pass
+        if self.earliest_ts is None or f.timestamp < self.earliest_ts:
+            self.earliest_ts = f.timestamp
+            self.earliest_total = f.total_pass + f.total_fail
+        if self.latest_ts is None or f.timestamp > self.latest_ts:
+            self.latest_ts = f.timestamp
+            self.latest_tp_name = f.tp_name
+            # 最新文件 BIN 2/3/5：直接取最新文件中的值
+            self.latest_map = {
+                (d.category, d.bin): d.count for d in f.details if d.bin in (2, 3, 5)
+            }
+        category_bins = self.category_bins
+        agg_counts = self.agg_counts
+        for d in f.details:
+            # 统计各 category 在不同文件出现的 bin，以检测不一致
+            bins = category_bins.get(d.category)
+            if bins is None:
+                category_bins[d.category] = {d.bin}
+            else:
+                bins.add(d.bin)
+            # BIN 1/4：所有文件 COUNT 总和
+            if d.bin in (1, 4):
+                key = (d.category, d.bin)
+                agg_counts[key] = agg_counts.get(key, 0) + d.count
+
+    def add_all(self, files: Iterable[SumFile]) -> None:
+        for f in files:
+            self.add(f)
+
+    def tp_names(self) -> List[str]:
+        """结果表查找 remark 时会用到的 Program ID。"""
+        return [self.latest_tp_name] if self.latest_tp_name else []
+
+    def merge(self, other: "LotReducer") -> None:
+        """并入排在本归并器之后的文件的归并状态。"""
+        if other.file_count == 0:
+            return
+        self.file_count += other.file_count
+        self.total_pass_sum += other.total_pass_sum
+        if self.earliest_ts is None or other.earliest_ts < self.earliest_ts:
+            self.earliest_ts = other.earliest_ts
+            self.earliest_total = other.earliest_total
+        if self.latest_ts is None or other.latest_ts > self.latest_ts:
+            self.latest_ts = other.latest_ts
+            self.latest_tp_name = other.latest_tp_name
+            self.latest_map = other.latest_map
+        for cat, bins in other.category_bins.items():
+            self.category_bins.setdefault(cat, set()).update(bins)
+        for key, cnt in other.agg_counts.items():
+            self.agg_counts[key] = self.agg_counts.get(key, 0) + cnt
+
+    def result(self) -> LotSummary:
+        lot_name = self.lot_name
         # 若过滤后为空：返回 0 值占位汇总（该 lot 仍在列中显示为 0）
-        if not files:
+        if self.file_count == 0:
+            if self.tp_norm is None:
+                raise ValueError(f"lot '{lot_name}' 下未找到 SUM 文件")
             return LotSummary(
                 lot_name=lot_name,
                 earliest_total=0,
@@ -308,202 +736,839 @@ def aggregate_lot(lot_dir: str, tp_name_filter: Union[str, None] = None) -> LotS
                 tp_name="",
             )
 
-    earliest = min(files, key=lambda x: x.timestamp)
-    latest = max(files, key=lambda x: x.timestamp)
+        total_fail = self.earliest_total - self.total_pass_sum
+        if total_fail < 0:
+            raise ValueError(
+                f"lot '{lot_name}' 的 TotalPass 汇总超过 Total，TotalFail 计算为负值"
+            )
 
-    earliest_total = earliest.total_pass + earliest.total_fail
-    total_pass_sum = sum(f.total_pass for f in files)
-    total_fail = earliest_total - total_pass_sum
-    if total_fail < 0:
-        raise ValueError(
-            f"lot '{lot_name}' 的 TotalPass 汇总超过 Total，TotalFail 计算为负值"
+        inconsistent_categories = {c for c, bins in self.category_bins.items() if len(bins) > 1}
+
+        # BIN 1、4：所有文件 COUNT 总和；BIN 2、3、5：最新文件 COUNT 值
+        cells: Dict[str, Union[int, str]] = {}
+        all_keys = set(self.agg_counts.keys()) | set(self.latest_map.keys())
+        for (cat, binv) in all_keys:
+            key = _row_key(cat, binv)
+            if cat in inconsistent_categories:
+                cells[key] = "error"
+            else:
+                if binv in (1, 4):
+                    cells[key] = self.agg_counts.get((cat, binv), 0)
+                else:
+                    cells[key] = self.latest_map.get((cat, binv), 0)
+
+        return LotSummary(
+            lot_name=lot_name,
+            earliest_total=self.earliest_total,
+            total_pass_sum=self.total_pass_sum,
+            total_fail=total_fail,
+            cells=cells,
+            tp_name=self.latest_tp_name,
         )
 
-    # 统计各 category 在不同文件出现的 bin，以检测不一致
-    category_bins: Dict[int, set] = {}
-    for f in files:
-        for d in f.details:
-            category_bins.setdefault(d.category, set()).add(d.bin)
-    inconsistent_categories = {c for c, bins in category_bins.items() if len(bins) > 1}
 
-    # BIN 1、4：所有文件 COUNT 总和；BIN 2、3、5：最新文件 COUNT 值
-    cells: Dict[str, Union[int, str]] = {}
+# -----------------------------
+# Mapping 预取
+# -----------------------------
 
-    # 先累加 BIN 1/4
-    agg_counts: Dict[Tuple[int, int], int] = {}
-    for f in files:
-        for d in f.details:
-            if d.bin in (1, 4):
-                key = (d.category, d.bin)
-                agg_counts[key] = agg_counts.get(key, 0) + d.count
+# 预取线程数：Mapping 读取主要耗在共享盘往返上，少量线程即可与解析重叠
+REMARK_PREFETCH_WORKERS = 4
 
-    # 最新文件 BIN 2/3/5：直接取最新文件中的值
-    latest_map: Dict[Tuple[int, int], int] = {}
-    for d in latest.details:
-        if d.bin in (2, 3, 5):
-            latest_map[(d.category, d.bin)] = d.count
-
-    # 合并键集合
-    all_keys = set(agg_counts.keys()) | set(latest_map.keys())
-    for (cat, binv) in all_keys:
-        key = _row_key(cat, binv)
-        if cat in inconsistent_categories:
-            cells[key] = "error"
-        else:
-            if binv in (1, 4):
-                cells[key] = agg_counts.get((cat, binv), 0)
-            else:
-                cells[key] = latest_map.get((cat, binv), 0)
-
-    return LotSummary(
-        lot_name=lot_name,
-        earliest_total=earliest_total,
-        total_pass_sum=total_pass_sum,
-        total_fail=total_fail,
-        cells=cells,
-        tp_name=latest.tp_name,
-    )
 
+def _remark_api():
+    """导入 findMappingByTpName（以脚本方式运行时补上项目根目录）。"""
+    try:
+        from tools.calcMapping import findMappingByTpName
+    except Exception:
+        # 以脚本方式运行时 tools 包不在 sys.path 上，补上项目根目录（findMappingByTpName 依赖 tools.config_loader）
+        sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+        from tools.calcMapping import findMappingByTpName  # type: ignore
+    return findMappingByTpName
 
-def build_dataframe(lots: List[LotSummary]) -> pd.DataFrame:
-    """构建最终 DataFrame，列包含各 lot 名、sum、rate；行包含 Total、TotalPass、TotalFail 及 Category_BIN。
 
-    注意：不再要求所有 lot 的 Total 一致，rate 统一以“所有 lot 的 Total 之和”为分母。
+class RemarkPrefetcher:
+    """在后台线程池中预取 Program ID 对应的 category → remark 映射。
+
+    预取结果进入 findMappingByTpName 的进程内 LRU 缓存，build_result_table 查找时直接命中；
+    仍在读取中的 TP 由缓存的 single-flight 等待同一次加载，不会重复访问共享目录。
+    同一 TP 只提交一次；未配置 MAPPING_ROOT 或导入失败时不做任何事。
     """
-    if not lots:
-        raise ValueError("未提供 lot 汇总数据")
 
-    totals = {lt.lot_name: lt.earliest_total for lt in lots}
-    sum_total_across_lots = sum(totals.values())  # 所有 lot 的 Total 之和
+    def __init__(self, max_workers: int = REMARK_PREFETCH_WORKERS):
+        self._seen: set = set()
+        self._lock = threading.Lock()
+        self._pool: Union[ThreadPoolExecutor, None] = None
+        self._fetch = None
+        try:
+            api = _remark_api()
+            if api.get_config("MAPPING_ROOT"):
+                self._fetch = api.get_category_remark_map
+                self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="remark-prefetch")
+        except Exception:
+            self._pool = None
+
+    @property
+    def submitted(self) -> int:
+        with self._lock:
+            return len(self._seen)
+
+    def submit(self, tp_name: Union[str, None]) -> None:
+        if not tp_name or self._pool is None:
+            return
+        with self._lock:
+            if tp_name in self._seen:
+                return
+            self._seen.add(tp_name)
+        try:
+            self._pool.submit(self._fetch_quietly, tp_name)
+        except RuntimeError:
+            # 已 close：交给结果表构建时按需读取
+            pass
+
+    def submit_all(self, tp_names: Iterable[str]) -> None:
+        for tp in tp_names:
+            self.submit(tp)
+
+    def watch(self, files: Iterable[SumFile]) -> Iterator[SumFile]:
+        """原样产出文件，同时把各文件的 Program ID 提交预取。"""
+        for f in files:
+            self.submit(f.tp_name)
+            yield f
+
+    def submit_on_done(self, fut) -> None:
+        """进程池任务（返回 (归并器, 命中数, 解析数)）完成时立即提交其 Program ID，不等按顺序取结果。"""
+        def _done(f):
+            try:
+                self.submit_all(f.result()[0].tp_names())
+            except BaseException:
+                pass
 
-    # 组织行键
-    row_order: List[str] = ["Total", "TotalPass", "TotalFail"]
+        fut.add_done_callback(_done)
 
-    # 汇总所有 Category_BIN 行键并排序（按 Category、BIN）
-    cat_bin_keys: set = set()
-    for lt in lots:
-        cat_bin_keys |= set(lt.cells.keys())
-
-    def _parse_row_key(k: str) -> Tuple[int, int]:
-        # 解析数字下划线格式的行键：<category>_<bin>
-        m = re.match(r"^(\d+)_([1-5])$", k)
-        if not m:
-            return (999999, 999999)
-        return (int(m.group(1)), int(m.group(2)))
-
-    sorted_cat_bin = sorted(cat_bin_keys, key=_parse_row_key)
-    row_order.extend(sorted_cat_bin)
-
-    # 列：各 lot 名称 + sum + rate
-    columns = [lt.lot_name for lt in lots] + ["sum", "rate", "remark"]
-    df = pd.DataFrame(index=row_order, columns=columns)
-
-    # 填充三行指标
-    # Total
-    total_row_sum = 0
-    for lt in lots:
-        df.at["Total", lt.lot_name] = lt.earliest_total
-        total_row_sum += lt.earliest_total
-    df.at["Total", "sum"] = total_row_sum
-    df.at["Total", "rate"] = (
-        "0.00%" if sum_total_across_lots == 0 else f"{(total_row_sum / sum_total_across_lots) * 100:.2f}%"
-    )
-    df.at["Total", "remark"] = ""
-
-    # TotalPass
-    total_pass_sum_all = 0
-    for lt in lots:
-        df.at["TotalPass", lt.lot_name] = lt.total_pass_sum
-        total_pass_sum_all += lt.total_pass_sum
-    df.at["TotalPass", "sum"] = total_pass_sum_all
-    df.at["TotalPass", "rate"] = (
-        "0.00%" if sum_total_across_lots == 0 else f"{(total_pass_sum_all / sum_total_across_lots) * 100:.2f}%"
-    )
-    df.at["TotalPass", "remark"] = ""
-
-    # TotalFail（用 sum_total_across_lots - total_pass_sum_all 更稳）
-    total_fail_sum_all = sum_total_across_lots - total_pass_sum_all
-    for lt in lots:
-        df.at["TotalFail", lt.lot_name] = lt.total_fail
-    df.at["TotalFail", "sum"] = total_fail_sum_all
-    df.at["TotalFail", "rate"] = (
-        "0.00%" if sum_total_across_lots == 0 else f"{(total_fail_sum_all / sum_total_across_lots) * 100:.2f}%"
-    )
-    df.at["TotalFail", "remark"] = ""
+    def _fetch_quietly(self, tp_name: str) -> None:
+        try:
+            self._fetch(tp_name)
+        except Exception:
+            # 预取失败不影响结果：构建结果表时会再次查找
+            pass
+
+    def close(self) -> None:
+        """不再接受新的预取；已提交的任务继续在后台完成。"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+
+
+# -----------------------------
+# 并行汇总
+# -----------------------------
+
+# jobs > 1 时，文件数超过该值的 lot 会把文件拆分成多块分别交给进程池解析
+LARGE_LOT_FILES = 2000
+_MIN_PARSE_CHUNK = 500
 
-    # 填充 Category_BIN 行
+# 进程池中每个工作进程各自持有一个解析缓存连接（由 _init_worker 打开）
+_WORKER_CACHE: Union[SumParseCache, None] = None
+# 工作进程是否经由本地镜像读取 lot 目录外的文件（镜像实例在子进程中各自打开）
+_WORKER_USE_MIRROR = False
+
+
+def resolve_jobs(jobs: Union[int, str, None]) -> int:
+    """规范化并行进程数：无效值或小于 0 视为 1（串行）；0 表示使用全部 CPU 核心。"""
     try:
+        n = int(jobs) if jobs is not None else 1
+    except (TypeError, ValueError):
+        return 1
+    if n == 0:
+        return os.cpu_count() or 1
+    return max(n, 1)
+
+
+def _cache_counts(cache: Union[SumParseCache, None]) -> Tuple[int, int]:
+    return (cache.hits, cache.misses) if cache is not None else (0, 0)
+
+
+def _init_worker(cache_enabled: bool, mirror_enabled: bool = False) -> None:
+    global _WORKER_CACHE, _WORKER_USE_MIRROR
+    _WORKER_CACHE = open_parse_cache(enabled=cache_enabled)
+    _WORKER_USE_MIRROR = mirror_enabled
+
+
+def _reduce_lot_task(
+    lot_dir: str, make_reducer, tp_name_filter: Union[str, None], tp_prefilter: bool
+) -> Tuple["LotReducer", int, int, Union[Dict[str, int], None]]:
+    hits0, misses0 = _cache_counts(_WORKER_CACHE)
+    mirror = _mirror_reader(_WORKER_USE_MIRROR, None)
+    reducer = _reduce_lot(lot_dir, make_reducer, _WORKER_CACHE, tp_name_filter, tp_prefilter, mirror=mirror)
+    hits1, misses1 = _cache_counts(_WORKER_CACHE)
+    return reducer, hits1 - hits0, misses1 - misses0, _mirror_counts(mirror)
+
+
+def _reduce_chunk_task(
+    lot_name: str,
+    paths: List[str],
+    make_reducer,
+    tp_name_filter: Union[str, None],
+    tp_prefilter: bool,
+    remote: List[str] = (),
+) -> Tuple["LotReducer", int, int, Union[Dict[str, int], None]]:
+    hits0, misses0 = _cache_counts(_WORKER_CACHE)
+    mirror = _mirror_reader(_WORKER_USE_MIRROR, None) if remote else None
+    reducer = make_reducer(lot_name)
+    reducer.add_all(_iter_lot_files(paths, _WORKER_CACHE, tp_name_filter, tp_prefilter, mirror, remote))
+    if _WORKER_CACHE is not None:
+        _WORKER_CACHE.commit()
+    hits1, misses1 = _cache_counts(_WORKER_CACHE)
+    return reducer, hits1 - hits0, misses1 - misses0, _mirror_counts(mirror)
+
+
+def _reduce_lots(
+    lot_dirs: List[str],
+    make_reducer,
+    tp_name_filter: Union[str, None] = None,
+    jobs: Union[int, None] = 1,
+    use_cache: bool = True,
+    clear_cache: bool = False,
+    stats: Union[Dict[str, int], None] = None,
+    tp_prefilter: bool = True,
+    prefetcher: Union[RemarkPrefetcher, None] = None,
+    use_mirror: bool = True,
+) -> Iterator:
+    """按 lot_dirs 顺序逐个产出各 lot 的归并器（make_reducer(lot_name) 创建，需可 pickle）。
+
+    - jobs <= 1：串行；
+    - jobs > 1：lot 分发到进程池；文件数超过 LARGE_LOT_FILES 的 lot 再按文件拆块并行解析，
+      各块返回归并器，由主进程按顺序 merge。
+    以生成器形式按顺序产出，调用方可边取边计算结果，保证先抛出排在最前的 lot 的异常；
+    出错或提前结束时取消尚未开始的任务。
+    传入 prefetcher 时，串行模式下每解析出一个 Program ID 即提交预取，并行模式下每个任务完成即提交。
+    use_mirror=True 时 lot 目录外的文件（清单中的共享盘源文件）经由本地镜像读取，stats["mirror"] 为镜像统计；
+    镜像在第一次读取这类文件时才打开，没有读取过（或镜像已关闭、不可用）时不报告。
+    """
+    jobs = resolve_jobs(jobs)
+    hits = misses = 0
+    use_mirror = use_mirror and mirror_max_bytes() > 0
+    mirror_stats = MirrorStats()
+    mirror_used = False
+    if jobs <= 1:
+        cache = open_parse_cache(enabled=use_cache, clear=clear_cache)
+        mirror = _mirror_reader(use_mirror, mirror_stats)
         try:
-            from tools.calcMapping.findMappingByTpName import get_category_remark_map
-        except Exception:
-            import sys as _sys
-            import os as _os
-            _sys.path.append(_os.path.join(_os.path.dirname(__file__), "..", "calcMapping"))
-            from findMappingByTpName import get_category_remark_map  # type: ignore
-        lot_maps: Dict[str, Dict[int, str]] = {}
-        for lt in lots:
-            if lt.tp_name:
-                try:
-                    lot_maps[lt.lot_name] = get_category_remark_map(lt.tp_name) or {}
-                except Exception:
-                    lot_maps[lt.lot_name] = {}
+            for ld in lot_dirs:
+                yield _reduce_lot(ld, make_reducer, cache, tp_name_filter, tp_prefilter, prefetcher, mirror=mirror)
+            hits, misses = _cache_counts(cache)
+        finally:
+            if cache is not None:
+                cache.close()
+        if stats is not None:
+            stats.update(hits=hits, misses=misses)
+            if mirror is not None and mirror.used:
+                stats.update(mirror=mirror_stats.to_dict())
+        return
+
+    if clear_cache:
+        open_parse_cache(enabled=False, clear=True)
+
+    pool = ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(use_cache, use_mirror))
+    try:
+        # 计划：每个 lot 为 ("lot", future)、("chunks", lot_name, futures) 或 ("error", exc)；
+        # 列目录的异常延后到按顺序取结果时再抛出，保证与串行相同的报错顺序
+        plans = []
+        for ld in lot_dirs:
+            lot_name = _lot_name_of(ld)
+            try:
+                candidates = lot_sum_files(ld)
+            except Exception as exc:
+                plans.append(("error", exc))
+                continue
+            if not candidates:
+                plans.append(("error", ValueError(f"lot '{lot_name}' 下未找到 SUM 文件")))
+            elif len(candidates) > LARGE_LOT_FILES:
+                size = max(_MIN_PARSE_CHUNK, -(-len(candidates) // jobs))
+                remote = set(_remote_files(ld, candidates)) if use_mirror else set()
+                futures = []
+                for i in range(0, len(candidates), size):
+                    chunk = candidates[i:i + size]
+                    futures.append(pool.submit(
+                        _reduce_chunk_task, lot_name, chunk, make_reducer, tp_name_filter, tp_prefilter,
+                        [p for p in chunk if p in remote],
+                    ))
+                plans.append(("chunks", lot_name, futures))
+            else:
+                plans.append(("lot", pool.submit(_reduce_lot_task, ld, make_reducer, tp_name_filter, tp_prefilter)))
+            if prefetcher is not None and plans[-1][0] != "error":
+                for fut in (plans[-1][2] if plans[-1][0] == "chunks" else [plans[-1][1]]):
+                    prefetcher.submit_on_done(fut)
+
+        for plan in plans:
+            if plan[0] == "error":
+                raise plan[1]
+            if plan[0] == "lot":
+                reducer, h, m, ms = plan[1].result()
+                mirror_stats.merge(ms)
+                mirror_used = mirror_used or ms is not None
+            else:
+                # 分块归并状态按文件顺序合并
+                reducer = make_reducer(plan[1])
+                h = m = 0
+                for fut in plan[2]:
+                    part, ph, pm, ms = fut.result()
+                    reducer.merge(part)
+                    h += ph
+                    m += pm
+                    mirror_stats.merge(ms)
+                    mirror_used = mirror_used or ms is not None
+            hits += h
+            misses += m
+            yield reducer
+    except BaseException:
+        pool.shutdown(wait=True, cancel_futures=True)
+        raise
+    pool.shutdown(wait=True)
+    if stats is not None:
+        stats.update(hits=hits, misses=misses)
+        if mirror_used:
+            stats.update(mirror=mirror_stats.to_dict())
+
+
+def aggregate_lots(
+    lot_dirs: List[str],
+    tp_name_filter: Union[str, None] = None,
+    jobs: Union[int, None] = 1,
+    use_cache: bool = True,
+    clear_cache: bool = False,
+    stats: Union[Dict[str, int], None] = None,
+    tp_prefilter: bool = True,
+    prefetch_remarks: bool = True,
+    use_mirror: bool = True,
+) -> List[LotSummary]:
+    """汇总多个 lot，结果顺序与 lot_dirs 一致。
+
+    - jobs <= 1：串行，与逐个调用 aggregate_lot 相同；
+    - jobs > 1：使用进程池并行解析（见 _reduce_lots）。
+    错误语义与串行一致：按 lot 顺序取结果，抛出排在最前的 lot 的异常，并取消尚未开始的任务。
+    传入 stats 字典时写入解析缓存的命中数 hits 与解析数 misses。
+    tp_prefilter 见 aggregate_lot。
+    prefetch_remarks=True 时解析过程中即在后台读取各 Program ID 的 Mapping，随后 build_result_table 直接命中缓存。
+    use_mirror=True 时清单中的共享盘源文件经由本地镜像读取（见 mirror_cache），stats["mirror"] 为镜像命中统计。
+    """
+    make_reducer = functools.partial(LotReducer, tp_name_filter=tp_name_filter)
+    prefetcher = RemarkPrefetcher() if prefetch_remarks else None
+    try:
+        return [
+            reducer.result()
+            for reducer in _reduce_lots(
+                lot_dirs, make_reducer, tp_name_filter, jobs, use_cache, clear_cache, stats, tp_prefilter, prefetcher,
+                use_mirror=use_mirror,
+            )
+        ]
+    finally:
+        if prefetcher is not None:
+            prefetcher.close()
+
+
+# -----------------------------
+# 按 Program ID 拆分（一次解析，多张结果表）
+# -----------------------------
+
+ALL_SHEET_NAME = "all"
+
+
+class MultiTpReducer:
+    """同时归并“全部文件”与“按 Program ID 分组”的状态，一次解析产出多份汇总。
+
+    tp_names 为 None 时按文件中出现的 Program ID 自动分组（没有 Program ID 的文件只计入全部）；
+    否则只为给定的 TpName 建组（匹配规则同 TpName 过滤：去首尾空格、不区分大小写）。
+    """
+
+    def __init__(self, lot_name: str, tp_names: Union[List[str], None] = None):
+        self.lot_name = lot_name
+        self.fixed = tp_names is not None
+        self.all = LotReducer(lot_name)
+        self.by_tp: Dict[str, LotReducer] = {}
+        for tp in tp_names or []:
+            norm = _normalize_tp(tp)
+            if norm and norm not in self.by_tp:
+                self.by_tp[norm] = LotReducer(lot_name, str(tp).strip())
+
+    def add(self, f: SumFile) -> None:
+        self.all.add(f)
+        norm = _normalize_tp(f.tp_name)
+        if not norm:
+            return
+        reducer = self.by_tp.get(norm)
+        if reducer is None:
+            if self.fixed:
+                return
+            reducer = self.by_tp[norm] = LotReducer(self.lot_name, str(f.tp_name).strip())
+        reducer.add(f)
+
+    def add_all(self, files: Iterable[SumFile]) -> None:
+        for f in files:
+            self.add(f)
+
+    def merge(self, other: "MultiTpReducer") -> None:
+        self.all.merge(other.all)
+        for norm, reducer in other.by_tp.items():
+            mine = self.by_tp.get(norm)
+            if mine is None:
+                self.by_tp[norm] = reducer
             else:
-                lot_maps[lt.lot_name] = {}
+                mine.merge(reducer)
+
+    def tp_names(self) -> List[str]:
+        names = self.all.tp_names()
+        for reducer in self.by_tp.values():
+            names.extend(reducer.tp_names())
+        return names
+
+    def tp_labels(self) -> Dict[str, str]:
+        """规范化 TpName -> 显示名（取该 lot 中首次出现的写法）。"""
+        return {norm: r.tp_label for norm, r in self.by_tp.items()}
+
+    def result_for(self, norm: str) -> LotSummary:
+        """某个 Program ID 的汇总；该 lot 没有此 Program ID 的文件时返回 0 值占位汇总。"""
+        reducer = self.by_tp.get(norm)
+        if reducer is None:
+            reducer = LotReducer(self.lot_name, norm)
+        return reducer.result()
+
+
+def aggregate_lots_by_tp(
+    lot_dirs: List[str],
+    tp_names: Union[List[str], None] = None,
+    jobs: Union[int, None] = 1,
+    use_cache: bool = True,
+    clear_cache: bool = False,
+    stats: Union[Dict[str, int], None] = None,
+    prefetch_remarks: bool = True,
+    use_mirror: bool = True,
+) -> List[Tuple[str, List[LotSummary]]]:
+    """每个 lot 只解析一次，返回 [(表名, 各 lot 汇总)]：首个为 "all"（不过滤），其后每个 Program ID 一张。
+
+    每张 Program ID 表的结果与以该 TpName 调用 aggregate_lots 相同；
+    tp_names 为 None 时取所有 lot 中出现过的 Program ID（按名称排序）。
+    prefetch_remarks、use_mirror 见 aggregate_lots。
+    """
+    make_reducer = functools.partial(MultiTpReducer, tp_names=tp_names)
+    reducers: List[MultiTpReducer] = []
+    sheets: List[Tuple[str, List[LotSummary]]] = [(ALL_SHEET_NAME, [])]
+    prefetcher = RemarkPrefetcher() if prefetch_remarks else None
+    try:
+        for reducer in _reduce_lots(
+            lot_dirs, make_reducer, None, jobs, use_cache, clear_cache, stats, False, prefetcher, use_mirror=use_mirror
+        ):
+            sheets[0][1].append(reducer.all.result())
+            reducers.append(reducer)
+    finally:
+        if prefetcher is not None:
+            prefetcher.close()
+
+    sheets.extend(_tp_sheets(reducers, tp_names))
+    return sheets
+
+
+def _tp_sheets(reducers: List[MultiTpReducer], tp_names: Union[List[str], None]) -> List[Tuple[str, List[LotSummary]]]:
+    """按 Program ID 拆分的各张表（不含 all 表）；tp_names 为 None 时取出现过的 Program ID 并按名称排序。"""
+    labels: Dict[str, str] = {}
+    if tp_names is not None:
+        for tp in tp_names:
+            norm = _normalize_tp(tp)
+            if norm:
+                labels.setdefault(norm, str(tp).strip())
+    else:
+        for reducer in reducers:
+            for norm, label in reducer.tp_labels().items():
+                labels.setdefault(norm, label)
+        labels = dict(sorted(labels.items(), key=lambda kv: kv[1]))
+    return [(label, [r.result_for(norm) for r in reducers]) for norm, label in labels.items()]
+
+
+# -----------------------------
+# 边准备边汇总
+# -----------------------------
+
+class StreamingAggregator:
+    """边准备边汇总：文件一到达（复制时已读入内存的内容）就解析并归并进对应 lot 的归并器。
+
+    - add_bytes / add_path 可在多个复制线程中并发调用，归并与解析缓存访问在内部加锁串行；
+    - complete(lot_dirs) 补上 lot 目录中已有但本次未经过的文件（之前准备过的、去重跳过的、清单中的），
+      使结果与准备完成后再对这些 lot 调用 aggregate_lots / aggregate_lots_by_tp 一致
+      （时间戳完全相同的文件按到达顺序取先者，而非 os.listdir 顺序）；
+    - 单个文件解析失败时记录错误，results() 按 lot 顺序抛出排在最前的 lot 的错误，与串行汇总一致。
+    """
+
+    def __init__(
+        self,
+        tp_name_filter: Union[str, None] = None,
+        split_by_tp: bool = False,
+        tp_names: Union[List[str], None] = None,
+        use_cache: bool = True,
+        clear_cache: bool = False,
+        prefetch_remarks: bool = True,
+        mirror: Union[Callable[[str, os.stat_result], bytes], None] = None,
+    ):
+        self.split = bool(split_by_tp or tp_names)
+        # complete() 补读 lot 目录外的文件（清单中的源文件）时使用的本地镜像读取函数
+        self.mirror = mirror
+        self.tp_names = tp_names
+        if self.split:
+            self._make_reducer = functools.partial(MultiTpReducer, tp_names=tp_names)
+        else:
+            self._make_reducer = functools.partial(LotReducer, tp_name_filter=tp_name_filter)
+        self._lock = threading.Lock()
+        self._reducers: Dict[str, Union[LotReducer, MultiTpReducer]] = {}
+        self._seen: Dict[str, set] = {}
+        self._errors: Dict[str, Exception] = {}
+        self.cache = open_parse_cache(enabled=use_cache, clear=clear_cache)
+        self.prefetcher = RemarkPrefetcher() if prefetch_remarks else None
+        # files：归并的文件总数；streamed：其中直接使用内存内容的（其余由 complete 从磁盘/缓存补上）
+        self.files = 0
+        self.streamed = 0
+        self.bytes = 0
+        self.parse_seconds = 0.0
+
+    def _fold(self, lot_name: str, path: str, sf: SumFile) -> None:
+        """调用方持有 _lock。"""
+        reducer = self._reducers.get(lot_name)
+        if reducer is None:
+            reducer = self._reducers[lot_name] = self._make_reducer(lot_name)
+        reducer.add(sf)
+        self._seen.setdefault(lot_name, set()).add(os.path.abspath(path))
+        self.files += 1
+        if self.prefetcher is not None and sf.tp_name:
+            self.prefetcher.submit(sf.tp_name)
+
+    def _fail(self, lot_name: str, exc: Exception) -> None:
+        with self._lock:
+            self._errors.setdefault(lot_name, exc)
+            self._reducers.setdefault(lot_name, self._make_reducer(lot_name))
+
+    def add_bytes(
+        self,
+        lot_name: str,
+        path: str,
+        data: bytes,
+        size: Union[int, None] = None,
+        mtime_ns: Union[int, None] = None,
+    ) -> None:
+        """归并一个已读入内存的文件；给出 size/mtime_ns 时顺便写入解析缓存（之后普通汇总直接命中）。"""
+        t0 = time.perf_counter()
+        try:
+            sf = parse_sum_bytes(data, path)
+        except Exception as exc:
+            self._fail(lot_name, exc)
+            return
+        with self._lock:
+            self.parse_seconds += time.perf_counter() - t0
+            self.streamed += 1
+            self.bytes += len(data)
+            if self.cache is not None and size is not None and mtime_ns is not None:
+                self.cache.put(path, size, mtime_ns, _sum_file_to_payload(sf))
+            self._fold(lot_name, path, sf)
+
+    def add_path(self, lot_name: str, path: str, remote: bool = False) -> None:
+        """从磁盘（可经解析缓存）读取并归并一个文件；remote=True 时经由本地镜像读取。"""
+        try:
+            with self._lock:
+                t0 = time.perf_counter()
+                sf = _parse_lot_file(path, self.cache, None, self.mirror if remote else None)
+                self.parse_seconds += time.perf_counter() - t0
+                self._fold(lot_name, path, sf)
+        except Exception as exc:
+            self._fail(lot_name, exc)
+
+    def complete(self, lot_dirs: Iterable[str]) -> None:
+        """补上各 lot 目录（含清单）中尚未归并的文件。目录不存在的 lot 跳过。"""
+        for ld in lot_dirs:
+            if not os.path.isdir(ld):
+                continue
+            lot_name = _lot_name_of(ld)
+            try:
+                paths = lot_sum_files(ld)
+            except Exception as exc:
+                self._fail(lot_name, exc)
+                continue
+            with self._lock:
+                seen = set(self._seen.get(lot_name, ()))
+            remote = set(_remote_files(ld, paths)) if self.mirror is not None else set()
+            for p in paths:
+                if os.path.abspath(p) not in seen:
+                    self.add_path(lot_name, p, p in remote)
+            with self._lock:
+                if lot_name not in self._reducers:
+                    self._errors.setdefault(lot_name, ValueError(f"lot '{lot_name}' 下未找到 SUM 文件"))
+                    self._reducers[lot_name] = self._make_reducer(lot_name)
+
+    def lot_names(self) -> List[str]:
+        with self._lock:
+            return list(self._reducers)
+
+    def results(self, lot_names: Union[List[str], None] = None) -> List[Tuple[str, List[LotSummary]]]:
+        """按 lot_names 顺序（默认到达顺序）返回 [(表名, 各 lot 汇总)]。
+
+        不拆分时只有一张 "result" 表；拆分时与 aggregate_lots_by_tp 相同（"all" + 每个 Program ID 一张）。
+        """
+        with self._lock:
+            names = [n for n in (lot_names or list(self._reducers)) if n in self._reducers]
+            for n in names:
+                if n in self._errors:
+                    raise self._errors[n]
+            reducers = [self._reducers[n] for n in names]
+            if self.cache is not None:
+                self.cache.commit()
+        if not self.split:
+            return [("result", [r.result() for r in reducers])]
+        sheets: List[Tuple[str, List[LotSummary]]] = [(ALL_SHEET_NAME, [r.all.result() for r in reducers])]
+        sheets.extend(_tp_sheets(reducers, self.tp_names))
+        return sheets
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        with self._lock:
+            return {
+                "lots": len(self._reducers),
+                "files": self.files,
+                "streamed": self.streamed,
+                "bytes": self.bytes,
+                "errors": len(self._errors),
+                "parse_seconds": round(self.parse_seconds, 3),
+            }
+
+    def close(self) -> None:
+        if self.prefetcher is not None:
+            self.prefetcher.close()
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+
+
+# -----------------------------
+# 结果表
+# -----------------------------
+
+_ROW_KEY_RE = re.compile(r"^(\d+)_([1-5])$")
+_SUMMARY_ROWS = ["Total", "TotalPass", "TotalFail"]
+
+
+def _parse_row_key(k: str) -> Tuple[int, int]:
+    # 解析数字下划线格式的行键：<category>_<bin>
+    m = _ROW_KEY_RE.match(k)
+    if not m:
+        return (999999, 999999)
+    return (int(m.group(1)), int(m.group(2)))
+
+
+def _format_rate(value: int, denominator: int) -> str:
+    return "0.00%" if denominator == 0 else f"{(value / denominator) * 100:.2f}%"
+
+
+@dataclass
+class ResultTable:
+    """汇总结果的数值形式（行 × lot），供生成 Excel 等输出使用。
+
+    - counts：int64 矩阵，行为 Total、TotalPass、TotalFail 及各 Category_BIN，列为各 lot；
+    - errors：同形状的布尔掩码，True 表示该 lot 该行为 "error"（对应 counts 中为 0）；
+    - sums / row_errors：各行跨 lot 之和，以及该行是否含 error；
+    - denominator：rate 的分母（所有 lot 的 Total 之和）；
+    - remarks：各行 remark 文本（前三行为空）。
+    """
+
+    row_keys: List[str]
+    lot_names: List[str]
+    counts: "np.ndarray"
+    errors: "np.ndarray"
+    sums: "np.ndarray"
+    row_errors: "np.ndarray"
+    denominator: int
+    remarks: List[str]
+
+    def rates(self) -> "np.ndarray":
+        """各行 rate（比例，未乘 100）；分母为 0 时为 0。"""
+        if self.denominator == 0:
+            return np.zeros(len(self.row_keys), dtype=float)
+        return self.sums / self.denominator
+
+    def to_frame(self) -> pd.DataFrame:
+        """展示用 DataFrame：error 单元格为 "error"，rate 为两位小数的百分比文本。"""
+        n_rows, n_lots = self.counts.shape
+        data = np.empty((n_rows, n_lots + 3), dtype=object)
+        data[:, :n_lots] = np.where(self.errors, "error", self.counts.astype(object))
+        data[:, n_lots] = np.where(self.row_errors, "error", self.sums.astype(object))
+        rate_text = [_format_rate(int(v), self.denominator) for v in self.sums]
+        data[:, n_lots + 1] = np.where(self.row_errors, "error", np.array(rate_text, dtype=object))
+        data[:, n_lots + 2] = self.remarks
+        columns = list(self.lot_names) + ["sum", "rate", "remark"]
+        return pd.DataFrame(data, index=list(self.row_keys), columns=columns)
+
+    def wide_rows(self, error_value: object = "error") -> Iterator[list]:
+        """按行产出宽表记录 [行键, 各 lot..., sum, rate, remark]；rate 为比例数值，error 单元格写 error_value。"""
+        rates = self.rates()
+        for i, key in enumerate(self.row_keys):
+            values: list = self.counts[i].tolist()
+            for c in np.flatnonzero(self.errors[i]):
+                values[c] = error_value
+            if self.row_errors[i]:
+                tail = [error_value, error_value]
+            else:
+                tail = [int(self.sums[i]), float(rates[i])]
+            yield [key, *values, *tail, self.remarks[i]]
+
+    def long_rows(self) -> Iterator[list]:
+        """按行产出长表记录 [lot, category, bin, value, is_error]。
+
+        Category_BIN 行的 category / bin 为整数；Total、TotalPass、TotalFail 行的 category 为行名，bin 为 None。
+        error 单元格的 value 为 None、is_error 为 True。
+        """
+        for i, key in enumerate(self.row_keys):
+            m = _ROW_KEY_RE.match(key)
+            category = int(m.group(1)) if m else key
+            bin_no = int(m.group(2)) if m else None
+            errs = self.errors[i]
+            for j, (lot, value) in enumerate(zip(self.lot_names, self.counts[i].tolist())):
+                if errs[j]:
+                    yield [lot, category, bin_no, None, True]
+                else:
+                    yield [lot, category, bin_no, value, False]
+
+
+def _load_lot_remark_maps(lots: List[LotSummary]) -> List[Dict[int, str]]:
+    """按 lot 顺序返回各 lot 的 category → remark 映射（找不到为空字典）。
+
+    相同 Program ID 的 lot 只查找一次；跨次调用的复用由 findMappingByTpName 的进程内缓存负责，
+    汇总时已由 RemarkPrefetcher 预取的 TP 在此直接命中（仍在读取中的则等待该次读取）。
+    """
+    try:
+        by_tp = _remark_api().get_category_remark_maps(lt.tp_name for lt in lots)
+        lot_maps: List[Dict[int, str]] = [by_tp.get(lt.tp_name) or {} if lt.tp_name else {} for lt in lots]
         missing_lots = [lt.lot_name for lt in lots if not lt.tp_name]
         if missing_lots:
             print(f"缺少 Program ID 的 lot: {', '.join(missing_lots)}", file=sys.stderr)
     except Exception:
-        lot_maps = {lt.lot_name: {} for lt in lots}
-    for key in sorted_cat_bin:
-        values: List[Union[int, str]] = []
-        has_error = False
-        for lt in lots:
-            v = lt.cells.get(key, 0)  # 缺失视为 0
-            if isinstance(v, str):
-                has_error = True
-            df.at[key, lt.lot_name] = v
-            values.append(v)
+        lot_maps = [{} for _ in lots]
+    return lot_maps
+
 
+def _build_remarks(row_keys: List[str], lots: List[LotSummary], lot_maps: List[Dict[int, str]]) -> List[str]:
+    """构建各 Category_BIN 行的 remark：首个含该 category 的 lot 的描述，加上各 lot 的缺失说明。
+
+    remark 只与 category 有关，因此按不同 category 计算一次，再按行展开。
+    """
+    row_cats: List[Union[int, None]] = []
+    for key in row_keys:
         try:
-            cat = int(key.split("_")[0])
+            row_cats.append(int(key.split("_")[0]))
         except Exception:
-            cat = None
-        if has_error:
-            df.at[key, "sum"] = "error"
-            df.at[key, "rate"] = "error"
+            row_cats.append(None)
+    cats = sorted({c for c in row_cats if c is not None})
+    if not cats:
+        return ["" for _ in row_keys]
+
+    n_lots = len(lots)
+    cat_arr = np.array(cats, dtype=np.int64)
+    # has_cat[i, j]：第 j 个 lot 的映射中是否有第 i 个 category
+    has_cat = np.zeros((len(cats), n_lots), dtype=bool)
+    # 各 lot 状态：0 没有 Program ID，1 没有 Mapping，2 有 Mapping
+    kind = np.empty(n_lots, dtype=np.int8)
+    for j, (lt, mp) in enumerate(zip(lots, lot_maps)):
+        if not lt.tp_name:
+            kind[j] = 0
+        elif not mp:
+            kind[j] = 1
         else:
-            numeric_sum = int(sum(int(v) for v in values))
-            df.at[key, "sum"] = numeric_sum
-            df.at[key, "rate"] = (
-                "0.00%" if sum_total_across_lots == 0 else f"{(numeric_sum / sum_total_across_lots) * 100:.2f}%"
-            )
+            kind[j] = 2
+            has_cat[:, j] = np.isin(cat_arr, np.fromiter(mp.keys(), dtype=np.int64, count=len(mp)))
 
-        # 构建按 lot 的 remark 状态并汇总到单列
-        lot_status_msgs: List[str] = []
-        chosen_remark: str = ""
-        if cat is not None:
-            for lt in lots:
-                if not lt.tp_name:
-                    lot_status_msgs.append(f"{lt.lot_name}:没找到 Program ID")
-                    continue
-                mp = lot_maps.get(lt.lot_name, {})
-                if not mp:
-                    lot_status_msgs.append(f"{lt.lot_name}:没找到 Mapping")
-                    continue
-                if cat not in mp:
-                    lot_status_msgs.append(f"{lt.lot_name}:没找到 Mapping 里面对应 category 的 Remark")
-                    continue
-                if not chosen_remark:
-                    chosen_remark = mp[cat]
-
-        if chosen_remark and lot_status_msgs:
-            df.at[key, "remark"] = f"{chosen_remark} | " + "; ".join(lot_status_msgs)
+    static_msgs = [
+        f"{lt.lot_name}:没找到 Program ID" if k == 0 else f"{lt.lot_name}:没找到 Mapping"
+        for lt, k in zip(lots, kind)
+    ]
+    missing_msgs = [f"{lt.lot_name}:没找到 Mapping 里面对应 category 的 Remark" for lt in lots]
+    # 需要输出说明的 lot：无 Program ID / 无 Mapping，或有 Mapping 但缺该 category
+    needs_msg = (kind[None, :] != 2) | ~has_cat
+
+    by_cat: Dict[int, str] = {}
+    for i, cat in enumerate(cats):
+        present = has_cat[i]
+        chosen_remark = lot_maps[int(np.argmax(present))][cat] if present.any() else ""
+        msgs = [
+            static_msgs[j] if kind[j] != 2 else missing_msgs[j]
+            for j in np.flatnonzero(needs_msg[i])
+        ]
+        if chosen_remark and msgs:
+            by_cat[cat] = f"{chosen_remark} | " + "; ".join(msgs)
         elif chosen_remark:
-            df.at[key, "remark"] = chosen_remark
+            by_cat[cat] = chosen_remark
         else:
-            df.at[key, "remark"] = "; ".join(lot_status_msgs) if lot_status_msgs else ""
+            by_cat[cat] = "; ".join(msgs) if msgs else ""
+    return [by_cat[c] if c is not None else "" for c in row_cats]
+
+
+def build_result_table(lots: List[LotSummary]) -> ResultTable:
+    """把各 lot 汇总整理为数值结果表。
+
+    各 lot 的 Category_BIN 单元格先展开为长表记录（行键、lot 序号、COUNT、是否 error），
+    再一次性透视为 int64 矩阵与 error 掩码；sum 与 rate 按行向量化计算。
+    """
+    if not lots:
+        raise ValueError("未提供 lot 汇总数据")
+
+    n_lots = len(lots)
+    totals = {lt.lot_name: lt.earliest_total for lt in lots}
+    sum_total_across_lots = sum(totals.values())  # 所有 lot 的 Total 之和
+
+    # 长表记录
+    rec_keys: List[str] = []
+    rec_lots: List[int] = []
+    rec_vals: List[int] = []
+    rec_errs: List[bool] = []
+    for j, lt in enumerate(lots):
+        for key, v in lt.cells.items():
+            rec_keys.append(key)
+            rec_lots.append(j)
+            is_err = isinstance(v, str)
+            rec_errs.append(is_err)
+            rec_vals.append(0 if is_err else int(v))
+
+    # 汇总所有 Category_BIN 行键并排序（按 Category、BIN）
+    sorted_cat_bin = sorted(set(rec_keys), key=_parse_row_key)
+    row_keys = _SUMMARY_ROWS + sorted_cat_bin
+    n_rows = len(row_keys)
+
+    counts = np.zeros((n_rows, n_lots), dtype=np.int64)
+    errors = np.zeros((n_rows, n_lots), dtype=bool)
+    counts[0] = [lt.earliest_total for lt in lots]
+    counts[1] = [lt.total_pass_sum for lt in lots]
+    counts[2] = [lt.total_fail for lt in lots]
+    if rec_keys:
+        # 透视：缺失单元格视为 0
+        row_idx = pd.Index(sorted_cat_bin).get_indexer(rec_keys) + len(_SUMMARY_ROWS)
+        lot_idx = np.asarray(rec_lots, dtype=np.intp)
+        counts[row_idx, lot_idx] = rec_vals
+        errors[row_idx, lot_idx] = rec_errs
+
+    sums = counts.sum(axis=1)
+    # TotalFail 的 sum 用 sum_total_across_lots - TotalPass 之和更稳
+    sums[2] = sum_total_across_lots - sums[1]
+    row_errors = errors.any(axis=1)
+
+    remarks = [""] * len(_SUMMARY_ROWS) + _build_remarks(sorted_cat_bin, lots, _load_lot_remark_maps(lots))
+    return ResultTable(
+        row_keys=row_keys,
+        lot_names=[lt.lot_name for lt in lots],
+        counts=counts,
+        errors=errors,
+        sums=sums,
+        row_errors=row_errors,
+        denominator=sum_total_across_lots,
+        remarks=remarks,
+    )
+
+
+def build_dataframe(lots: List[LotSummary]) -> pd.DataFrame:
+    """构建最终 DataFrame，列包含各 lot 名、sum、rate；行包含 Total、TotalPass、TotalFail 及 Category_BIN。
 
-    return df
+    注意：不再要求所有 lot 的 Total 一致，rate 统一以“所有 lot 的 Total 之和”为分母。
+    """
+    return build_result_table(lots).to_frame()
 
 
 def _unique_output_path(path: str) -> str:
@@ -525,29 +1590,354 @@ def _unique_output_path(path: str) -> str:
     return candidate
 
 
-def write_excel(df: pd.DataFrame, out_path: str) -> str:
-    """写出结果到 Excel，返回最终写出的路径。
+def write_excel(df: pd.DataFrame, out_path: str, engine: str = "xlsxwriter") -> str:
+    """写出展示用 DataFrame 到 Excel，返回最终写出的路径。
 
     - 先应用不覆盖规则生成唯一文件名；
-    - 优先使用 openpyxl，失败时回退到 xlsxwriter。
+    - 默认使用 xlsxwriter，openpyxl 需显式指定。
+    结果表的常规写出请使用 write_result_excel（流式、rate 为数值单元格）。
     """
+    return write_excel_sheets([("result", df)], out_path, engine=engine)
+
+
+_INVALID_SHEET_CHARS_RE = re.compile(r"[\[\]:*?/\\]")
+
+
+def _sheet_name(label: str, used: set) -> str:
+    """生成合法且不重复的工作表名（Excel 限制 31 个字符，且不能包含 []:*?/\\）。"""
+    base = _INVALID_SHEET_CHARS_RE.sub("_", str(label or "").strip()).strip("'") or "sheet"
+    base = base[:31]
+    name = base
+    n = 1
+    while name.lower() in used:
+        suffix = f"({n})"
+        name = base[: 31 - len(suffix)] + suffix
+        n += 1
+    used.add(name.lower())
+    return name
+
+
+def write_excel_sheets(frames: List[Tuple[str, pd.DataFrame]], out_path: str, engine: str = "xlsxwriter") -> str:
+    """把多张 DataFrame 写入同一个 Excel（每个 (表名, DataFrame) 一张工作表），返回最终写出的路径。"""
     final_path = _unique_output_path(out_path)
-    try:
-        with pd.ExcelWriter(final_path, engine="openpyxl") as writer:
-            df.to_excel(writer, sheet_name="result")
-    except Exception:
-        with pd.ExcelWriter(final_path, engine="xlsxwriter") as writer:
-            df.to_excel(writer, sheet_name="result")
+    used: set = set()
+    named = [(_sheet_name(name, used), df) for name, df in frames]
+    with pd.ExcelWriter(final_path, engine=engine) as writer:
+        for name, df in named:
+            df.to_excel(writer, sheet_name=name)
     return final_path
 
 
+EXCEL_ENGINES = ("xlsxwriter", "openpyxl")
+
+
+@dataclass
+class ExcelWriteReport:
+    path: str
+    bytes: int
+    elapsed_seconds: float
+    engine: str
+    format: str = "xlsx"
+    layout: str = "wide"
+
+    def to_dict(self) -> Dict:
+        return {
+            "path": self.path,
+            "bytes": self.bytes,
+            "elapsed_seconds": round(self.elapsed_seconds, 3),
+            "engine": self.engine,
+            "format": self.format,
+            "layout": self.layout,
+        }
+
+
+# 与 pandas to_excel 的表头/索引样式一致
+_HEADER_FORMAT = {"bold": True, "border": 1, "align": "center", "valign": "top"}
+_INDEX_FORMAT = {"bold": True, "border": 1, "valign": "top"}
+
+
+def _write_table_xlsxwriter(workbook, sheet_name: str, table: ResultTable) -> None:
+    """按行流式写出一张结果表（constant_memory 模式要求严格按行顺序写）。
+
+    布局与 DataFrame.to_excel 相同：首行为表头，首列为行键；rate 写为数值并使用百分比格式，
+    error 单元格仍写 "error" 文本。
+    """
+    ws = workbook.add_worksheet(sheet_name)
+    header_fmt = workbook.add_format(_HEADER_FORMAT)
+    index_fmt = workbook.add_format(_INDEX_FORMAT)
+    pct_fmt = workbook.add_format({"num_format": "0.00%"})
+
+    n_lots = len(table.lot_names)
+    ws.write_row(0, 1, list(table.lot_names) + ["sum", "rate", "remark"], header_fmt)
+    rates = table.rates()
+    for i, key in enumerate(table.row_keys):
+        r = i + 1
+        ws.write_string(r, 0, key, index_fmt)
+        values = table.counts[i].tolist()
+        err_cols = np.flatnonzero(table.errors[i])
+        for c in err_cols:
+            values[c] = "error"
+        ws.write_row(r, 1, values)
+        if table.row_errors[i]:
+            ws.write_string(r, n_lots + 1, "error")
+            ws.write_string(r, n_lots + 2, "error")
+        else:
+            ws.write_number(r, n_lots + 1, int(table.sums[i]))
+            ws.write_number(r, n_lots + 2, float(rates[i]), pct_fmt)
+        if table.remarks[i]:
+            ws.write_string(r, n_lots + 3, table.remarks[i])
+
+
+def write_result_excel(
+    tables: List[Tuple[str, ResultTable]],
+    out_path: str,
+    engine: str = "xlsxwriter",
+) -> ExcelWriteReport:
+    """写出一张或多张结果表到 Excel，返回写出路径、文件字节数与耗时。
+
+    - 先应用不覆盖规则生成唯一文件名；
+    - 默认使用 xlsxwriter 的 constant_memory 模式逐行写出，内存占用与列数相关、与行数无关；
+    - engine="openpyxl" 需显式指定，经 DataFrame.to_excel 写出（rate 为百分比文本）。
+    """
+    if engine not in EXCEL_ENGINES:
+        raise ValueError(f"不支持的 Excel 引擎: {engine}（可选 {', '.join(EXCEL_ENGINES)}）")
+    t0 = time.perf_counter()
+    final_path = _unique_output_path(out_path)
+    used: set = set()
+    named = [(_sheet_name(name, used), table) for name, table in tables]
+    if engine == "openpyxl":
+        with pd.ExcelWriter(final_path, engine="openpyxl") as writer:
+            for name, table in named:
+                table.to_frame().to_excel(writer, sheet_name=name)
+    else:
+        try:
+            import xlsxwriter
+        except ImportError as exc:
+            raise RuntimeError("缺少依赖 xlsxwriter，请安装（pip install xlsxwriter）或改用 openpyxl 引擎") from exc
+        workbook = xlsxwriter.Workbook(final_path, {"constant_memory": True})
+        try:
+            for name, table in named:
+                _write_table_xlsxwriter(workbook, name, table)
+        finally:
+            workbook.close()
+    return ExcelWriteReport(
+        path=final_path,
+        bytes=os.path.getsize(final_path),
+        elapsed_seconds=time.perf_counter() - t0,
+        engine=engine,
+    )
+
+
+# -----------------------------
+# 其他输出格式（CSV / JSON Lines / Parquet）
+# -----------------------------
+
+OUTPUT_FORMATS = ("xlsx", "csv", "jsonl", "parquet")
+OUTPUT_LAYOUTS = ("wide", "long")
+_LONG_COLUMNS = ["lot", "category", "bin", "value", "is_error"]
+_FORMAT_EXTS = {".xlsx": "xlsx", ".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".parquet": "parquet"}
+
+
+def resolve_output_format(fmt: Union[str, None], out_path: Union[str, None] = None) -> str:
+    """确定输出格式：显式指定优先，否则按输出路径扩展名推断，默认 xlsx。"""
+    if fmt:
+        fmt = str(fmt).strip().lower()
+        if fmt not in OUTPUT_FORMATS:
+            raise ValueError(f"不支持的输出格式: {fmt}（可选 {', '.join(OUTPUT_FORMATS)}）")
+        return fmt
+    ext = os.path.splitext(out_path or "")[1].lower()
+    return _FORMAT_EXTS.get(ext, "xlsx")
+
+
+def default_output_name(fmt: str, base: str = "result") -> str:
+    """默认输出文件名，例如 result.csv。"""
+    return f"{base}.{fmt}"
+
+
+def _table_columns(tables: List[Tuple[str, ResultTable]], layout: str) -> List[str]:
+    # 多张表（按 Program ID 拆分）时在最前面加 sheet 列
+    lead = ["sheet"] if len(tables) > 1 else []
+    if layout == "long":
+        return lead + _LONG_COLUMNS
+    lot_names = list(tables[0][1].lot_names) if tables else []
+    return lead + ["row"] + lot_names + ["sum", "rate", "remark"]
+
+
+def _table_rows(tables: List[Tuple[str, ResultTable]], layout: str, error_value: object = "error") -> Iterator[list]:
+    """把一张或多张结果表展开为记录流（列顺序同 _table_columns）。"""
+    multi = len(tables) > 1
+    for name, table in tables:
+        rows = table.long_rows() if layout == "long" else table.wide_rows(error_value)
+        for row in rows:
+            yield [name, *row] if multi else row
+
+
+def _write_rows_csv(path: str, columns: List[str], rows: Iterable[list]) -> None:
+    import csv
+
+    # utf-8-sig：Excel 直接打开时中文 remark 不乱码；None 写为空
+    with open(path, "w", encoding="utf-8-sig", newline="") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(["" if v is None else v for v in row])
+
+
+def _write_rows_jsonl(path: str, columns: List[str], rows: Iterable[list]) -> None:
+    import json
+
+    with open(path, "w", encoding="utf-8") as fh:
+        for row in rows:
+            fh.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+            fh.write("\n")
+
+
+def _write_rows_parquet(path: str, columns: List[str], rows: Iterable[list]) -> None:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as exc:
+        raise RuntimeError("输出 Parquet 需要安装 pyarrow（pip install pyarrow）") from exc
+    df = pd.DataFrame(list(rows), columns=columns)
+    # 列内类型统一：lot 计数为可空整数；long 布局的 category 混有行名，统一为文本
+    for col in df.columns:
+        if col in ("sheet", "row", "lot", "remark", "category"):
+            df[col] = df[col].map(lambda v: None if v is None else str(v))
+        elif col == "is_error":
+            df[col] = df[col].astype(bool)
+        elif col == "rate":
+            df[col] = pd.to_numeric(df[col]).astype("Float64")
+        else:
+            df[col] = pd.to_numeric(df[col]).astype("Int64")
+    df.to_parquet(path, engine="pyarrow", index=False)
+
+
+def _write_long_excel(path: str, tables: List[Tuple[str, ResultTable]], engine: str) -> None:
+    columns = _table_columns(tables, "long")
+    if engine == "openpyxl":
+        pd.DataFrame(list(_table_rows(tables, "long")), columns=columns).to_excel(
+            path, sheet_name="result", index=False, engine="openpyxl"
+        )
+        return
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+    try:
+        ws = workbook.add_worksheet("result")
+        ws.write_row(0, 0, columns, workbook.add_format(_HEADER_FORMAT))
+        for r, row in enumerate(_table_rows(tables, "long"), start=1):
+            ws.write_row(r, 0, ["" if v is None else v for v in row])
+    finally:
+        workbook.close()
+
+
+def write_result(
+    tables: List[Tuple[str, ResultTable]],
+    out_path: str,
+    fmt: Union[str, None] = None,
+    layout: str = "wide",
+    engine: str = "xlsxwriter",
+) -> ExcelWriteReport:
+    """按指定格式与布局写出结果表，返回写出报告（路径、字节数、耗时）。
+
+    - fmt：xlsx / csv / jsonl / parquet，不填按 out_path 扩展名推断；
+    - layout：wide 与 Excel 相同（行 × lot，多表时加 sheet 列）；long 为每个 lot × 行一条记录
+      （lot, category, bin, value, is_error）；
+    - CSV / JSON Lines 逐行流式写出；Parquet 需要 pyarrow，error 单元格写为空值；
+    - xlsx + wide 等同 write_result_excel（每张表一个工作表）。
+    """
+    fmt = resolve_output_format(fmt, out_path)
+    if layout not in OUTPUT_LAYOUTS:
+        raise ValueError(f"不支持的输出布局: {layout}（可选 {', '.join(OUTPUT_LAYOUTS)}）")
+    if fmt == "xlsx" and layout == "wide":
+        report = write_result_excel(tables, out_path, engine=engine)
+        report.format, report.layout = fmt, layout
+        return report
+    if fmt == "xlsx" and engine not in EXCEL_ENGINES:
+        raise ValueError(f"不支持的 Excel 引擎: {engine}（可选 {', '.join(EXCEL_ENGINES)}）")
+
+    t0 = time.perf_counter()
+    final_path = _unique_output_path(out_path)
+    columns = _table_columns(tables, layout)
+    if fmt == "csv":
+        _write_rows_csv(final_path, columns, _table_rows(tables, layout))
+    elif fmt == "jsonl":
+        _write_rows_jsonl(final_path, columns, _table_rows(tables, layout))
+    elif fmt == "parquet":
+        _write_rows_parquet(final_path, columns, _table_rows(tables, layout, error_value=None))
+    else:
+        _write_long_excel(final_path, tables, engine)
+    return ExcelWriteReport(
+        path=final_path,
+        bytes=os.path.getsize(final_path),
+        elapsed_seconds=time.perf_counter() - t0,
+        engine=engine if fmt == "xlsx" else "",
+        format=fmt,
+        layout=layout,
+    )
+
+
+def _build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="sum_aggregator.py", description="SUM 汇总小工具")
+    parser.add_argument("lots_dir", help="lots 目录")
+    parser.add_argument("out_path", nargs="?", default=None, help="输出 Excel 路径，默认当前目录 result.xlsx")
+    parser.add_argument("--no-cache", action="store_true", help="不使用解析缓存，所有 SUM 文件重新解析")
+    parser.add_argument("--clear-cache", action="store_true", help="运行前清空解析缓存")
+    parser.add_argument(
+        "--evict-cache",
+        action="store_true",
+        help="运行前清除解析缓存中的过期记录（源文件已删除或已变化、解析器版本不同）",
+    )
+    parser.add_argument("--jobs", type=int, default=1, help="并行进程数，默认 1（串行），0 表示使用全部 CPU 核心")
+    parser.add_argument(
+        "--split-by-tp",
+        action="store_true",
+        help="一次解析，按 Program ID 拆分：输出 all 表及每个 Program ID 一张表",
+    )
+    parser.add_argument(
+        "--tp-names",
+        default=None,
+        help="配合拆分使用，只输出这些 Program ID（逗号分隔）；不填则为所有出现过的 Program ID",
+    )
+    parser.add_argument(
+        "--no-remark-prefetch",
+        action="store_true",
+        help="不在解析过程中后台预取 Mapping，改为生成结果表时再逐个读取",
+    )
+    parser.add_argument(
+        "--excel-engine",
+        choices=EXCEL_ENGINES,
+        default="xlsxwriter",
+        help="Excel 写出引擎：默认 xlsxwriter（流式、低内存），openpyxl 需显式指定",
+    )
+    parser.add_argument(
+        "--format",
+        dest="output_format",
+        choices=OUTPUT_FORMATS,
+        default=None,
+        help="输出格式：xlsx / csv / jsonl / parquet（需 pyarrow）；不填按输出路径扩展名推断，默认 xlsx",
+    )
+    parser.add_argument(
+        "--layout",
+        choices=OUTPUT_LAYOUTS,
+        default="wide",
+        help="输出布局：wide 同 Excel（行 × lot），long 为 lot, category, bin, value, is_error 长表",
+    )
+    return parser
+
+
 def main(argv: List[str]) -> int:
     if len(argv) < 2:
-        print("用法: python3 sum_aggregator.py <lots_dir> [output_excel_path]", file=sys.stderr)
+        print("用法: python3 sum_aggregator.py <lots_dir> [output_excel_path] [--jobs N] [--split-by-tp] [--tp-names A,B] [--no-remark-prefetch] [--no-cache] [--clear-cache] [--evict-cache] [--excel-engine xlsxwriter|openpyxl] [--format xlsx|csv|jsonl|parquet] [--layout wide|long]", file=sys.stderr)
         return 2
 
-    lots_dir = argv[1]
-    out_path = argv[2] if len(argv) >= 3 else os.path.join(os.getcwd(), "result.xlsx")
+    args = _build_arg_parser().parse_args(argv[1:])
+    lots_dir = args.lots_dir
+    try:
+        output_format = resolve_output_format(args.output_format, args.out_path)
+    except ValueError as exc:
+        print(str(exc), file=sys.stderr)
+        return 2
+    out_path = args.out_path or os.path.join(os.getcwd(), default_output_name(output_format))
 
     if not os.path.isdir(lots_dir):
         print(f"目录不存在: {lots_dir}", file=sys.stderr)
@@ -564,10 +1954,39 @@ def main(argv: List[str]) -> int:
         return 2
 
     try:
-        lot_summaries: List[LotSummary] = [aggregate_lot(ld) for ld in lot_subdirs]
-        df = build_dataframe(lot_summaries)
-        final_path = write_excel(df, out_path)
-        print(f"已生成 Excel: {final_path}")
+        if args.evict_cache and not args.no_cache and not args.clear_cache:
+            print(f"解析缓存：清除过期记录 {evict_parse_cache()} 条")
+        cache_stats: Dict[str, int] = {}
+        if args.split_by_tp or args.tp_names:
+            tp_names = [t for t in (args.tp_names or "").split(",") if t.strip()] or None
+            sheets = aggregate_lots_by_tp(
+                lot_subdirs,
+                tp_names,
+                jobs=args.jobs,
+                use_cache=not args.no_cache,
+                clear_cache=args.clear_cache,
+                stats=cache_stats,
+                prefetch_remarks=not args.no_remark_prefetch,
+            )
+            tables = [(name, build_result_table(lots)) for name, lots in sheets]
+        else:
+            lot_summaries: List[LotSummary] = aggregate_lots(
+                lot_subdirs,
+                jobs=args.jobs,
+                use_cache=not args.no_cache,
+                clear_cache=args.clear_cache,
+                stats=cache_stats,
+                prefetch_remarks=not args.no_remark_prefetch,
+            )
+            tables = [("result", build_result_table(lot_summaries))]
+        report = write_result(tables, out_path, fmt=output_format, layout=args.layout, engine=args.excel_engine)
+        final_path = report.path
+        if not args.no_cache:
+            print(f"解析缓存：命中 {cache_stats.get('hits', 0)}，解析 {cache_stats.get('misses', 0)}")
+        if report.format == "xlsx":
+            print(f"已生成 Excel: {final_path}（{report.bytes} 字节，写出耗时 {report.elapsed_seconds:.2f} 秒，{report.engine}）")
+        else:
+            print(f"已生成 {report.format}（{report.layout}）: {final_path}（{report.bytes} 字节，写出耗时 {report.elapsed_seconds:.2f} 秒）")
         return 0
     except Exception as exc:
         print(f"处理失败: {exc}", file=sys.stderr)
@@ -576,17 +1995,3 @@ def main(argv: List[str]) -> int:
 
 if __name__ == "__main__":
     sys.exit(main(sys.argv))
-def extract_tp_name(text: str) -> Union[str, None]:
-    patterns = [
-        # Program ID 作为 TP 名来源，兼容多种写法
-        r"\bProgram\s*ID\b\s*[:=]?\s*([^\r\n]+)",
-        r"\bProgramID\b\s*[:=]?\s*([^\r\n]+)",
-        r"\bprogram_id\b\s*[:=]?\s*([^\r\n]+)",
-        r"\bProgram\s*Id\b\s*[:=]?\s*([^\r\n]+)",
-    ]
-    for pat in patterns:
-        m = re.search(pat, text, flags=re.IGNORECASE)
-        if m:
-            val = m.group(1).strip()
-            return val
-    return None
@@ -0,0 +1,556 @@
+"""
+SLT_Summary 共享目录的本地文件目录（SQLite）。
+
+- 记录 SLT_SUMMARY_ROOT 下每个目录的 mtime 与父目录，以及每个 SUM 候选文件（.sum/.txt）的路径、文件名、大小、mtime；
+- 增量刷新：目录 mtime 未变化时不再列目录，只沿已记录的子目录继续向下 stat（多线程并行，见 share_walker）；
+  mtime 变化（有文件或子目录增删改名）的目录才重新列出，已消失的目录连同其文件一起删除；
+  full=True 时全部重新列出。注意：原地改写文件内容一般不改变目录 mtime，此类变化需 full 刷新；
+- 准备任务按 lot 名在目录中查找，不再遍历共享盘；lot 名出现在文件名任意位置，普通前缀索引无法使用，
+  因此在文件名上另建三元组（trigram）全文索引（SQLite FTS5），3 个字符及以上的 lot 名只访问候选行，
+  不足 3 个字符或 SQLite 不支持 trigram 时退回逐行 instr；
+- 默认位置：项目根目录下 cache/sum_catalog.sqlite3（与解析缓存同级，不随发布包打包）。
+
+命令行：python -m tools.calcSumXlsx.sum_catalog [--root R] [--full] 刷新并打印统计；
+        python -m tools.calcSumXlsx.sum_catalog --bench N 用 N 个合成文件名对比三元组索引与逐行扫描的查询耗时。
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Union
+
+try:
+    from tools.calcSumXlsx.lot_matcher import LotMatcher
+    from tools.calcSumXlsx.share_walker import walk
+except Exception:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from lot_matcher import LotMatcher  # type: ignore
+    from share_walker import walk  # type: ignore
+
+DEFAULT_CATALOG_PATH = Path(__file__).resolve().parent.parent.parent / "cache" / "sum_catalog.sqlite3"
+SUM_EXTS = (".sum", ".txt")
+# 后台刷新间隔（秒），可用配置 SUM_CATALOG_REFRESH_SECONDS 覆盖
+DEFAULT_REFRESH_INTERVAL = 600
+# 查询前若距上次刷新超过该秒数，先做一次增量刷新。
+# 需大于后台刷新间隔：正常情况下由后台线程保持目录新鲜，只有后台刷新停滞时准备任务才在前台刷新
+DEFAULT_MAX_AGE = 2 * DEFAULT_REFRESH_INTERVAL
+# 每刷新这么多个目录提交一次，避免长事务
+_COMMIT_EVERY = 500
+# 新目录首次无法访问时占位记录的 mtime（不会与真实 mtime 相等，下次刷新必定重新列出）
+_UNLISTED_MTIME = -1
+# 单条 SQL 中 lot 名条件的个数上限（SQLite 参数个数有限制）
+_LOTS_PER_QUERY = 400
+# 三元组索引只能加速不少于 3 个字符的子串
+_TRIGRAM_MIN = 3
+# 准备任务排除的文件名片段（与 ENG/SPC 排除规则一致）
+PREPARE_EXCLUDES = ("eng", "spc")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    root     TEXT NOT NULL,
+    path     TEXT NOT NULL,
+    parent   TEXT,
+    mtime_ns INTEGER NOT NULL,
+    PRIMARY KEY (root, path)
+);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (root, parent);
+CREATE TABLE IF NOT EXISTS files (
+    id       INTEGER PRIMARY KEY,
+    root     TEXT NOT NULL,
+    dir      TEXT NOT NULL,
+    name     TEXT NOT NULL,
+    lname    TEXT NOT NULL,
+    size     INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    UNIQUE (root, dir, name)
+);
+CREATE INDEX IF NOT EXISTS files_mtime ON files (root, mtime_ns);
+CREATE TABLE IF NOT EXISTS roots (
+    root         TEXT PRIMARY KEY,
+    refreshed_at REAL NOT NULL,
+    dirs         INTEGER NOT NULL,
+    files        INTEGER NOT NULL
+);
+"""
+
+# lname 已转小写，索引区分大小写即可，GLOB 查询可走索引；detail=none 只记录出现与否，体积最小
+_TRIGRAM_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS files_tri USING fts5(
+    lname, content='files', content_rowid='id', tokenize='trigram case_sensitive 1', detail='none'
+);
+CREATE TRIGGER IF NOT EXISTS files_tri_ai AFTER INSERT ON files BEGIN
+    INSERT INTO files_tri (rowid, lname) VALUES (new.id, new.lname);
+END;
+CREATE TRIGGER IF NOT EXISTS files_tri_ad AFTER DELETE ON files BEGIN
+    INSERT INTO files_tri (files_tri, rowid, lname) VALUES ('delete', old.id, old.lname);
+END;
+"""
+
+
+def _glob_literal(text: str) -> str:
+    """把文本转成只匹配自身的 GLOB 片段。"""
+    return "".join(f"[{ch}]" if ch in "*?[" else ch for ch in text)
+
+
+@dataclass
+class CatalogFile:
+    path: str
+    name: str
+    size: int
+    mtime_ns: int
+
+    @property
+    def mtime(self) -> float:
+        return self.mtime_ns / 1e9
+
+
+def _list_dir(path: str):
+    """列出一个目录，返回 (子目录路径列表, [(文件名, 大小, mtime_ns)])；只保留 SUM 候选文件。"""
+    subdirs: List[str] = []
+    files: List[tuple] = []
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                    continue
+                if not entry.is_file(follow_symlinks=False) or not entry.name.lower().endswith(SUM_EXTS):
+                    continue
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            files.append((entry.name, st.st_size, st.st_mtime_ns))
+    return subdirs, files
+
+
+class SumCatalog:
+    """SLT_Summary 文件目录。一个实例对应一个 SQLite 连接，可跨线程共享（内部加锁）。
+
+    用法：
+        with SumCatalog(root=SLT_SUMMARY_ROOT) as catalog:
+            catalog.refresh()
+            for f in catalog.find(["lot1", "lot2"]):
+                ...
+    """
+
+    def __init__(self, db_path: Union[str, Path, None] = None, root: Union[str, None] = None, max_age: float = DEFAULT_MAX_AGE):
+        self.db_path = Path(db_path) if db_path else DEFAULT_CATALOG_PATH
+        self.root = str(root or "")
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        # 刷新互斥：后台刷新与准备任务同时触发时只刷新一次
+        self._refresh_lock = threading.Lock()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+        try:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.DatabaseError:
+            pass
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self.trigram = self._init_trigram()
+        self._conn.commit()
+
+    def _init_trigram(self) -> bool:
+        """创建文件名三元组索引（外部内容表，由触发器随 files 同步）；不支持时返回 False。
+
+        旧版目录首次启用索引时，从 files 重建一次。
+        """
+        existed = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'files_tri'"
+        ).fetchone() is not None
+        try:
+            self._conn.executescript(_TRIGRAM_SCHEMA)
+        except sqlite3.OperationalError:
+            return False
+        if not existed and self._conn.execute("SELECT 1 FROM files LIMIT 1").fetchone():
+            self._conn.execute("INSERT INTO files_tri (files_tri) VALUES ('rebuild')")
+        return True
+
+    # ------------------------------------------------------------------
+    # 刷新
+    # ------------------------------------------------------------------
+
+    def refresh(
+        self,
+        full: bool = False,
+        cancel: Union[Callable[[], bool], None] = None,
+        workers: Union[int, None] = None,
+    ) -> Dict[str, Union[int, float]]:
+        """增量刷新，返回统计：dirs、listed（重新列出的目录数）、removed_dirs、files、elapsed_seconds。
+
+        目录由 workers 个线程并行 stat/列出（默认读取配置 SUM_WALK_WORKERS）。
+        cancel 返回 True 时中止并抛出 RuntimeError（已刷新的目录保留，下次继续增量）。
+        已记录的目录暂时无法 stat/列出时保留旧记录，新目录则记为占位、下次刷新重新列出；
+        根目录无法访问时抛出 OSError，不删除任何记录。
+        """
+        if not self.root:
+            raise ValueError("未配置 SLT_SUMMARY_ROOT")
+        with self._refresh_lock:
+            return self._refresh(full, cancel, workers)
+
+    def _refresh(self, full: bool, cancel, workers) -> Dict[str, Union[int, float]]:
+        t0 = time.perf_counter()
+        root = self.root
+        with self._lock:
+            known: Dict[str, int] = {}
+            children: Dict[str, List[str]] = defaultdict(list)
+            for path, parent, mtime_ns in self._conn.execute(
+                "SELECT path, parent, mtime_ns FROM dirs WHERE root = ?", (root,)
+            ):
+                known[path] = mtime_ns
+                if parent is not None:
+                    children[parent].append(path)
+
+        def scan(node):
+            # 在列目录线程中执行：stat 目录，mtime 未变则沿已知子目录继续，否则重新列出
+            path, parent = node
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+            except OSError:
+                if path not in known:
+                    # 新目录第一次就无法访问：记一条 mtime 为 _UNLISTED_MTIME 的占位记录，
+                    # 父目录 mtime 不再变化时下次刷新仍会沿占位记录重新列出它
+                    return [], [(path, parent, _UNLISTED_MTIME, [])]
+                # 暂时无法访问（如 SMB 瞬时错误）：保留旧记录，沿已知子目录继续，不当作已删除。
+                # 真正删除的目录会使父目录 mtime 变化，父目录重新列出时自然不再包含它
+                return [(child, path) for child in children.get(path, ())], [(path, parent, known[path], None)]
+            if not full and known.get(path) == mtime_ns:
+                return [(child, path) for child in children.get(path, ())], [(path, parent, mtime_ns, None)]
+            try:
+                subdirs, files = _list_dir(path)
+            except OSError:
+                if path not in known:
+                    return [], [(path, parent, _UNLISTED_MTIME, [])]
+                # 暂时无法列出：保留旧记录，沿已知子目录继续
+                return [(child, path) for child in children.get(path, ())], [(path, parent, mtime_ns, None)]
+            return [(sub, path) for sub in subdirs], [(path, parent, mtime_ns, files)]
+
+        # 根目录无法访问时直接报错中止，不能把整个目录当作已删除
+        os.stat(root)
+        seen = set()
+        listed = 0
+        pending = 0
+        try:
+            # 数据库只在当前线程写入；列目录线程只做 stat/scandir
+            for path, parent, mtime_ns, files in walk((root, None), scan, workers=workers, cancel=cancel):
+                seen.add(path)
+                if files is None:
+                    continue
+                listed += 1
+                with self._lock:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO dirs (root, path, parent, mtime_ns) VALUES (?, ?, ?, ?)",
+                        (root, path, parent, mtime_ns),
+                    )
+                    self._replace_files(path, files)
+                    pending += 1
+                    if pending >= _COMMIT_EVERY:
+                        self._conn.commit()
+                        pending = 0
+        except RuntimeError:
+            with self._lock:
+                self._conn.commit()
+            raise
+
+        gone = [p for p in known if p not in seen]
+        with self._lock:
+            for path in gone:
+                self._conn.execute("DELETE FROM dirs WHERE root = ? AND path = ?", (root, path))
+                self._delete_files(path)
+            total_dirs, = self._conn.execute("SELECT COUNT(*) FROM dirs WHERE root = ?", (root,)).fetchone()
+            total_files, = self._conn.execute("SELECT COUNT(*) FROM files WHERE root = ?", (root,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO roots (root, refreshed_at, dirs, files) VALUES (?, ?, ?, ?)",
+                (root, time.time(), total_dirs, total_files),
+            )
+            self._conn.commit()
+        return {
+            "dirs": total_dirs,
+            "listed": listed,
+            "removed_dirs": len(gone),
+            "files": total_files,
+            "elapsed_seconds": round(time.perf_counter() - t0, 3),
+        }
+
+    def _replace_files(self, dir_path: str, files: List[tuple]) -> None:
+        """用本次列出的结果替换一个目录下的文件记录（调用方持有 _lock）。"""
+        self._delete_files(dir_path)
+        self._conn.executemany(
+            "INSERT INTO files (root, dir, name, lname, size, mtime_ns) VALUES (?, ?, ?, ?, ?, ?)",
+            [(self.root, dir_path, name, name.lower(), size, mtime_ns) for name, size, mtime_ns in files],
+        )
+
+    def _delete_files(self, dir_path: str) -> None:
+        self._conn.execute("DELETE FROM files WHERE root = ? AND dir = ?", (self.root, dir_path))
+
+    def age(self) -> Union[float, None]:
+        """距上次刷新的秒数；从未刷新为 None。"""
+        with self._lock:
+            row = self._conn.execute("SELECT refreshed_at FROM roots WHERE root = ?", (self.root,)).fetchone()
+        return None if row is None else max(0.0, time.time() - row[0])
+
+    def ensure_fresh(self, cancel: Union[Callable[[], bool], None] = None) -> Union[Dict[str, Union[int, float]], None]:
+        """从未刷新或距上次刷新超过 max_age 时增量刷新并返回统计，否则返回 None。
+
+        拿到刷新锁后再检查一次：等锁期间其它调用方或后台线程可能刚刷新完，不再重复刷新。
+        """
+        age = self.age()
+        if age is not None and age < self.max_age:
+            return None
+        if not self.root:
+            raise ValueError("未配置 SLT_SUMMARY_ROOT")
+        with self._refresh_lock:
+            age = self.age()
+            if age is not None and age < self.max_age:
+                return None
+            return self._refresh(False, cancel, None)
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    def find(
+        self,
+        lots: Iterable[str],
+        since_ts: Union[float, None] = None,
+        exclude: Iterable[str] = (),
+    ) -> Iterator[CatalogFile]:
+        """文件名包含任一 lot 名（不区分大小写）的文件。
+
+        - since_ts 非 None 时只取 mtime 不早于它的文件；
+        - exclude 中的片段（如 PREPARE_EXCLUDES）出现在文件名中则排除；
+        - 3 个字符及以上的 lot 名经三元组索引只读取候选行，其余 lot 名逐行 instr 匹配。
+        每个文件只产出一次；匹配到哪个 lot 由调用方按原规则判断。
+        """
+        norm = [s for s in dict.fromkeys(str(x or "").strip().lower() for x in lots) if s]
+        excludes = [str(x).lower() for x in exclude if x]
+        since_ns = int(since_ts * 1e9) if since_ts is not None else None
+        indexed = [lot for lot in norm if self.trigram and len(lot) >= _TRIGRAM_MIN]
+        scanned = [lot for lot in norm if not (self.trigram and len(lot) >= _TRIGRAM_MIN)]
+        matcher = LotMatcher(norm)
+        seen = set()
+        for rows in self._indexed_rows(indexed, since_ns):
+            yield from self._emit(rows, matcher, excludes, seen)
+        for rows in self._scanned_rows(scanned, since_ns):
+            yield from self._emit(rows, matcher, excludes, seen)
+
+    def _indexed_rows(self, lots: List[str], since_ns: Union[int, None]) -> Iterator[list]:
+        # 必须写成子查询并用 +root 屏蔽 root 索引，否则规划器会先按 root 扫遍 files 再逐行回查 FTS
+        sql = (
+            "SELECT id, dir, name, lname, size, mtime_ns FROM files "
+            "WHERE id IN (SELECT rowid FROM files_tri WHERE lname GLOB ?) AND +root = ?"
+        )
+        if since_ns is not None:
+            sql += " AND mtime_ns >= ?"
+        for lot in lots:
+            params: list = [f"*{_glob_literal(lot)}*", self.root]
+            if since_ns is not None:
+                params.append(since_ns)
+            with self._lock:
+                rows = self._conn.execute(sql, params).fetchall()
+            yield rows
+
+    def _scanned_rows(self, lots: List[str], since_ns: Union[int, None]) -> Iterator[list]:
+        for i in range(0, len(lots), _LOTS_PER_QUERY):
+            chunk = lots[i:i + _LOTS_PER_QUERY]
+            sql = (
+                "SELECT id, dir, name, lname, size, mtime_ns FROM files WHERE root = ? AND ("
+                + " OR ".join(["instr(lname, ?) > 0"] * len(chunk))
+                + ")"
+            )
+            params: list = [self.root, *chunk]
+            if since_ns is not None:
+                sql += " AND mtime_ns >= ?"
+                params.append(since_ns)
+            with self._lock:
+                rows = self._conn.execute(sql, params).fetchall()
+            yield rows
+
+    @staticmethod
+    def _emit(rows: list, matcher: LotMatcher, excludes: List[str], seen: set) -> Iterator[CatalogFile]:
+        for fid, dir_path, name, lname, size, mtime_ns in rows:
+            if fid in seen:
+                continue
+            seen.add(fid)
+            if any(x in lname for x in excludes) or matcher.search(lname) is None:
+                continue
+            yield CatalogFile(os.path.join(dir_path, name), name, size, mtime_ns)
+
+    def stats(self) -> Dict[str, Union[int, float, None]]:
+        """该根目录的目录数、文件数与上次刷新时间。"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT refreshed_at, dirs, files FROM roots WHERE root = ?", (self.root,)
+            ).fetchone()
+        if row is None:
+            return {"dirs": 0, "files": 0, "refreshed_at": None}
+        return {"dirs": row[1], "files": row[2], "refreshed_at": row[0]}
+
+    def close(self) -> None:
+        with self._lock:
+            try:
+                self._conn.commit()
+            finally:
+                self._conn.close()
+
+    def __enter__(self) -> "SumCatalog":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+# -----------------------------
+# 进程内共享实例与后台刷新
+# -----------------------------
+
+_SHARED: Dict[str, SumCatalog] = {}
+_REFRESHERS: Dict[str, threading.Thread] = {}
+_SHARED_LOCK = threading.Lock()
+
+
+def _get_config(key: str, default=None):
+    try:
+        from tools.config_loader import get_config
+    except Exception:
+        return os.environ.get(key, default)
+    return get_config(key, default)
+
+
+def catalog_enabled() -> bool:
+    """配置 SUM_CATALOG=0（config.json 或环境变量）可关闭目录，准备任务回到直接遍历共享盘。"""
+    return str(_get_config("SUM_CATALOG", "1")).strip().lower() not in ("0", "false", "no", "off")
+
+
+def get_sum_catalog(root: str) -> Union[SumCatalog, None]:
+    """返回该根目录的共享目录实例；未配置、已关闭或无法打开时返回 None（调用方回退到遍历）。"""
+    root = str(root or "")
+    if not root or not catalog_enabled():
+        return None
+    with _SHARED_LOCK:
+        catalog = _SHARED.get(root)
+        if catalog is None:
+            try:
+                catalog = _SHARED[root] = SumCatalog(root=root)
+            except Exception:
+                return None
+        return catalog
+
+
+def _refresh_loop(catalog: SumCatalog, interval: float) -> None:
+    # 启动时由调用方（准备任务的 ensure_fresh）负责首次刷新，这里先等一个间隔
+    while True:
+        time.sleep(interval)
+        try:
+            catalog.refresh()
+        except Exception as exc:
+            print(f"SLT_Summary 目录后台刷新失败: {exc}", file=sys.stderr)
+
+
+def start_background_refresh(root: str, interval: Union[float, None] = None) -> bool:
+    """为该根目录启动后台刷新线程（每个根目录只启动一个），返回是否在运行。"""
+    catalog = get_sum_catalog(root)
+    if catalog is None:
+        return False
+    if interval is None:
+        try:
+            interval = float(_get_config("SUM_CATALOG_REFRESH_SECONDS", DEFAULT_REFRESH_INTERVAL))
+        except (TypeError, ValueError):
+            interval = DEFAULT_REFRESH_INTERVAL
+    if interval <= 0:
+        return False
+    # 后台刷新间隔调大时，前台刷新阈值随之放宽，避免准备任务频繁在前台刷新
+    catalog.max_age = max(catalog.max_age, 2 * interval)
+    with _SHARED_LOCK:
+        thread = _REFRESHERS.get(catalog.root)
+        if thread is None or not thread.is_alive():
+            thread = threading.Thread(
+                target=_refresh_loop, args=(catalog, interval), name="sum-catalog-refresh", daemon=True
+            )
+            _REFRESHERS[catalog.root] = thread
+            thread.start()
+    return True
+
+
+def _bench(n: int, db_path: Union[str, None]) -> None:
+    """合成 n 个文件名写入临时目录库，对比三元组索引与逐行 instr 在不同 lot 数下的查询耗时。"""
+    import random
+    import string
+    import tempfile
+
+    rng = random.Random(0)
+    alphabet = string.ascii_uppercase + string.digits
+    with tempfile.TemporaryDirectory() as tmp:
+        path = db_path or os.path.join(tmp, "bench.sqlite3")
+        with SumCatalog(path, root="/bench") as catalog:
+            if not catalog.trigram:
+                print("当前 SQLite 不支持 trigram 分词器，无法对比", file=sys.stderr)
+                return
+            t0 = time.perf_counter()
+            lot_ids: List[str] = []
+            batch: List[tuple] = []
+            per_dir = 200
+            for i in range(n):
+                lot = "".join(rng.choices(alphabet, k=8))
+                if i % 1000 == 0:
+                    lot_ids.append(lot)
+                tag = rng.choice(("FT", "SLT", "SLT_ENG", "QA"))
+                batch.append((f"{tag}_{lot}_{rng.randrange(12) + 1:02d}0125_{i % 1000000:06d}.SUM", 4096, i))
+                if len(batch) >= per_dir or i == n - 1:
+                    with catalog._lock:
+                        catalog._conn.executemany(
+                            "INSERT INTO files (root, dir, name, lname, size, mtime_ns) VALUES (?, ?, ?, ?, ?, ?)",
+                            [("/bench", f"/bench/d{i // per_dir}", name, name.lower(), size, m) for name, size, m in batch],
+                        )
+                    batch = []
+            catalog._conn.commit()
+            print(f"写入 {n} 个文件名，耗时 {time.perf_counter() - t0:.1f} 秒")
+            for k in (1, 10, 100):
+                lots = lot_ids[:k]
+                t1 = time.perf_counter()
+                hit_index = sum(1 for _ in catalog.find(lots, exclude=PREPARE_EXCLUDES))
+                t_index = time.perf_counter() - t1
+                catalog.trigram = False
+                t1 = time.perf_counter()
+                hit_scan = sum(1 for _ in catalog.find(lots, exclude=PREPARE_EXCLUDES))
+                t_scan = time.perf_counter() - t1
+                catalog.trigram = True
+                print(f"{k:>4} 个 lot：三元组索引 {t_index * 1000:9.1f} ms（{hit_index} 个）| 逐行扫描 {t_scan * 1000:9.1f} ms（{hit_scan} 个）")
+
+
+def main(argv: List[str]) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="sum_catalog", description="刷新 SLT_Summary 本地文件目录")
+    parser.add_argument("--root", default=None, help="SLT_SUMMARY_ROOT，默认读取配置")
+    parser.add_argument("--db", default=None, help="目录文件路径，默认 cache/sum_catalog.sqlite3")
+    parser.add_argument("--full", action="store_true", help="忽略目录修改时间，全部重新列出")
+    parser.add_argument("--workers", type=int, default=None, help="列目录线程数，默认读取配置 SUM_WALK_WORKERS")
+    parser.add_argument("--bench", type=int, default=0, help="基准测试：合成 N 个文件名对比查询耗时（不访问共享盘）")
+    args = parser.parse_args(argv[1:])
+    if args.bench:
+        _bench(args.bench, args.db)
+        return 0
+    root = args.root or _get_config("SLT_SUMMARY_ROOT") or ""
+    if not root:
+        print("请在 config/config.json 设置 SLT_SUMMARY_ROOT 或配置环境变量 SLT_SUMMARY_ROOT", file=sys.stderr)
+        return 2
+    with SumCatalog(args.db, root=root) as catalog:
+        result = catalog.refresh(full=args.full, workers=args.workers)
+    print(
+        f"目录已刷新：目录 {result['dirs']}，重新列出 {result['listed']}，移除 {result['removed_dirs']}，"
+        f"文件 {result['files']}，耗时 {result['elapsed_seconds']:.2f} 秒"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))